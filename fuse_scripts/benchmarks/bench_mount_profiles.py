@@ -0,0 +1,224 @@
+"""
+Benchmark for the mount profiles of :func:`infuser_setup.mount_options`.
+Mounts a temporary directory with the :doc:`infuser` and a policy allowing
+everything once per profile and prints a table of the sequential write and
+read throughput and the metadata operations per second. Needs FUSE and
+fusermount.
+
+With --in-process, the same workloads call the
+:class:`fileoperations.FileOperations` with the durability and the attribute
+cache of each profile directly, without FUSE. This measures the part of a
+profile the infuser implements, not the caching of the kernel.
+
+Usage: python3 benchmarks/bench_mount_profiles.py [--in-process] [MiB] [files] [profiles ...]
+
+Libraries/Modules:
+
+- os standard library
+  - Access to the file operations through the mount
+- subprocess standard library
+  - Access to the process of the infuser and fusermount
+- sys standard library
+  - Access to the command line arguments and the interpreter
+- tempfile standard library
+  - Access to temporary directories
+- time standard library
+  - Access to a performance counter
+
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from infuser_setup import mount_options
+from infuser_setup import mount_profiles
+
+INFUSER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "infuser.py")
+POLICY = """[read]
+/.* = allow
+[write]
+/.* = allow
+[execute]
+/.* = allow
+"""
+CHUNK = 1024 * 1024
+
+
+def sequential(mountpoint: str, mebibytes: int) -> tuple:
+    """
+    Write a file in chunks of 1 MiB, read it again and return MiB/s of both
+    """
+
+    path = os.path.join(mountpoint, "sequential")
+    data = os.urandom(CHUNK)
+    start = time.perf_counter()
+    with open(path, "wb") as file:
+        for _ in range(mebibytes):
+            file.write(data)
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(path, "rb") as file:
+        while file.read(CHUNK):
+            pass
+    read = time.perf_counter() - start
+    os.unlink(path)
+    return mebibytes / written, mebibytes / read
+
+
+def metadata(mountpoint: str, files: int) -> tuple:
+    """
+    Create, stat five times and unlink small files and return the stat and the
+    create/unlink operations per second
+    """
+
+    directory = os.path.join(mountpoint, "metadata")
+    os.mkdir(directory)
+    paths = [os.path.join(directory, f"file{index}") for index in range(files)]
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "wb") as file:
+            file.write(b"x")
+    created = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(5):
+        for path in paths:
+            os.stat(path)
+    stated = time.perf_counter() - start
+    start = time.perf_counter()
+    for path in paths:
+        os.unlink(path)
+    unlinked = time.perf_counter() - start
+    os.rmdir(directory)
+    return 5 * files / stated, 2 * files / (created + unlinked)
+
+
+def sequential_in_process(operations, mebibytes: int) -> tuple:
+    """
+    Write a file in chunks of 1 MiB through the file operations, read it again
+    and return MiB/s of both, like :func:`sequential`
+    """
+
+    data = os.urandom(CHUNK)
+    start = time.perf_counter()
+    fh = operations.create("/sequential", 0o644)
+    for index in range(mebibytes):
+        operations.write("/sequential", data, index * CHUNK, fh)
+    operations.flush("/sequential", fh)
+    operations.release("/sequential", fh)
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    fh = operations.open("/sequential", os.O_RDONLY)
+    offset = 0
+    while chunk := operations.read("/sequential", CHUNK, offset, fh):
+        offset += len(chunk)
+    operations.release("/sequential", fh)
+    read = time.perf_counter() - start
+    operations.unlink("/sequential")
+    return mebibytes / written, mebibytes / read
+
+
+def metadata_in_process(operations, files: int) -> tuple:
+    """
+    Create, stat five times and unlink small files through the file operations
+    and return the stat and the create/unlink operations per second, like
+    :func:`metadata`
+    """
+
+    operations.mkdir("/metadata", 0o755)
+    paths = [f"/metadata/file{index}" for index in range(files)]
+    start = time.perf_counter()
+    for path in paths:
+        fh = operations.create(path, 0o644)
+        operations.write(path, b"x", 0, fh)
+        operations.flush(path, fh)
+        operations.release(path, fh)
+    created = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(5):
+        for path in paths:
+            operations.getattr(path)
+    stated = time.perf_counter() - start
+    start = time.perf_counter()
+    for path in paths:
+        operations.unlink(path)
+    unlinked = time.perf_counter() - start
+    operations.rmdir("/metadata")
+    return 5 * files / stated, 2 * files / (created + unlinked)
+
+
+def run_in_process(profile: str, directory: str, mebibytes: int, files: int) -> tuple:
+    """
+    Run the workloads through the file operations of a profile
+    """
+
+    from fileoperations import FileOperations
+
+    _, file_options = mount_options(profile)
+    source = os.path.join(directory, profile + "-source")
+    os.mkdir(source)
+    operations = FileOperations(source, **file_options)
+    operations.init("/")
+    try:
+        return sequential_in_process(operations, mebibytes) + metadata_in_process(operations, files)
+    finally:
+        operations.destroy("/")
+
+
+def mount(profile: str, directory: str) -> subprocess.Popen:
+    """
+    Mount the source directory with the infuser and a profile and wait for the mount
+    """
+
+    for name in ("source", "mountpoint"):
+        os.mkdir(os.path.join(directory, profile + "-" + name))
+    policy_file = os.path.join(directory, "policy.ini")
+    with open(policy_file, "w") as file:
+        file.write(POLICY)
+    mountpoint = os.path.join(directory, profile + "-mountpoint")
+    infuser = subprocess.Popen([sys.executable, INFUSER, "-d", os.path.join(directory, profile + "-source"),
+                                "-m", mountpoint, "-p", policy_file,
+                                "-s", os.path.join(directory, profile + "-state.json"),
+                                "-l", os.path.join(directory, profile + ".log"), "--mount-profile", profile])
+    for _ in range(100):
+        if os.path.ismount(mountpoint):
+            return infuser
+        if infuser.poll() is not None:
+            break
+        time.sleep(0.1)
+    infuser.kill()
+    raise RuntimeError(f"Could not mount with profile {profile}")
+
+
+def main():
+    args = sys.argv[1:]
+    in_process = "--in-process" in args
+    if in_process:
+        args.remove("--in-process")
+    mebibytes = int(args[0]) if len(args) > 0 else 256
+    files = int(args[1]) if len(args) > 1 else 2000
+    profiles = args[2:] or list(mount_profiles)
+    print(f"{'profile':>10} | {'write MiB/s':>11} | {'read MiB/s':>10} | {'stat/s':>8} | {'create+unlink/s':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in profiles:
+            if in_process:
+                write, read, stat, create_unlink = run_in_process(profile, directory, mebibytes, files)
+                print(f"{profile:>10} | {write:>11.0f} | {read:>10.0f} | {stat:>8.0f} | {create_unlink:>15.0f}")
+                continue
+            infuser = mount(profile, directory)
+            mountpoint = os.path.join(directory, profile + "-mountpoint")
+            try:
+                write, read = sequential(mountpoint, mebibytes)
+                stat, create_unlink = metadata(mountpoint, files)
+            finally:
+                subprocess.run(["fusermount", "-u", mountpoint])
+                infuser.wait()
+            print(f"{profile:>10} | {write:>11.0f} | {read:>10.0f} | {stat:>8.0f} | {create_unlink:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark for concurrent reads of one file handle through the
+:class:`fileoperations.FileOperations`, like the FUSE worker threads of a
+mount reading a file for an application with several threads. Compares the
+former lseek and read per chunk with the positional read and checks every
+chunk, as readers sharing the offset of the file handle may get the data
+of another offset.
+
+Usage: python3 benchmarks/bench_parallel_read.py [seconds] [threads ...]
+
+Libraries/Modules:
+
+- os standard library
+  - Access to the syscalls and path functions
+- random standard library
+  - Access to the offsets of the chunks
+- sys standard library
+  - Access to the command line arguments
+- tempfile standard library
+  - Access to a temporary directory for the file
+- threading standard library
+  - Access to the concurrent readers
+- time standard library
+  - Access to a performance counter
+
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fileoperations import FileOperations
+
+CHUNK = 4096
+CHUNKS = 4096
+
+
+def chunk(index: int) -> bytes:
+    """
+    Return the content of a chunk of the file, different for every chunk
+    """
+
+    return index.to_bytes(4, "big") * (CHUNK // 4)
+
+
+def lseek_read(path, length, offset, fh):
+    # The former implementation of FileOperations.read
+    os.lseek(fh, offset, os.SEEK_SET)
+    return os.read(fh, length)
+
+
+def measure(read, fh: int, seconds: float, threads: int) -> tuple:
+    """
+    Read random chunks from several threads and return the chunks per second
+    and the number of chunks with wrong content
+    """
+
+    reads = []
+    errors = []
+    deadline = time.perf_counter() + seconds
+
+    def run(seed: int):
+        generator = random.Random(seed)
+        count = wrong = 0
+        while time.perf_counter() < deadline:
+            index = generator.randrange(CHUNKS)
+            if read("/file", CHUNK, index * CHUNK, fh) != chunk(index):
+                wrong += 1
+            count += 1
+        reads.append(count)
+        errors.append(wrong)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=run, args=(seed,)) for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(reads) / (time.perf_counter() - start), sum(errors)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    counts = [int(arg) for arg in sys.argv[2:]] or [1, 4, 16]
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "file"), "wb") as file:
+            for index in range(CHUNKS):
+                file.write(chunk(index))
+        operations = FileOperations(directory)
+        fh = operations.open("/file", os.O_RDONLY)
+        try:
+            print(f"{'threads':>7} | {'implementation':>14} | {'chunks/s':>10} | {'wrong chunks':>12}")
+            for threads in counts:
+                for name, read in (("lseek + read", lseek_read), ("pread", operations.read)):
+                    rate, wrong = measure(read, fh, seconds, threads)
+                    print(f"{threads:>7} | {name:>14} | {rate:>10.0f} | {wrong:>12}")
+        finally:
+            operations.release("/file", fh)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Load test for the PDP server in :doc:`server`. Starts the server in its own
+process and measures the requests per second of a number of concurrent
+clients, each of which keeps its connection open and sends one request after
+another like a FUSE worker thread of the :doc:`infuser`.
+
+Usage: python3 benchmarks/bench_pdp_server.py [seconds] [clients ...]
+
+Libraries/Modules:
+
+- asyncio standard library
+  - Access to the concurrent clients
+- os standard library
+  - Access to path functions
+- subprocess standard library
+  - Access to the process of the server
+- sys standard library
+  - Access to the command line arguments and the interpreter
+- time standard library
+  - Access to a performance counter
+
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+PORT = 22330
+
+
+async def client(deadline: float) -> int:
+    """
+    Send requests on one connection until the deadline and return their number
+    """
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    requests = 0
+    while time.perf_counter() < deadline:
+        writer.write(b"/foo/a,read")
+        await writer.drain()
+        received = b""
+        while not received.endswith((b",True", b",False")):
+            received += await reader.read(4096)
+        requests += 1
+    writer.close()
+    return requests
+
+
+async def load(clients: int, seconds: float) -> float:
+    """
+    Run concurrent clients and return the requests per second of all of them
+    """
+
+    start = time.perf_counter()
+    requests = await asyncio.gather(*(client(start + seconds) for _ in range(clients)))
+    return sum(requests) / (time.perf_counter() - start)
+
+
+async def wait_for_server():
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("The server did not start")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    counts = [int(arg) for arg in sys.argv[2:]] or [1, 16, 128]
+    server = subprocess.Popen([sys.executable, SERVER, "--port", str(PORT)])
+    try:
+        asyncio.run(wait_for_server())
+        print(f"{'clients':>7} | {'requests/s':>10}")
+        for clients in counts:
+            print(f"{clients:>7} | {asyncio.run(load(clients, seconds)):>10.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
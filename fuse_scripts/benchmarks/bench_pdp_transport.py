@@ -0,0 +1,99 @@
+"""
+Benchmark for the latency of one decision of a co-located PDP reached via
+loopback TCP and via a Unix domain socket. Starts the server in
+:doc:`server` on both transports and sends one request after another through
+the :class:`pdp_client.PDPClient` of the :doc:`infuser`, in the binary and in
+the legacy protocol.
+
+Usage: python3 benchmarks/bench_pdp_transport.py [requests]
+
+Libraries/Modules:
+
+- os standard library
+  - Access to path functions
+- statistics standard library
+  - Access to the quantiles of the latencies
+- subprocess standard library
+  - Access to the processes of the servers
+- sys standard library
+  - Access to the command line arguments and the interpreter
+- tempfile standard library
+  - Access to a temporary directory for the socket
+- time standard library
+  - Access to a performance counter
+
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pdp_client import PDPClient
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+PORT = 22331
+
+
+def wait_for_server(address):
+    client = PDPClient(timeout=0.5)
+    try:
+        for _ in range(100):
+            try:
+                client.authorize(address, "/foo/a", "read")
+                return
+            except OSError:
+                time.sleep(0.05)
+    finally:
+        client.close()
+    raise RuntimeError("The server did not start")
+
+
+def measure(address, protocol: str, requests: int) -> list:
+    """
+    Send requests one after another and return their latencies in microseconds
+    """
+
+    client = PDPClient(protocol=protocol)
+    try:
+        # The first request connects
+        client.authorize(address, "/foo/a", "read")
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.authorize(address, "/foo/a", "read")
+            latencies.append((time.perf_counter() - start) * 1e6)
+    finally:
+        client.close()
+    return latencies
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "pdp.sock")
+        servers = [subprocess.Popen([sys.executable, SERVER, "--port", str(PORT)]),
+                   subprocess.Popen([sys.executable, SERVER, "--socket", socket_path])]
+        try:
+            transports = (("tcp", ("127.0.0.1", PORT)), ("unix", socket_path))
+            for _, address in transports:
+                wait_for_server(address)
+            print(f"{'transport':>9} | {'protocol':>8} | {'mean µs':>8} | {'p50 µs':>8} | {'p99 µs':>8}")
+            for transport, address in transports:
+                for protocol in ("binary", "legacy"):
+                    latencies = measure(address, protocol, requests)
+                    percentiles = statistics.quantiles(latencies, n=100)
+                    print(f"{transport:>9} | {protocol:>8} | {statistics.fmean(latencies):>8.1f} | "
+                          f"{percentiles[49]:>8.1f} | {percentiles[98]:>8.1f}")
+        finally:
+            for server in servers:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
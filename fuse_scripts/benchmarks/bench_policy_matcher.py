@@ -0,0 +1,124 @@
+"""
+Benchmark for the policy matching of the :doc:`infuser`. Measures the access
+control decisions per second for policies of different sizes, comparing the
+former per-syscall regex scan with the compiled :class:`infuser_setup.PolicySection`.
+
+Usage: python3 benchmarks/bench_policy_matcher.py [rule counts ...]
+
+Libraries/Modules:
+
+- os standard library
+  - Access to path functions
+- random standard library
+  - Access to random paths
+- re standard library
+  - Access to regular expressions
+- sys standard library
+  - Access to the command line arguments
+- time standard library
+  - Access to a performance counter
+
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import infuser_setup
+
+
+def generate_section(count: int) -> dict:
+    """
+    Generate a section with literal entries, recursive wildcards and a catch-all
+
+    :param count: The number of entries
+    :type count: int
+    :return: The section in the format {<regex>: <allowed>}
+    :rtype: dict
+    """
+
+    entries = {"/": True, "/.*": True}
+    for i in range(count - len(entries)):
+        if i % 2:
+            entries[f"/home/user/dir{i}/file{i}\\.txt"] = bool(i % 3)
+        else:
+            entries[f"/home/user/dir{i}/.*"] = bool(i % 3)
+    return entries
+
+
+def generate_paths(count: int, amount=1000) -> list:
+    """
+    Generate paths hitting literal entries, wildcard entries and the catch-all
+
+    :param count: The number of entries of the section
+    :type count: int
+    :param amount: The number of paths
+    :type amount: int
+    :return: A list of paths
+    :rtype: list
+    """
+
+    rng = random.Random(count)
+    paths = []
+    for _ in range(amount):
+        i = rng.randrange(max(count, 1))
+        paths.append(rng.choice([f"/home/user/dir{i}/file{i}.txt", f"/home/user/dir{i}/sub/x",
+                                 f"/tmp/other{i}"]))
+    return paths
+
+
+def legacy_match(section: dict, path: str):
+    """
+    The matching done by IFS.check_policy before the sections were compiled
+    """
+
+    for key in section.keys():
+        try:
+            regex = re.compile(key)
+        except re.error:
+            continue
+        if not re.match(regex, path) is None:
+            return key
+    return None
+
+
+def decisions_per_second(match, paths: list, budget=2.0) -> float:
+    """
+    Run match over the paths until the time budget is used up
+
+    :param match: The function deciding a path
+    :param paths: The paths to decide
+    :param budget: The minimum runtime in seconds
+    :return: The number of decisions per second
+    :rtype: float
+    """
+
+    decisions = 0
+    start = time.perf_counter()
+    while True:
+        for path in paths:
+            match(path)
+            decisions += 1
+            if time.perf_counter() - start > budget:
+                return decisions / (time.perf_counter() - start)
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 1000, 50000]
+    print(f"{'rules':>8} | {'before (dec/s)':>15} | {'after (dec/s)':>15} | {'speedup':>8}")
+    for count in counts:
+        entries = generate_section(count)
+        paths = generate_paths(count)
+        legacy = infuser_setup.PolicySection(entries)
+        before = decisions_per_second(lambda path: legacy_match(legacy, path), paths)
+        section = infuser_setup.PolicySection(entries)
+        after = decisions_per_second(section.match, paths)
+        print(f"{count:>8} | {before:>15.1f} | {after:>15.1f} | {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark for the decisions per second of the script-backed PDP in
+to_mount/demo/uwu-demo.py. Compares starting bash for every request with
+the pool of long-lived workers in both protocols and with kept verdicts.
+
+Usage: python3 benchmarks/bench_script_pdp.py [seconds] [threads]
+
+Libraries/Modules:
+
+- importlib standard library
+  - Access to the module uwu-demo.py, whose name is no identifier
+- os standard library
+  - Access to path functions
+- subprocess standard library
+  - Access to the former start of bash per request
+- sys standard library
+  - Access to the command line arguments
+- tempfile standard library
+  - Access to a temporary directory for the scripts
+- threading standard library
+  - Access to concurrent requests like the ones of several connections
+- time standard library
+  - Access to a performance counter
+
+"""
+
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEMO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "to_mount", "demo", "uwu-demo.py")
+
+# The same policy as a script run per request and as a script reading the requests
+EXIT_SCRIPT = """#!/bin/bash
+if [ "${1#/home/user/}" != "$1" ] && [ "$2" != "execute" ]; then
+    exit 0
+fi
+exit 1
+"""
+STREAM_SCRIPT = """#!/bin/bash
+while IFS= read -r -d '' id && IFS= read -r -d '' path && IFS= read -r -d '' mode; do
+    if [ "${path#/home/user/}" != "$path" ] && [ "$mode" != "execute" ]; then
+        echo "$id 0"
+    else
+        echo "$id 1"
+    fi
+done
+"""
+
+
+def load_demo():
+    spec = importlib.util.spec_from_file_location("uwu_demo", DEMO)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(authorize, seconds: float, threads: int, files=200) -> float:
+    """
+    Call a function deciding on a path and a mode from several threads and
+    return the decisions per second
+    """
+
+    decisions = []
+    deadline = time.perf_counter() + seconds
+
+    def run():
+        count = 0
+        while time.perf_counter() < deadline:
+            authorize(f"/home/user/file{count % files}", "read")
+            count += 1
+        decisions.append(count)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(decisions) / (time.perf_counter() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    demo = load_demo()
+    with tempfile.TemporaryDirectory() as directory:
+        exit_script = os.path.join(directory, "exit.sh")
+        stream_script = os.path.join(directory, "stream.sh")
+        with open(exit_script, "w") as file:
+            file.write(EXIT_SCRIPT)
+        with open(stream_script, "w") as file:
+            file.write(STREAM_SCRIPT)
+
+        results = [("bash per request", measure(
+            lambda path, mode: subprocess.run(['bash', exit_script, path, mode], capture_output=True).returncode == 0,
+            seconds, threads))]
+        for name, script, protocol, ttl in (("pool, exit", exit_script, "exit", 0.0),
+                                            ("pool, stream", stream_script, "stream", 0.0),
+                                            ("pool, stream, ttl 1 s", stream_script, "stream", 1.0)):
+            pool = demo.ScriptPool(script, threads, protocol, cache_ttl=ttl)
+            results.append((name, measure(pool.authorize, seconds, threads)))
+            pool.close()
+
+    print(f"{threads} threads")
+    print(f"{'':>22} | {'decisions/s':>11}")
+    for name, rate in results:
+        print(f"{name:>22} | {rate:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark for the memory of the internal state of the :doc:`infuser`. Compares
+the former dictionaries with formatted timestamps to :class:`state_store.StateEntry`
+for a number of recorded accesses to a working set of files.
+
+Usage: python3 benchmarks/bench_state_memory.py [entries] [distinct files]
+
+Libraries/Modules:
+
+- datetime standard library
+  - Access to the former timestamps
+- os standard library
+  - Access to path functions
+- sys standard library
+  - Access to the command line arguments
+- time standard library
+  - Access to the epoch time
+- tracemalloc standard library
+  - Access to the allocated memory
+
+"""
+
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from state_store import StateEntry
+from state_store import access_code
+
+ACCESSES = ["open", "read", "read", "read", "write", "readdir"]
+
+last_epoch = None
+
+
+def legacy_time(fmt="%Y-%m-%d %H:%M:%S") -> str:
+    """
+    The timestamp of an entry before StateEntry
+    """
+
+    local_timezone = datetime.datetime.utcnow().astimezone().tzinfo
+    return datetime.datetime.now(local_timezone).strftime(fmt)
+
+
+def legacy_entry(path: str, access: str) -> dict:
+    """
+    An entry as created by State.append before StateEntry
+    """
+
+    return {"Path": path, "Prefix": os.path.dirname(path), "Access": access,
+            "Time": legacy_time(), "Success": True}
+
+
+def compact_entry(path: str, access: str) -> StateEntry:
+    """
+    An entry as created by State.append, entries of the same second share one int object
+    """
+
+    global last_epoch
+    if (epoch := int(time.time())) != last_epoch:
+        last_epoch = epoch
+    return StateEntry(path, os.path.dirname(path), access_code(access), last_epoch, True)
+
+
+def measure(create, count: int, files: int) -> int:
+    """
+    Record the accesses and return the allocated memory
+
+    :param create: The function creating an entry from a path and an access
+    :param count: The number of entries
+    :param files: The number of distinct files
+    :return: The allocated memory in bytes
+    :rtype: int
+    """
+
+    tracemalloc.start()
+    entries = []
+    for i in range(count):
+        # Every path is a new string object, like the paths passed by FUSE
+        path = f"/home/user/.mozilla/firefox/profile/dir{i % files // 64}/file{i % files}.sqlite"
+        entries.append(create(path, ACCESSES[i % len(ACCESSES)]))
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    before = measure(legacy_entry, count, files)
+    after = measure(compact_entry, count, files)
+    print(f"{count} entries on {files} files")
+    print(f"{'':>8} | {'total (MiB)':>12} | {'per entry (B)':>13}")
+    print(f"{'before':>8} | {before / 2 ** 20:>12.1f} | {before / count:>13.1f}")
+    print(f"{'after':>8} | {after / 2 ** 20:>12.1f} | {after / count:>13.1f}")
+    print(f"reduction: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
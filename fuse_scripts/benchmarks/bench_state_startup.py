@@ -0,0 +1,91 @@
+"""
+Benchmark for loading the internal state of the :doc:`infuser` before the file
+system is mounted. Compares replaying the whole state file with loading its
+snapshot and replaying only the tail.
+
+Usage: python3 benchmarks/bench_state_startup.py [entries ...]
+
+Libraries/Modules:
+
+- gc standard library
+  - Access to the garbage collector
+- os standard library
+  - Access to path functions
+- sys standard library
+  - Access to the command line arguments
+- tempfile standard library
+  - Access to a temporary directory
+- time standard library
+  - Access to a performance counter
+
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import state_store
+
+ACCESSES = ["open", "read", "read", "read", "write", "readdir"]
+
+# Entries appended after the snapshot has been written
+TAIL = 10000
+
+
+def generate(state_file: str, count: int, files=20000) -> None:
+    """
+    Write a state file with accesses to a working set of files
+
+    :param state_file: The path of the state file
+    :param count: The number of entries
+    :param files: The number of distinct files
+    """
+
+    with open(state_file, "w") as file:
+        for i in range(count):
+            directory = f"/home/user/.mozilla/firefox/profile/dir{i % files // 64}"
+            file.write(f'{{"Path": "{directory}/file{i % files}.sqlite", "Prefix": "{directory}", '
+                       f'"Access": "{ACCESSES[i % len(ACCESSES)]}", '
+                       f'"Time": "{state_store.format_time(1700000000 + i // 1000)}", "Success": true}}\n')
+
+
+def timed_load(state_file: str) -> float:
+    """
+    Load the state file and return the seconds it took
+    """
+
+    gc.collect()
+    start = time.perf_counter()
+    entries, _ = state_store.load_state(state_file)
+    seconds = time.perf_counter() - start
+    del entries
+    return seconds
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000000, 10000000]
+    print(f"{'entries':>9} | {'full replay (s)':>15} | {'snapshot + tail (s)':>19} | {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in counts:
+            state_file = os.path.join(directory, f"state-{count}.json")
+            generate(state_file, count - TAIL)
+            state_store.convert(state_file)
+            generate(state_file + ".tail", TAIL)
+            with open(state_file, "a") as file, open(state_file + ".tail") as tail:
+                file.write(tail.read())
+
+            os.rename(state_store.snapshot_path(state_file), state_file + ".keep")
+            before = timed_load(state_file)
+            os.rename(state_file + ".keep", state_store.snapshot_path(state_file))
+            after = timed_load(state_file)
+            print(f"{count:>9} | {before:>15.2f} | {after:>19.2f} | {before / after:>7.1f}x")
+            for file in os.listdir(directory):
+                os.remove(os.path.join(directory, file))
+
+
+if __name__ == "__main__":
+    main()
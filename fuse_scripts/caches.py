@@ -0,0 +1,187 @@
+"""
+Caches used by the :doc:`infuser` to avoid repeating access control decisions
+and by the :doc:`fileoperations` to avoid repeating lstat and access calls.
+
+Libraries/Modules:
+
+- threading standard library
+  - Access to locks, as the FUSE operations are called from several threads
+- time standard library
+  - Access to a monotonic clock
+- collections standard library
+  - Access to OrderedDict
+
+"""
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe cache that evicts the least recently used entry
+
+    Every flush starts a new generation. Values computed before a flush are
+    ignored when they are stored afterwards, so a flush is atomic even for
+    decisions that are still in flight. The hits and misses are counted to
+    help sizing the cache.
+
+    :param size: The maximum number of entries. 0 disables the cache
+    :type size: int
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the value of a key and mark it as recently used
+
+        :param key: The key to look up
+        :return: The value or None if the key is not cached
+        """
+
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation: int) -> None:
+        """
+        Store the value of a key, evicting the least recently used entry if necessary
+
+        :param key: The key to store
+        :param value: The value to store
+        :param generation: The generation read before the value was computed
+        :type generation: int
+        """
+
+        with self._lock:
+            if generation != self.generation or self.size <= 0:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys) -> None:
+        """
+        Remove the entries of some keys and start a new generation, so values
+        computed before the invalidation are not stored afterwards
+
+        :param keys: The keys to remove
+        """
+
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self.generation += 1
+
+    def flush(self) -> None:
+        """
+        Remove all entries and start a new generation
+        """
+
+        with self._lock:
+            self._entries = OrderedDict()
+            self.generation += 1
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the cache
+
+        :return: The hits, misses, hit rate, the number of entries and the size
+        :rtype: dict
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self._entries), "size": self.size}
+
+
+class TTLCache(LRUCache):
+    """
+    Bounded, thread-safe cache whose entries expire after a time to live
+
+    Like :class:`LRUCache`, the least recently used entry is evicted when the
+    cache is full and a flush starts a new generation. Every entry has its own
+    time to live, e.g. to keep allowed and denied decisions for different times.
+
+    :param size: The maximum number of entries. 0 disables the cache
+    :type size: int
+    """
+
+    def get(self, key):
+        """
+        Return the value of a key that has not expired and mark it as recently used
+
+        :param key: The key to look up
+        :return: The value or None if the key is not cached or has expired
+        """
+
+        with self._lock:
+            try:
+                value, expires = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation: int, ttl=0.0) -> None:
+        """
+        Store the value of a key for a time to live
+
+        :param key: The key to store
+        :param value: The value to store
+        :param generation: The generation read before the value was computed
+        :type generation: int
+        :param ttl: The seconds until the value expires. 0 does not store the value
+        :type ttl: float
+        """
+
+        if ttl > 0:
+            super().put(key, (value, time.monotonic() + ttl), generation)
+
+    def put_many(self, items, generation: int, ttl=0.0) -> None:
+        """
+        Store the values of many keys for the same time to live with one lookup
+        of the clock and the lock, e.g. the attributes of a directory listing
+
+        :param items: The (key, value) pairs, the last ones are the most recently used
+        :param generation: The generation read before the values were computed
+        :type generation: int
+        :param ttl: The seconds until the values expire. 0 does not store the values
+        :type ttl: float
+        """
+
+        if ttl <= 0:
+            return
+        expires = time.monotonic() + ttl
+        with self._lock:
+            if generation != self.generation or self.size <= 0:
+                return
+            for key, value in items:
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
@@ -2,6 +2,24 @@
 Implementation of sycalls for a FUSE based file system using fuse.py.
 The operations are overwritten and used in the :doc:`infuser`.
 
+When written data reaches the disk depends on the durability of the mount:
+
+- passthrough: Like a native file system. close() only closes the file, the
+  data is synced when the application calls fsync(2) or fdatasync(2), which
+  are passed through as such. Otherwise the kernel writes it back.
+- batched: close() returns without waiting for the disk. A background thread
+  syncs every file handle written since its last run every sync interval, so
+  at most the writes of one interval are lost in a crash. fsync(2) and
+  fdatasync(2) of the application still sync right away.
+- strict: Every close() (FUSE flush) and every fsync(2) or fdatasync(2) does
+  a full fsync of the file before it returns.
+
+The attributes (getattr) and the results of access checks are cached per
+path for a short time to live in addition to the attr_timeout of the kernel.
+Every mutating operation through the mount invalidates the paths it changes
+(and their parent directory), so only changes made outside of the mount may
+be seen late, by at most the time to live.
+
 Created by Alexander Krause on 02/28/2023.
 Modified by Stephan Winker from 10/01/2023 to 28/02/2024.
 
@@ -13,6 +31,14 @@ Libraries/Modules:
   - Access to logging functionality
 - errno standard library
   - Access to error messages
+- os standard library
+  - Access to the syscalls, e.g. positional reads and writes
+- threading standard library
+  - Access to the lock of the open-file table
+- operator standard library
+  - Access to attrgetter to read the attributes of a stat result at once
+- caches
+  - Access to the cache of the attributes and access checks
 
 .. note:: Seems to be inspired by the work of stavros https://www.stavros.io/posts/python-fuse-filesystem/
 
@@ -24,14 +50,175 @@ Libraries/Modules:
 import errno
 import os
 import logging
+import threading
+
+from operator import attrgetter
 
 from fuse import FuseOSError
 from fuse import Operations
 
+from caches import TTLCache
+
+# Attributes of os.lstat returned by getattr, st_ino is used by the kernel with the mount option use_ino
+ATTRIBUTES = ('st_atime', 'st_ctime', 'st_gid', 'st_ino', 'st_mode', 'st_mtime', 'st_nlink', 'st_size', 'st_uid')
+get_attributes = attrgetter(*ATTRIBUTES)
+
+
+class OpenFile:
+    """
+    Entry of the open-file table for one file handle
+
+    :param path: The path of the file in the mount
+    :type path: str
+    :param flags: The flags the file was opened with
+    :type flags: int
+    :param decision: The decision that allowed opening the file, e.g. ("read", "open")
+    :type decision: tuple
+    """
+
+    __slots__ = ("path", "flags", "decision")
+
+    def __init__(self, path: str, flags: int, decision=None):
+        self.path = path
+        self.flags = flags
+        self.decision = decision
+
+
+class FileSyncer:
+    """
+    Background thread syncing the written file handles of a mount with durability "batched"
+
+    File handles that are released before they have been synced are closed
+    by the thread after their sync, so their number can not be reused by
+    another file in the meantime. The thread is started by :meth:`start`,
+    when the file system is mounted.
+
+    :param interval: The milliseconds between two syncs
+    :type interval: int
+    """
+
+    def __init__(self, interval=1000):
+        self.log = logging.getLogger('infuser')
+        self.interval = interval / 1000
+        self.syncs = 0
+        self.errors = 0
+        # File handles written since the last sync, being synced and released while written
+        self._dirty = set()
+        self._syncing = set()
+        self._closing = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="file-syncer", daemon=True)
+
+    def start(self) -> None:
+        """
+        Start the thread
+        """
+
+        self.thread.start()
+
+    def mark(self, fh: int) -> None:
+        """
+        Remember that a file handle has been written
+        """
+
+        with self._lock:
+            self._dirty.add(fh)
+
+    def release(self, fh: int) -> None:
+        """
+        Close a file handle, or let the thread close it after its sync if it has been written
+        """
+
+        with self._lock:
+            if fh in self._dirty or fh in self._syncing:
+                self._dirty.discard(fh)
+                self._closing.append(fh)
+                return
+        os.close(fh)
+
+    def run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            self.sync()
+        self.sync()
+
+    def sync(self) -> None:
+        """
+        Sync the written file handles and close the released ones
+        """
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            closing, self._closing = self._closing, []
+            self._syncing = dirty
+        for fh in list(dirty) + closing:
+            try:
+                os.fsync(fh)
+                self.syncs += 1
+            except OSError as e:
+                self.errors += 1
+                self.log.error(f"ERROR - Could not sync file handle {fh} - {e}")
+        for fh in closing:
+            os.close(fh)
+        with self._lock:
+            self._syncing = set()
+
+    def close(self) -> None:
+        """
+        Sync and close the remaining file handles and stop the thread
+        """
+
+        if self.thread.ident is None:
+            self.start()
+        self._stopping.set()
+        self.thread.join()
+        self.log.info(f"File syncer statistics: {self.stats()}")
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the syncer
+
+        :return: The syncs, the failed syncs and the number of file handles waiting for a sync
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {"syncs": self.syncs, "errors": self.errors, "dirty": len(self._dirty) + len(self._closing)}
+
+
 class FileOperations(Operations):
-    def __init__(self, dir_to_mount):
+    durabilities = ["passthrough", "batched", "strict"]
+
+    def __init__(self, dir_to_mount, durability="strict", sync_interval=1000, attr_cache_ttl=1.0,
+                 attr_cache_size=16384):
+        if durability not in self.durabilities:
+            raise ValueError(f"Durability {durability} is not permitted. Permitted are: {self.durabilities}")
         self.dir_to_mount = dir_to_mount
         self.log = logging.getLogger('infuser')
+        # Open files by file handle. FUSE calls the operations from several threads
+        self.open_files = {}
+        self.open_files_lock = threading.Lock()
+        # See the module description for the semantics of the durabilities
+        self.durability = durability
+        self.syncer = FileSyncer(sync_interval) if durability == "batched" else None
+        # Attributes by path and results of access checks by (path, mode). A TTL of 0 disables the caches
+        self.attr_cache_ttl = attr_cache_ttl
+        self.attr_cache = TTLCache(attr_cache_size)
+        self.access_cache = TTLCache(attr_cache_size)
+
+    # Starts the syncer when the file system is mounted. libfuse may have forked into the background
+    # before, which the threads started in the constructor would not survive
+    def init(self, path):
+        if self.syncer is not None:
+            self.syncer.start()
+
+    # Syncs and closes the remaining files when the file system is unmounted
+    def destroy(self, path):
+        if self.syncer is not None:
+            self.syncer.close()
+        if self.attr_cache_ttl > 0:
+            self.log.info(f"Attribute cache statistics: {self.attr_cache.stats()}")
+            self.log.info(f"Access cache statistics: {self.access_cache.stats()}")
 
     ##################
     # Sanitize input #
@@ -45,6 +232,14 @@ class FileOperations(Operations):
         fullpath = os.path.join(self.dir_to_mount, path)
         return fullpath
 
+    # Drops the cached attributes and access checks of changed paths. Called after the change, so values
+    # read before it are not cached anymore. Changes of the content and the times keep the access checks
+    def _invalidate(self, *paths, access=True):
+        if self.attr_cache_ttl > 0:
+            self.attr_cache.invalidate(paths)
+            if access:
+                self.access_cache.invalidate([(path, mode) for path in paths for mode in range(8)])
+
     ########################
     # Filesystem functions #
     ########################
@@ -59,42 +254,77 @@ class FileOperations(Operations):
                 converted_mode = "w"
             case 4:  # Read the contents of a file or directory
                 converted_mode = "r"
-        full_path = self._get_real_path(path)
-        if not os.access(full_path, mode):
+        generation = self.access_cache.generation
+        accessable = self.access_cache.get((path, mode)) if self.attr_cache_ttl > 0 else None
+        if accessable is None:
+            accessable = os.access(self._get_real_path(path), mode)
+            if self.attr_cache_ttl > 0:
+                self.access_cache.put((path, mode), accessable, generation, self.attr_cache_ttl)
+        if not accessable:
             self.log.info(f"ACCESS ({converted_mode}) DENIED --- Path: {path} --- Denied by Operating System")
             raise FuseOSError(errno.EACCES)
         self.log.debug(f"ACCESS ({converted_mode}) GRANTED --- Path: {path} --- Granted by Operating System")
-        return os.access(full_path, mode)
+        return accessable
 
     # Change Permissions of file and folder permissions
     def chmod(self, path, mode):
         full_path = self._get_real_path(path)
-        return os.chmod(full_path, mode)
+        try:
+            return os.chmod(full_path, mode)
+        finally:
+            self._invalidate(path)
 
     # Change ownership of a file or directory
     def chown(self, path, uid, gid):
         full_path = self._get_real_path(path)
-        return os.chown(full_path, uid, gid)
+        try:
+            return os.chown(full_path, uid, gid)
+        finally:
+            self._invalidate(path)
 
     # Get dir and forresponds to UNIX permission r
     def getattr(self, path, fh=None):
+        generation = self.attr_cache.generation
+        if self.attr_cache_ttl > 0 and (attributes := self.attr_cache.get(path)) is not None:
+            return attributes
         full_path = self._get_real_path(path)
         try:
             st = os.lstat(full_path)
         except FileNotFoundError:
             self.log.error(f"FILE NOT FOUND: {path}")
             raise FuseOSError(errno.EEXIST)
-        return dict((key, getattr(st, key)) for key in ('st_atime', 'st_ctime',
-                                                        'st_gid', 'st_mode', 'st_mtime', 'st_nlink', 'st_size',
-                                                        'st_uid'))
+        attributes = dict(zip(ATTRIBUTES, get_attributes(st)))
+        if self.attr_cache_ttl > 0:
+            self.attr_cache.put(path, attributes, generation, self.attr_cache_ttl)
+        return attributes
 
-    # Get all the directory contents (files and subdirs) as list
+    # Get all the directory contents (files and subdirs) as (name, attributes, offset). The attributes of one
+    # scan seed the attribute cache for the getattr calls following the listing
     def readdir(self, path, fh):
         full_path = self._get_real_path(path)
         self.log.debug(f"readdir - {fh} - {path}")
-        directory_contents = ['.', '..']
-        if os.path.isdir(full_path):
-            directory_contents.extend(os.listdir(full_path))
+        # fusepy does not pass the offset of a continued listing to readdir, so all entries have offset 0
+        # and are returned at once
+        directory_contents = [('.', None, 0), ('..', None, 0)]
+        generation = self.attr_cache.generation
+        prefix = path.rstrip('/') + '/'
+        seeds = []
+        try:
+            with os.scandir(full_path) as entries:
+                for entry in entries:
+                    try:
+                        attributes = dict(zip(ATTRIBUTES, get_attributes(entry.stat(follow_symlinks=False))))
+                    except OSError:
+                        # Removed since the scan, the kernel asks getattr for it
+                        directory_contents.append((entry.name, None, 0))
+                        continue
+                    directory_contents.append((entry.name, attributes, 0))
+                    seeds.append((prefix + entry.name, attributes))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        # Seeding more entries than the cache holds would evict the first ones before their getattr
+        if self.attr_cache_ttl > 0:
+            self.attr_cache.put_many(seeds[:self.attr_cache.size], generation, self.attr_cache_ttl)
         for r in directory_contents:
             yield r
 
@@ -109,19 +339,28 @@ class FileOperations(Operations):
 
     # Equivalent to mknod command
     def mknod(self, path, mode, dev):
-        return os.mknod(self._get_real_path(path), mode, dev)
+        try:
+            return os.mknod(self._get_real_path(path), mode, dev)
+        finally:
+            self._invalidate(path, os.path.dirname(path))
 
     # Equivalent to rmdir command
     def rmdir(self, path):
         full_path = self._get_real_path(path)
         self.log.debug(f"rmdir - {path}")
-        return os.rmdir(full_path)
+        try:
+            return os.rmdir(full_path)
+        finally:
+            self._invalidate(path, os.path.dirname(path))
 
     # Equivalent to mkdir command
     def mkdir(self, path, mode):
         full_path = self._get_real_path(path)
         self.log.debug(f"mkdir - {mode} - {path}")
-        return os.mkdir(full_path, mode)
+        try:
+            return os.mkdir(full_path, mode)
+        finally:
+            self._invalidate(path, os.path.dirname(path))
 
     # Returns information about a mounted filesystem
     def statfs(self, path):
@@ -132,26 +371,62 @@ class FileOperations(Operations):
 
     # Equivalent to unlink command
     def unlink(self, path):
-        return os.unlink(self._get_real_path(path))
+        try:
+            return os.unlink(self._get_real_path(path))
+        finally:
+            # Only this path is invalidated, other hard links of the file keep
+            # their cached st_nlink until it expires after attr_cache_ttl
+            self._invalidate(path, os.path.dirname(path))
 
     # Equivalent to symlink command
     def symlink(self, name, target):
-        return os.symlink(name, self._get_real_path(target))
+        try:
+            return os.symlink(name, self._get_real_path(target))
+        finally:
+            self._invalidate(target, os.path.dirname(target))
 
     # Equivalent to "mv <old> <new>" command
     def rename(self, old, new):
         old_full_path = self._get_real_path(old)
         new_full_path = self._get_real_path(new)
         self.log.debug(f"rename - {old} - {new}")
-        return os.rename(old_full_path, new_full_path)
+        try:
+            return os.rename(old_full_path, new_full_path)
+        finally:
+            # The paths of everything below a renamed directory change
+            if self.attr_cache_ttl > 0 and os.path.isdir(new_full_path):
+                self.attr_cache.flush()
+                self.access_cache.flush()
+            else:
+                self._invalidate(old, new, os.path.dirname(old), os.path.dirname(new))
 
     # Equivalent to link command
     def link(self, target, name):
-        return os.link(self._get_real_path(target), self._get_real_path(name))
+        try:
+            return os.link(self._get_real_path(target), self._get_real_path(name))
+        finally:
+            self._invalidate(target, name, os.path.dirname(name))
 
     # Changes the timestamp of a file or dir
     def utimens(self, path, times=None):
-        return os.utime(self._get_real_path(path), times)
+        try:
+            return os.utime(self._get_real_path(path), times)
+        finally:
+            self._invalidate(path, access=False)
+
+    ###################
+    # Open-file table #
+    ###################
+
+    # Records an opened file handle
+    def register_open_file(self, fh, path, flags, decision=None):
+        with self.open_files_lock:
+            self.open_files[fh] = OpenFile(path, flags, decision)
+
+    # Returns the entry of a file handle or None if it is not open
+    def get_open_file(self, fh):
+        with self.open_files_lock:
+            return self.open_files.get(fh)
 
     ###############
     # File access #
@@ -161,41 +436,76 @@ class FileOperations(Operations):
     def open(self, path, flags):
         full_path = self._get_real_path(path)
         self.log.debug(f"open - {flags} - {path}")
-        return os.open(full_path, flags)
+        try:
+            fh = os.open(full_path, flags)
+        finally:
+            if flags & (os.O_CREAT | os.O_TRUNC):
+                self._invalidate(path, os.path.dirname(path))
+        self.register_open_file(fh, path, flags)
+        return fh
 
     # Creates a file
     def create(self, path, mode, fi=None):
         full_path = self._get_real_path(path)
-        return os.open(full_path, os.O_WRONLY | os.O_CREAT, mode)
+        flags = os.O_WRONLY | os.O_CREAT
+        try:
+            fh = os.open(full_path, flags, mode)
+        finally:
+            self._invalidate(path, os.path.dirname(path))
+        self.register_open_file(fh, path, flags)
+        return fh
 
     # Reads the content of a file
     def read(self, path, length, offset, fh):
         # CAUTION: Conversion to full_path not useful here because read is being called with a filehandler
-        os.lseek(fh, offset, os.SEEK_SET)
+        # pread does not move the offset of the file handle, so threads reading the same file do not race
         self.log.debug(f"read - {path}")
-        return os.read(fh, length)
+        return os.pread(fh, length, offset)
 
     # Writes to a file
     def write(self, path, buf, offset, fh):
         # CAUTION: Conversion to full_path not useful here because write is being called with a filehandler
-        os.lseek(fh, offset, os.SEEK_SET)
         self.log.debug(f"write - {path}")
-        return os.write(fh, buf)
+        try:
+            written = os.pwrite(fh, buf, offset)
+        finally:
+            self._invalidate(path, access=False)
+        # Only written data is due for a sync
+        if self.syncer is not None:
+            self.syncer.mark(fh)
+        return written
 
     # Sets the file to "length". Cuts content > length or adds '\0' bytes if the file was shorter than "length"
     def truncate(self, path, length, fh=None):
-        full_path = self._get_real_path(path)
-        with open(full_path, 'r+') as f:
-            f.truncate(length)
-
-    # Forces a write-operation for all buffered data
+        try:
+            # ftruncate(2) on an open file, e.g. by the application, without opening it again
+            if fh is not None:
+                os.ftruncate(fh, length)
+                if self.syncer is not None:
+                    self.syncer.mark(fh)
+                return
+            return os.truncate(self._get_real_path(path), length)
+        finally:
+            self._invalidate(path, access=False)
+
+    # Gets called on every close() of the file. Only forces a write-operation for all buffered data
+    # with durability "strict"
     def flush(self, path, fh):
-        return os.fsync(fh)
+        if self.durability == "strict":
+            return os.fsync(fh)
 
     # Release file lock and close file
     def release(self, path, fh):
+        with self.open_files_lock:
+            self.open_files.pop(fh, None)
+        if self.syncer is not None:
+            return self.syncer.release(fh)
         return os.close(fh)
 
-    # Forces a write-operation for all buffered data
+    # Forces a write-operation for all buffered data, only of the data (and the size) for fdatasync(2)
     def fsync(self, path, fdatasync, fh):
-        return self.flush(path, fh)
+        if self.durability == "strict":
+            return self.flush(path, fh)
+        if fdatasync:
+            return os.fdatasync(fh)
+        return os.fsync(fh)
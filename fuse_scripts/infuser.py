@@ -12,8 +12,6 @@ Libraries/Modules:
 - Python interface to the FUSE kernel module
 - magic (https://github.com/ahupp/python-magic)
 - Access to mime types
-- datetime standard library
-- Access to current date and time
 - logging standard library
 - Access to logging functionality
 - errno standard library
@@ -30,6 +28,18 @@ Libraries/Modules:
 - Access to toml parsing functions
 - socket standard library
 - Access to networking functions
+- threading standard library
+- Access to locks
+- concurrent.futures standard library
+- Access to a thread pool querying redundant PDPs concurrently
+- bisect standard library
+- Access to the binary search in the time-ordered history
+- collections standard library
+- Access to Counter
+- operator standard library
+- Access to attrgetter
+- time standard library
+- Access to the current time and a performance counter
 
 .. note:: If open is denied/broken, access gets called
 
@@ -47,8 +57,9 @@ Libraries/Modules:
 """
 
 
+import bisect
+import concurrent.futures
 import errno
-import datetime
 import logging
 import re
 import sys
@@ -56,16 +67,41 @@ import os
 import json
 import tomllib
 import socket
+import threading
+import time
+
+from collections import Counter
+from operator import attrgetter
 
 import magic
 from fuse import FUSE
 from fuse import FuseOSError
 
 import infuser_setup
+from caches import LRUCache
+from caches import TTLCache
 from fileoperations import FileOperations
+from pdp_client import CircuitOpenError
+from pdp_client import PDPClient
+from pdp_client import describe
+from state_store import StateEntry
+from state_store import StateWriter
+from state_store import access_code
+from state_store import format_time
+from state_store import load_state
+from watcher import block_signal
+from watcher import unwatch_signal
+from watcher import watch_files
+from watcher import watch_signal
 
 # All the policies relying on the internal state
 sbac_policies = ["written-no-execute", "first-object-only"]
+
+# Cached instead of a decision for paths that are subject to a stateful policy
+STATEFUL = object()
+
+# Modes the PDPs are asked for in advance for the children of a listed directory, if enabled
+PREAUTHORIZED_MODES = ("open", "read")
     
 current_flag = None
     
@@ -81,7 +117,7 @@ def set_current_flag(flag: str):
     global current_flag
     current_flag = flag
 
-def is_execution_intended(self, mode: str) -> bool:
+def is_execution_intended(mode: str) -> bool:
      """
      Check whether the O_EXEC flag is set on the open syscall. This flag 
      get enables to indicate the intention to execute an object.
@@ -103,16 +139,18 @@ def current_time(fmt="%Y-%m-%d %H:%M:%S") -> str:
     :rtype: str 
     """
 
-    local_timezone = datetime.datetime.utcnow().astimezone().tzinfo
-    return datetime.datetime.now(local_timezone).strftime(fmt)
+    return time.strftime(fmt)
 
 
-def parse_toml(file: str) -> list:
+def parse_toml(file: str, strict=False) -> list:
     """
     Return the lines of a de-duplicated toml as a list.
 
     :param file: The path of the toml file to be read.
     :type file: str
+    :param strict: Raise the error instead of returning an empty list,
+                   e.g. when reloading the toml of a running file system
+    :type strict: bool
     :return: A list of unique lines from a toml.
     :rtype: list
     """
@@ -125,13 +163,18 @@ def parse_toml(file: str) -> list:
             data = file.read()
         toml_entries = tomllib.loads(data)
     except FileNotFoundError:
+        if strict:
+            raise
         logger.error(f"ERROR - Could not load TOML data from file - File {file} does not exist.")
     except tomllib.TOMLDecodeError:
+        if strict:
+            raise
         logger.error(f"ERROR - Could not load TOML data from file - {file} has no valid TOML data.")
     except Exception as e:
+        if strict:
+            raise
         logger.error(f"ERROR - An unexpected error occurred while loading data from file - {e}")
-    finally:
-        return toml_entries
+    return toml_entries
 
 class IFS(FileOperations):
     """
@@ -154,17 +197,151 @@ class IFS(FileOperations):
     :type uri_file: str
     :param state_file: The path to a json file containing a recorded internal state
     :type state_file: str
+    :param decision_cache_size: The number of cached decisions on paths without stateful policies
+    :type decision_cache_size: int
+    :param policy_file: The path to the (ini) policy file, that is parsed again by reload_policy
+    :type policy_file: str
+    :param state_options: The keyword arguments of the :class:`state_store.StateWriter`
+    :type state_options: dict
+    :param retention: The retention of the internal state in memory (see :class:`IFS.State`)
+    :type retention: dict
+    :param client_options: The keyword arguments of the :class:`pdp_client.PDPClient`
+    :type client_options: dict
+    :param uri_cache: The cache of the verdicts of the PDPs: "size" and the seconds
+                      "allow_ttl" and "deny_ttl" an allowed or denied access is kept, and
+                      "preauthorize", whether the PDPs are asked in advance for the children
+                      of a listed directory (off by default)
+    :type uri_cache: dict
+    :param redundancy: The decision of redundant PDPs: "deadline" in seconds for all of
+                       them and "quorum", the number of allowing PDPs (0 means all), and
+                       "unavailable", the verdict ("deny" or "allow") of a PDP whose
+                       circuit breaker is open
+    :type redundancy: dict
+    :param file_options: The keyword arguments of the :class:`fileoperations.FileOperations`,
+                         e.g. the "durability"
+    :type file_options: dict
     """
      
-    def __init__(self, dir_to_mount: str, policy_dict: dict, uri_file: str, state_file: str):
+    def __init__(self, dir_to_mount: str, policy_dict: dict, uri_file: str, state_file: str,
+                 decision_cache_size=4096, policy_file=None, state_options=None, retention=None,
+                 client_options=None, uri_cache=None, redundancy=None, file_options=None):
     
         self.log = logging.getLogger("infuser")
         self.dir_to_mount = dir_to_mount
-        self.policy = policy_dict
+        self.policy_file = policy_file
         self.uri_file = uri_file
-        self.uri_entries = parse_toml(self.uri_file) if uri_file else None
-        self.state = self.State(self.dir_to_mount, state_file)
-        super().__init__(dir_to_mount)
+        # The policy and the entries of the toml are replaced together, a decision reads both from one snapshot
+        self.rules = (infuser_setup.compile_policy(policy_dict),
+                      infuser_setup.URIEntries(parse_toml(self.uri_file)) if uri_file else None)
+        self.uri_client = PDPClient(**(client_options or {}))
+        self.uri_client.fix_protocols(self.uri_entries.protocols if self.uri_entries else {})
+        uri_cache = uri_cache or {}
+        self.uri_cache = TTLCache(uri_cache.get("size", 4096))
+        self.uri_allow_ttl = uri_cache.get("allow_ttl", 1.0)
+        self.uri_deny_ttl = uri_cache.get("deny_ttl", 1.0)
+        self.uri_preauthorize = uri_cache.get("preauthorize", False)
+        redundancy = redundancy or {}
+        self.uri_deadline = redundancy.get("deadline", 3.0)
+        self.uri_quorum = redundancy.get("quorum", 0)
+        self.uri_fail_open = redundancy.get("unavailable", "deny") == "allow"
+        self.uri_executor = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="pdp")
+        # Verdicts of a batch for the operation the current thread decides on
+        self.batched_verdicts = threading.local()
+        self.state = self.State(self.dir_to_mount, state_file, state_options, retention)
+        self.decision_cache = LRUCache(decision_cache_size)
+        self.reload_lock = threading.Lock()
+        # Stops the watcher of the policy files started in init
+        self.stop_watching_files = None
+        super().__init__(dir_to_mount, **(file_options or {}))
+
+    @property
+    def policy(self) -> dict:
+        """
+        The compiled policy of the current rules
+        """
+
+        return self.rules[0]
+
+    @property
+    def uri_entries(self):
+        """
+        The entries of the toml of the current rules or None without a toml
+        """
+
+        return self.rules[1]
+
+    def reload_policy(self) -> bool:
+        """
+        Parse the policy file and the toml again and replace the policy of the
+        running file system. The new policy and toml are compiled before they are
+        swapped in as one snapshot, so decisions in progress finish with the old
+        ones and no decision combines the old policy with the new toml. If one of
+        the files is not valid, the old policy is kept.
+
+        :return: Whether the policy has been replaced
+        :rtype: bool
+        """
+
+        with self.reload_lock:
+            start = time.perf_counter()
+            try:
+                policy = infuser_setup.parse_policy(self.policy_file, strict=True) if self.policy_file \
+                    else self.rules[0]
+                uri_entries = infuser_setup.URIEntries(parse_toml(self.uri_file, strict=True)) if self.uri_file \
+                    else None
+            except (infuser_setup.PolicyError, OSError, tomllib.TOMLDecodeError) as e:
+                # Mounting skips invalid parts of the policy, a reload keeps the current policy instead,
+                # so an edit with a typo does not drop entries of a running file system
+                self.log.error(f"ERROR - Could not reload policy, keeping the current one. Unlike mounting, a "
+                               f"reload does not skip invalid entries or sections, fix them to reload - {e}")
+                return False
+
+            self.rules = (policy, uri_entries)
+            self.uri_client.fix_protocols(uri_entries.protocols if uri_entries else {})
+            self.decision_cache.flush()
+            self.uri_cache.flush()
+            self.log.info(f"Reloaded policy from {self.policy_file} and {self.uri_file} in "
+                          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+            return True
+
+    def init(self, path):
+        """
+        Gets called when the file system is mounted, after libfuse may have
+        forked into the background. Starts the threads of the file system
+        here, as threads started before do not survive the fork: the writer
+        of the internal state, the syncer of the written files and the
+        watchers reloading the policy.
+
+        :param path: The root path of the file system
+        """
+
+        super().init(path)
+        self.state.writer.start()
+        watch_signal(self.reload_policy)
+        watched_files = [file for file in (self.policy_file, self.uri_file) if file]
+        if watched_files:
+            self.stop_watching_files = watch_files(watched_files, self.reload_policy)
+
+    def destroy(self, path):
+        """
+        Gets called when the file system is unmounted. Syncs the files that
+        are still written, writes the remaining entries of the internal state,
+        closes the connections to the PDPs and logs the counters of the caches
+        and the connection pool for sizing them.
+
+        :param path: The root path of the file system
+        """
+
+        unwatch_signal(self.reload_policy)
+        if self.stop_watching_files is not None:
+            self.stop_watching_files()
+        super().destroy(path)
+        self.state.writer.close()
+        self.log.info(f"Decision cache statistics: {self.decision_cache.stats()}")
+        self.log.info(f"PDP verdict cache statistics: {self.uri_cache.stats()}")
+        self.uri_executor.shutdown(wait=False)
+        self.uri_client.close()
+        self.log.info(f"PDP connection statistics: {self.uri_client.stats()}")
     
     class State:
         """
@@ -176,32 +353,67 @@ class IFS(FileOperations):
         functions that are used to process the state. are used to process the
         state. The state-based policies are also part of the class.
         When an object of the State class is created, a logger is called
-        and a list of dictionaries is created. This list contains past
-        accesses in the format {Path, Access, Time, Success}. Another 
-        list of previously selected objects ({Prefix, Path}) is used for 'foo'.
+        and a list of entries is created. This list contains past
+        accesses as compact :class:`state_store.StateEntry` objects
+        ({Path, Prefix, Access, Time, Success}). The successful
+        accesses are indexed by path in time order, the latest
+        successful write access per path is kept separately. Another 
+        dictionary of the first successfully accessed object per prefix ({Prefix: Path})
+        is used for 'foo'.
+        The latest writes and the selections are the facts the state-based
+        policies decide on and are always kept. They only hold one entry per
+        path or prefix, so they stay bounded by the accessed objects. The history of entries can be
+        limited by age and count, or not be kept at all (mode "facts"). Evicted
+        entries are only contained in the state file.
             
         :param dir_to_mount: The directory in which the operation is to be 
                               performed (required for recording the file type of the mapped files)
         :type dir_to_mount: str
         :param state_file: The path to a json file containing a recorded internal state
         :type state_file: str
+        :param state_options: The keyword arguments of the :class:`state_store.StateWriter`
+        :type state_options: dict
+        :param retention: The retention of the history in memory: "mode" ("history" or "facts"),
+                          "max_age" in seconds and "max_entries", 0 means unlimited
+        :type retention: dict
         """
         
     
-        def __init__(self, dir_to_mount: str, state_file: str):
+        def __init__(self, dir_to_mount: str, state_file: str, state_options=None, retention=None):
             
             self.log = logging.getLogger("infuser")
+            retention = retention or {}
+            self.keep_history = retention.get("mode", "history") == "history"
+            self.max_age = retention.get("max_age", 0)
+            self.max_entries = retention.get("max_entries", 0)
+            # Epoch of the last eviction by age, which is done at most once per second
+            self.evicted_epoch = None
+            # Appending and evicting keep the history and its indexes in the same order
+            self.lock = threading.Lock()
             self.selections = {} 
-            self.entries = self.handle_state(state_file)
-            self.state_log = logging.getLogger("StateHandlerLogger")
+            # Successful accesses by path in time order
+            self.index = {}
+            # Latest successful write access by Path, the only access 'written-no-execute' asks for
+            self.write_code = access_code("write")
+            self.latest_write = {}
+            self.last_epoch = None
+            self.entries = sorted(self.handle_state(state_file, state_options or {}), key=lambda item: item.time)
+            for entry in self.entries:
+                self.index_entry(entry)
+            if not self.keep_history:
+                self.entries = []
+            self.evict()
             self.dir_to_mount = dir_to_mount
     
-        def handle_state(self, state_file: str):
+        def handle_state(self, state_file: str, state_options: dict):
             """
-            Parses a JSON file containing a recorded internal state and creates a logger.
+            Parses a JSON file containing a recorded internal state (its snapshot
+            and the tail after it) and creates a writer appending new entries to it.
             
             :param state_file: The file to log to and read from
             :str: state_file: str
+            :param state_options: The keyword arguments of the :class:`state_store.StateWriter`
+            :type state_options: dict
             """
            
             # Select logger in case of error 
@@ -213,41 +425,35 @@ class IFS(FileOperations):
                state_file = '/tmp/' + current_time("%Y-%m-%d_%H:%M:%S") + '-infuser.json'
                import_wanted = False
   
-            # Create logger for internal state data
-            state_logger = logging.getLogger('StateHandlerLogger')
-            state_logger.setLevel(logging.INFO)
-            handler = logging.FileHandler(state_file)
-            formatter = logging.Formatter('')
-            handler.setFormatter(formatter)
-            state_logger.addHandler(handler)
-
-            # Load data from the specified file 
-            try:
-                with open(state_file, 'r') as file:
-                    if file.read(1):
-                        file.seek(0)
-                        data = [json.loads(line) for line in file]
-                        return data
+            # Load data from the specified file, starting at its snapshot
+            data, tail = [], 0
+            if import_wanted:
+                try:
+                    if os.path.getsize(state_file):
+                        data, tail = load_state(state_file)
                     else:
                         logger.error(f"Could not load internal state from file - File {state_file} is empty.")
-                        return []
-            except FileNotFoundError:
-                logger.error(f"Could not load internal state from file - File {state_file} does not exist.")
-                return []
-            except json.JSONDecodeError:
-                logger.error(f"Could not load internal state from file - {state_file} has no valid JSON data")
-                return []
-            except Exception as e:
-                logger.error(f"ERROR - Could not load internal state from file - {e}")                                                                                                                
-                return []
+                except FileNotFoundError:
+                    logger.error(f"Could not load internal state from file - File {state_file} does not exist.")
+                except json.JSONDecodeError:
+                    logger.error(f"Could not load internal state from file - {state_file} has no valid JSON data")
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Could not load internal state from file - {state_file} has no valid entries - {e}")
+                except Exception as e:
+                    logger.error(f"ERROR - Could not load internal state from file - {e}")
+
+            # Create writer for internal state data, which compacts the tail into the next snapshot
+            self.writer = StateWriter(state_file, pending=data[len(data) - tail:], **state_options)
+            return data
     
         def dump(self):
             """
             Dump the internal state as JSON 
             """
     
-            internal_state = json.dumps(self.entries, indent=4)
-            self.log.debug(f"{internal_state}")
+            # Formatting every entry is only worth it if the dump is logged
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug(json.dumps([entry.to_dict() for entry in self.entries], indent=4))
     
         def append(self, path: str, prefix: str, access: str, success: bool) -> bool:
             """
@@ -266,39 +472,110 @@ class IFS(FileOperations):
             """
 
             if isinstance(path, str) and isinstance(prefix, str) and isinstance(access, str) and isinstance(success, bool):
-                entry = {"Path": path, "Prefix": prefix, "Access": access,
-                         "Time": current_time(), "Success": success}
-                self.entries.append(entry)
+                # Entries of the same second share one int object
+                if (epoch := int(time.time())) != self.last_epoch:
+                    self.last_epoch = epoch
+                entry = StateEntry(path, prefix, access_code(access), self.last_epoch, success)
+                with self.lock:
+                    if self.keep_history:
+                        self.entries.append(entry)
+                    self.index_entry(entry)
+                if (self.max_entries and len(self.entries) > self.max_entries * 1.1 + 64
+                        or self.max_age and self.evicted_epoch != self.last_epoch):
+                    self.evict()
                 try:
-                    self.state_log.info(json.dumps(entry))
+                    self.writer.write(entry)
                 except Exception as e:
                     self.log.debug(f"ERROR - {e}")
                     pass
-                self.log.debug(f"Added entry {entry} to accessed objects")
+                # The entry is only formatted if debug messages are logged
+                self.log.debug("Added entry %s to accessed objects", entry)
                 return True
             else:
                 return False
     
+        def index_entry(self, entry: StateEntry) -> None:
+            """
+            Add an entry to the indexes of successful accesses. Entries have
+            to be indexed in time order.
+
+            :param entry: The entry of the internal state
+            :type entry: StateEntry
+            """
+
+            if not entry.success:
+                return
+            if self.keep_history:
+                self.index.setdefault(entry.path, []).append(entry)
+            if entry.access == self.write_code:
+                self.latest_write[entry.path] = entry
+            self.select(entry.path)
+
+        def evict(self) -> int:
+            """
+            Remove the entries exceeding the maximum age or count from the history
+            and its indexes. The latest writes and the selections are kept, the
+            evicted entries are only contained in the state file. The count is
+            exceeded by a tenth before evicting, so the history is not shifted
+            on every access.
+
+            :return: The number of evicted entries
+            :rtype: int
+            """
+
+            with self.lock:
+                count = 0
+                if self.max_entries and len(self.entries) > self.max_entries:
+                    count = len(self.entries) - self.max_entries
+                if self.max_age:
+                    self.evicted_epoch = self.last_epoch
+                    count = max(count, bisect.bisect_left(self.entries, int(time.time()) - self.max_age,
+                                                          key=attrgetter("time")))
+                if not count:
+                    return 0
+                evicted = self.entries[:count]
+                del self.entries[:count]
+                # The evicted entries are the oldest ones of their index lists
+                for path, number in Counter(entry.path for entry in evicted if entry.success).items():
+                    del self.index[path][:number]
+                    if not self.index[path]:
+                        del self.index[path]
+            self.log.debug(f"Evicted {count} entries from the internal state")
+            return count
+
         def query(self, key: str, value: str) -> dict:
             """
-            Return all entries from a dictionary that contain a specific value
+            Return all successful entries with a specific value kept in the history
+            in memory, the latest first. Only paths are indexed, other keys are
+            searched in the history. In the mode "facts" there is no history, so
+            no entries are returned.
     
-            :param key: The type of entry to search for
+            :param key: The type of entry to search for ("Path", "Prefix" or "Access")
             :type key: str
             :param value: The value to search for
             :type value: str
-            :return: A list of dictionaries with a corresponding value
-            :rtype: dict
-            .. todo:: [#5] Sorting the entire list with each access is not performant
+            :return: A list of entries with a corresponding value
+            :rtype: list
             """
     
-            list_of_entries = []
-            sorted_entries = sorted(
-                self.entries, key=lambda item: item['Time'], reverse=True)
-            for entry in sorted_entries:
-                if entry.get(key) == value and entry.get("Success"):
-                    list_of_entries.append(entry)
-            return list_of_entries
+            if key == "Path":
+                return self.index.get(value, [])[::-1]
+            return [entry for entry in reversed(self.entries) if entry.success and entry.to_dict()[key] == value]
+
+        def latest(self, path: str):
+            """
+            Return the latest successful entry of a path kept in the history in memory.
+            In the mode "facts" there is no history, so None is always returned; the
+            state-based policies decide on latest_write and selections instead.
+
+            :param path: The path of the object
+            :type path: str
+            :return: The latest entry or None if there is no successful entry
+            :rtype: StateEntry
+            """
+
+            entries = self.index.get(path)
+            return entries[-1] if entries else None
     
         def is_mimetype(self, path: str, mime_major: str, mime_minor="<None>") -> bool:
             """
@@ -338,14 +615,11 @@ class IFS(FileOperations):
                     f"Object {real_path} is no directory or file. Ignoring mime type.")
                 return False
     
-        def written_no_execute(self, path_entries: dict, permission: str, path: str) -> bool:
+        def written_no_execute(self, permission: str, path: str) -> bool:
             """
             
             If an object has already been opened for writing, do not allow the object to be executed
             
-            :param path_entries: The entries created on the basis of the
-                                  accesses to an object.
-            :type path_entries: str
             :param permission: The currently requested permission to the
                                 object
             :type permission: str
@@ -354,14 +628,11 @@ class IFS(FileOperations):
             :return: A boolean that may allow or deny permission
             :rtype: bool
             """
-            for entry in path_entries:
-                if (
-                        entry["Access"] == "write" and entry["Success"] and
-                        is_execution_intended(permission)
-                ):
-                    self.log.info(
-                        f"ACCESS ({permission}) DENIED --- Path: {path} --- Accessed at {entry['Time']} with {entry['Access']} access")
-                    return False
+            entry = self.latest_write.get(path)
+            if entry is not None and is_execution_intended(permission):
+                self.log.info(
+                    f"ACCESS ({permission}) DENIED --- Path: {path} --- Accessed at {format_time(entry.time)} with {entry.access_name} access")
+                return False
             return True
     
         def first_object_only(self, path: str, mode: str) -> bool:
@@ -378,20 +649,39 @@ class IFS(FileOperations):
             :rtype: bool
             """
            
-            # Check whether 'path' is in 'selections'
-            if any(path in entry['Path'] for entry in self.entries):
+            prefix = os.path.dirname(path)
+            if path == prefix:
+                self.log.debug(f"Path {path} is the root - Permission for {path} is granted")
+                return True
+            # Check whether 'path' is selected or an object below it is selected,
+            # since all directories above a selected object are prefixes in 'selections'
+            selected = self.selections.get(prefix)
+            if selected == path or path in self.selections:
                 self.log.debug(f"Path {path} has already been selected - Permission for {path} is granted")
                 return True
-            # Check whether any folder above is in 'selections'
-            prefix = os.path.dirname(path)
-            if any(prefix in entry['Prefix'] for entry in self.entries):
-                self.log.debug(f"Prefix {prefix} has already been selected - Permission for {path} is denied")
+            if selected is not None:
+                self.log.debug(f"Prefix {prefix} has already been selected ({selected}) - Permission for {path} is denied")
                 return False 
-            if path != prefix:
-                self.log.debug(f"No Path has been selected under prefix {prefix}")
-                self.append(path, prefix, mode, True)  
-                
-                return True 
+            self.log.debug(f"No Path has been selected under prefix {prefix}")
+            self.append(path, prefix, mode, True)  
+            return True 
+
+        def select(self, path: str) -> None:
+            """
+            Select an object under its prefix, unless another object has been selected
+            there before. The directories above the object are selected the same way,
+            so every directory above a selected object is a prefix in 'selections'.
+
+            :param path: The path of the accessed object
+            :type path: str
+            """
+
+            while (prefix := os.path.dirname(path)) != path:
+                if prefix in self.selections:
+                    # The directories above have been selected with a previous object
+                    break
+                self.selections[prefix] = path
+                path = prefix
 
         def check_state(self, policies: list, permission: str, path: str) -> bool:
             """
@@ -405,17 +695,16 @@ class IFS(FileOperations):
             :type path: str
             :return: A boolean that may allow or deny permission
             :rtype: bool
-            .. todo:: [#2] Redundant code regarding path matching
             """
     
-            # Check for a recent entry
-            if not self.entries:
+            # Check for a recent entry, the history may have been evicted while its facts are kept
+            if not self.entries and not self.selections:
                 self.log.debug(f"No entry recorded yet.")
                 return True
-            elif not (path_entries := self.query("Path", path)):
+            elif not (last_entry := self.latest(path)):
                 self.log.debug(f"No successful access for {path}")
             else:
-                self.log.debug(f"Last successful access: {path_entries[0]}")
+                self.log.debug("Last successful access: %s", last_entry)
     
             accessable = True
     
@@ -424,13 +713,9 @@ class IFS(FileOperations):
                 if not policies[policy]:
                     self.log.debug(f"Policy '{policy}' has no defined objects")
                     continue
-                # Check whether a matching entry can be found
-                try:
-                    prefix = next((muster for muster in sorted(policies[policy].keys(), 
-                                   key=len, reverse=True) if re.match(muster, path)), None)
-                except re.error as e:
-                    self.log.debug(f"ERROR - Could not match path to entrie via regex - {e}")
-                if policies[policy].get(prefix) if prefix else False:
+                # Check whether a matching entry allows the path, paths without a matching entry are tested
+                prefix = policies[policy].match(path)
+                if prefix is not None and policies[policy][prefix]:
                     self.log.debug(f"Policy {policy} allows path {path}")
                     continue
                 else:
@@ -439,7 +724,7 @@ class IFS(FileOperations):
                 match policy:
                     case "written-no-execute":
                         if (accessable := self.written_no_execute(
-                            path_entries, permission, path)) == False:
+                            permission, path)) == False:
                             return False
                     case "first-object-only":
                         if (accessable := self.first_object_only(
@@ -454,39 +739,38 @@ class IFS(FileOperations):
                 f"Internal state allows access to {path}: {accessable}")
             return accessable
     
-    def check_policy(self, section: dict, path: str, mode: str) -> bool:
+    def check_policy(self, section_name: str, path: str, mode: str) -> bool:
         """
         Check whether a policy prevents access to an object depending on previous accesses
         
-        :param section: The policies (sections) and entries of the (ini) policy file
-        :type section: dict 
+        :param section_name: The name of the section of the (ini) policy file
+        :type section_name: str
         :param path: The path of the object
         :type path: str 
         :param mode: The system call to be made
         :type mode: str 
         :return: A boolean that grants or denies permission
         :rtype: bool 
-        .. todo:: [#2] Redundant code regarding path matching
         .. todo:: [#2] Path matching matches file.sh to file even if file.sh is an entry
         """
    
-        longest_prefix = None
-    
-        # Try to match every policy entry for the access mode to the path.
-        # Break loop, when match is found
-        for key in section.keys():
-            try:
-                regex = re.compile(key)
-            except re.error:
-                self.log.warning(
-                    f"Regular expression '{key}' could not be compiled. Skipping this policy entry ...")
-                continue
-            if not re.match(regex, path) is None:
-                # At this point a match is found and because the dict is already ordered, this is the most specific match
-                longest_prefix = key
-                break
-
         parent_folder = os.path.dirname(path)
+
+        # Decisions on paths without stateful or external policies are cached
+        cache_key = (section_name, path)
+        generation = self.decision_cache.generation
+        # Decide by one version of the policy and the toml, even if they are reloaded meanwhile
+        policy, uri_entries = self.rules
+        section = policy[section_name]
+        decision = self.decision_cache.get(cache_key)
+        if decision is None or decision is STATEFUL:
+            is_stateful = decision is STATEFUL or self.is_stateful(policy, uri_entries, path)
+            longest_prefix, is_granted = self.decide(policy, uri_entries, section, path, mode)
+            if decision is None:
+                self.decision_cache.put(cache_key, STATEFUL if is_stateful else (longest_prefix, is_granted),
+                                        generation)
+        else:
+            longest_prefix, is_granted = decision
     
         # If no entry was found, access is granted by IFS and the permission is up to the OS-permissions
         if longest_prefix is None:
@@ -498,42 +782,115 @@ class IFS(FileOperations):
             else:
                 self.state.append(path, parent_folder, mode, False)
             return True
-          
+
+        if is_granted:
+            self.log.debug(f"ACCESS ({mode}) GRANTED --- Path: {path} --- Policy-Entry: '{longest_prefix}: "
+                           f"{section[longest_prefix]}'")
+            self.state.append(path, parent_folder, mode, True)
+            return True
+    
+        # If an entry was found and file access should not be granted by policy raise FuseOSError according to FUSE API
+        self.log.info(f"ACCESS ({mode}) DENIED --- Path: {path} --- Policy-Entry: '{longest_prefix}: "
+                      f"{section[longest_prefix]}'")
+        self.state.append(path, parent_folder, mode, False)
+        raise FuseOSError(errno.EPERM)
+
+    def decide(self, policy: dict, uri_entries, section: dict, path: str, mode: str) -> tuple:
+        """
+        Decide on an access by the policy, the internal and the external state
+
+        :param policy: The compiled policy
+        :type policy: dict
+        :param uri_entries: The entries of the toml of the same rules as the policy or None
+        :type uri_entries: infuser_setup.URIEntries
+        :param section: The compiled entries of a section of the (ini) policy file
+        :type section: infuser_setup.PolicySection
+        :param path: The path of the object
+        :type path: str
+        :param mode: The system call to be made
+        :type mode: str
+        :return: The most specific entry (None if no entry matches) and whether access is granted
+        :rtype: tuple
+        """
+
+        # The section is ordered, so the first match is the most specific one
+        longest_prefix = section.match(path)
+        if longest_prefix is None:
+            return None, True
+
         try:
             # If an entry is found, check whether it issues a authorisation
             if section[longest_prefix]:
                 # Check whether the syscalls indicates the intention to execute the object
                 if not (section[longest_prefix] is False and is_execution_intended(mode) is True):
                     # Check whether the permission requires a certain internal state
-                    if self.state.check_state(self.policy, mode, path) is True:
+                    if self.state.check_state(policy, mode, path) is True:
                         # Check whether the permission requires a certain external state
-                        if not self.uri_entries or (self.uri_entries and self.usage_with_uri(path, mode) is True):
-                            self.log.debug(f"ACCESS ({mode}) GRANTED --- Path: {path} --- Policy-Entry: '{longest_prefix}: "
-                                           f"{section[longest_prefix]}'")
-                            self.state.append(path, parent_folder, mode, True)
-                            return True
+                        if not uri_entries or self.usage_with_uri(path, mode, uri_entries) is True:
+                            return longest_prefix, True
         except TypeError as e:
             self.log.info(f"ERROR - Can not check internal or external state - {e}")
-    
-        # If an entry was found and file access should not be granted by policy raise FuseOSError according to FUSE API
-        self.log.info(f"ACCESS ({mode}) DENIED --- Path: {path} --- Policy-Entry: '{longest_prefix}: "
-                      f"{section[longest_prefix]}'")
-        self.state.append(path, parent_folder, mode, False)
-        raise FuseOSError(errno.EPERM)
-    
-    def call_to_uri(self, path: str, mode: str, ip: str, port: str) -> bool:
+        return longest_prefix, False
+
+    def is_stateful(self, policy: dict, uri_entries, path: str) -> bool:
+        """
+        Check whether decisions on an object depend on the internal or external state,
+        i.e. whether a stateful policy with entries does not allow the path by a matching
+        entry (see :meth:`IFS.State.check_state`) or the toml has an entry for it
+
+        :param policy: The compiled policy
+        :type policy: dict
+        :param uri_entries: The entries of the toml of the same rules as the policy or None
+        :type uri_entries: infuser_setup.URIEntries
+        :param path: The path of the object
+        :type path: str
+        :return: A boolean that indicates, whether a decision may be cached
+        :rtype: bool
+        """
+
+        for sbac_policy in sbac_policies:
+            if not policy[sbac_policy]:
+                continue
+            prefix = policy[sbac_policy].match(path)
+            if prefix is None or not policy[sbac_policy][prefix]:
+                return True
+        return bool(uri_entries and uri_entries.matches(path))
+
+    def is_granted_statically(self, policy: dict, section_name: str, path: str) -> bool:
+        """
+        Check whether an entry of the policy grants access to an object without
+        depending on the internal state, i.e. whether a decision on the object
+        would only wait for the PDPs. Only these objects are pre-authorized.
+
+        :param policy: The compiled policy
+        :type policy: dict
+        :param section_name: The name of the section of the (ini) policy file
+        :type section_name: str
+        :param path: The path of the object
+        :type path: str
+        :return: A boolean that indicates, whether the PDPs decide on the object
+        :rtype: bool
+        """
+
+        section = policy[section_name]
+        longest_prefix = section.match(path)
+        if longest_prefix is None or not section[longest_prefix]:
+            return False
+        return not self.is_stateful(policy, None, path)
+
+    def call_to_uri(self, path: str, mode: str, address) -> bool:
         """
         
-        Establish a connection to an (external) PDP via a URI to obtain authorization
+        Establish a connection to an (external) PDP via a URI to obtain authorization.
+        Verdicts of the PDP are cached per (server, path, mode) for the TTL of
+        allowed or denied accesses, errors are never cached.
         
         :param path: The path of the object to be accessed
         :type path: str
         :param mode: The syscall that has to be authorised 
         :type mode: str
-        :param ip: The IP of the URI of the PDP
-        :type ip: str
-        :param port: The Port of the URI of the PDP
-        :type port: str
+        :param address: The (ip, port) of the URI of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
         
         :return: A bool that grants or denies permission. None is returned if
                  an Error happens an no decision has been made.
@@ -545,43 +902,44 @@ class IFS(FileOperations):
         
         """
     
-        self.log.info(f"Requesting validation for mode {mode} on {path} from {ip}:{port}")
+        # Reuse a verdict of the PDP of a batch or that has not expired yet
+        cache_key = (address, path, mode)
+        batched = getattr(self.batched_verdicts, "verdicts", None)
+        if batched and (allowed := batched.get(cache_key)) is not None:
+            return allowed
+        generation = self.uri_cache.generation
+        if (allowed := self.uri_cache.get(cache_key)) is not None:
+            self.log.debug(f"Cached validation for mode {mode} on {path} from {describe(address)}: {allowed}")
+            return allowed
+
+        self.log.info(f"Requesting validation for mode {mode} on {path} from {describe(address)}")
     
-        # Connect to the URI and send the path to the object to be accessed
+        # Send the path to the object to be accessed on a kept-alive connection to the URI, pipelined
+        # with the requests of other threads if the PDP speaks the binary protocol
         try:
-            BUFFER = len(path) + len(mode) + 8
-            client_socket = socket.socket(
-                socket.AF_INET, socket.SOCK_STREAM)
-            client_socket.settimeout(3.0)
-            client_socket.connect((ip, port))
-            self.log.debug(f"Sending {path},{mode} to {ip}:{port}")
-            client_socket.send(path.encode() + ",".encode() + mode.encode())
-            received_data = client_socket.recv(BUFFER).decode()
-            if len(received_data) > BUFFER:
-                self.log.debug(
-                    f"ERROR - Received data does not fit into the buffer")
-                return None 
-            self.log.debug(f"Received {received_data} from {ip}:{port}")
-            client_socket.close()
-        except socket.error as e:
-            self.log.error(f"ERROR - Socket error occurred: {e}")
+            accessable = self.uri_client.authorize(address, path, mode)
+        except CircuitOpenError:
+            # Fail open or closed without waiting for a PDP that is down, the verdict is never cached
+            self.log.debug(f"PDP {describe(address)} is unavailable, mode {mode} on {path} is allowed: "
+                           f"{self.uri_fail_open}")
+            return True if self.uri_fail_open else None
+        except ValueError as e:
+            self.log.debug(f"ERROR - {e}")
             return None
         except socket.timeout as e:
             self.log.error(f"ERROR - Socket has timed out: {e}")
             return None
+        except socket.error as e:
+            self.log.error(f"ERROR - Socket error occurred: {e}")
+            return None
         except Exception as e:
             self.log.error(f"ERROR - An unexpected error occurred: {e}")
             return None
+
+        self.uri_cache.put(cache_key, accessable, generation, self.uri_allow_ttl if accessable else self.uri_deny_ttl)
+        return accessable
     
-        # Column the returned string and check if the path was transferred
-        # correctly and translate the issued permission into a bool
-        rpath, rmode, allowed = received_data.split(',')
-        if rpath == path and rmode == mode:
-            return (True if allowed == 'True' else False)
-        else:
-            return False
-    
-    def usage_with_uri(self, path: str, mode: str) -> bool:
+    def usage_with_uri(self, path: str, mode: str, uri_entries) -> bool:
         """
         Check whether an external validator on a predefined URI gives permission
         
@@ -589,61 +947,37 @@ class IFS(FileOperations):
         :type path: str
         :param mode: The system call to be requested 
         :type mode: str
+        :param uri_entries: The entries of the toml the decision is made by
+        :type uri_entries: infuser_setup.URIEntries
         :return: A bool that grants or denies permission
         :rtype: bool
-        .. todo:: [#2] Merge redundant regex matching
         .. todo:: [#8] Add log message to indicate that no policy is matching the syscall to be executed
         """
    
-        patterns = []
-        path_entries = {}
         accessable = True
-        checked_servers = []
-
-        # Search for exact matches and matching regular expressions and
-        # gather dictionaries with key that matches as regular expression
-        for entry_pattern, entry_data in self.uri_entries.items():
-            try:
-                if path == entry_pattern or re.match(entry_pattern, path):
-                    patterns.append(entry_pattern) 
-            except re.error:
-                continue
-        for pattern in patterns:
-            path_entries.update(self.uri_entries[pattern])
-        if not path_entries:
-            self.log.debug(f"Ignoring external authorisation, as toml has no entries (referring to mode: {mode})")
-            return True
 
         try:
-            # Match 'flat' entries with only a path
-            if 'IP' in path_entries and 'PORT' in path_entries:
-                self.log.debug(f"Validating external state for {path}")
-                accessable = self.call_to_uri(path=path, mode=mode, 
-                                  ip=path_entries['IP'], port=path_entries['PORT'])
-                self.log.info(f"Path: {path} is allowed: {str(accessable)}")
+            # Look up the PDPs of the matching patterns of the toml
+            servers = uri_entries.servers(path, mode)
+            if servers is None:
+                self.log.debug(f"Ignoring external authorisation, as toml has no entries (referring to mode: {mode})")
+                return True
+            if len(servers) == 1:
+                # Match 'flat' entries with only a path and entries with a path and access mode
+                (server_id, server_data), = servers.items()
+                self.log.debug(f"Validating external state for {path} and {mode}")
+                accessable = self.call_to_uri(path=path, mode=mode,
+                                              address=uri_entries.address(server_data))
+                self.log.info(f"Mode {mode} on path: {path} is allowed"
+                              f"{f' (as per server {server_id})' if server_id is not None else ''}: {str(accessable)}")
+                return accessable
+            if servers:
+                # Match 'redundant' entries with a path, access mode and server_id
+                self.log.debug(f"Validating external state for {path} and {mode} on uris {', '.join(servers)}")
+                accessable = self.ask_servers(path, mode, servers, uri_entries)
+                self.log.info(f"Mode {mode} on path: {path} is allowed (as per servers "
+                              f"{', '.join(servers)}): {str(accessable)}")
                 return accessable
-            # Match entries with a path and access mode
-            for fmode, mode_data in path_entries.items():
-                if fmode != mode:
-                    continue
-                if 'IP' in mode_data and 'PORT' in mode_data:
-                    self.log.debug(f"Validating external state for {path} and {mode}")
-                    accessable = self.call_to_uri(path=path, mode=mode, 
-                                      ip=mode_data['IP'], port=mode_data['PORT'])
-                    self.log.info(f"Mode {mode} on path: {path} is allowed: {str(accessable)}")
-                    return accessable
-                else:
-                    # Match 'redundant' entries with a path, access mode and server_id
-                    for server_id, server_data in mode_data.items():
-                        if server_id not in checked_servers:
-                            self.log.debug(f"Validating external state for {path} and {mode} on uri {server_id}")
-                            accessable = self.call_to_uri(path=path, mode=mode, 
-                                              ip=server_data['IP'], port=server_data['PORT'])
-                            self.log.info(f"Mode {mode} on path: {path} is allowed (as per server {server_id}): {str(accessable)}")
-                            if not accessable:
-                                checked_servers.append(server_id)
-                            if accessable is False:
-                                return False
         except KeyError as e:
             self.log.debug(f"ERROR - Missing expected key in data: {e}")
             accessable = False
@@ -660,6 +994,105 @@ class IFS(FileOperations):
         self.log.debug(f"External state allow access to {path}: {accessable}")
         return accessable
 
+    def preauthorize(self, requests: list, fallback=True) -> dict:
+        """
+        Ask the PDPs for decisions on many (path, mode) pairs with one batch per
+        PDP. The verdicts are cached like the ones of :meth:`call_to_uri`, pairs
+        the toml has no PDP for are skipped.
+
+        :param requests: The (path, mode) pairs
+        :type requests: list
+        :param fallback: Whether to ask PDPs that only speak the legacy format one pair after another
+        :type fallback: bool
+        :return: The verdicts by (address, path, mode)
+        :rtype: dict
+        """
+
+        verdicts = {}
+        uri_entries = self.uri_entries
+        if not uri_entries:
+            return verdicts
+        batches = {}
+        for path, mode in requests:
+            try:
+                servers = uri_entries.servers(path, mode) or {}
+                for server_data in servers.values():
+                    batches.setdefault(uri_entries.address(server_data), []).append((path, mode))
+            except (KeyError, TypeError, ValueError) as e:
+                self.log.debug(f"ERROR - Can not pre-authorize mode {mode} for {path} - {e}")
+
+        generation = self.uri_cache.generation
+        for address, batch in batches.items():
+            try:
+                allowed = self.uri_client.authorize_batch(address, batch, fallback)
+            except Exception as e:
+                self.log.debug(f"ERROR - Can not pre-authorize {len(batch)} requests at {describe(address)} - {e}")
+                continue
+            for (path, mode), accessable in zip(batch, allowed):
+                if accessable is None:
+                    continue
+                verdicts[(address, path, mode)] = accessable
+                self.uri_cache.put((address, path, mode), accessable, generation,
+                                   self.uri_allow_ttl if accessable else self.uri_deny_ttl)
+        self.log.debug(f"Pre-authorized {len(verdicts)} requests at {len(batches)} PDPs")
+        return verdicts
+
+    def ask_servers(self, path: str, mode: str, servers: dict, uri_entries) -> bool:
+        """
+        Ask redundant PDPs concurrently for authorization. The first PDP that
+        denies the access decides, otherwise all PDPs (or the quorum) have to
+        allow it. All PDPs share one deadline, PDPs that have not answered
+        until then are treated like PDPs that returned an error.
+
+        :param path: The path of the object to be accessed
+        :type path: str
+        :param mode: The syscall that has to be authorised
+        :type mode: str
+        :param servers: The IP and PORT or SOCKET of the PDPs by server_id
+        :type servers: dict
+        :param uri_entries: The entries of the toml the servers were looked up in
+        :type uri_entries: infuser_setup.URIEntries
+        :return: A bool that grants or denies permission. None is returned if
+                 not enough PDPs have made a decision before the deadline.
+        :rtype: bool
+        """
+
+        deadline = time.monotonic() + self.uri_deadline
+        # Verdicts of a batch of the current thread are not visible to the threads of the pool
+        batched = getattr(self.batched_verdicts, "verdicts", None) or {}
+        futures = {}
+        for server_id, server_data in servers.items():
+            address = uri_entries.address(server_data)
+            if (allowed := batched.get((address, path, mode))) is not None:
+                future = concurrent.futures.Future()
+                future.set_result(allowed)
+            else:
+                future = self.uri_executor.submit(self.call_to_uri, path=path, mode=mode, address=address)
+            futures[future] = server_id
+        required = min(self.uri_quorum, len(futures)) if self.uri_quorum else len(futures)
+        allowed = 0
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=max(deadline - time.monotonic(), 0),
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                self.log.error(f"ERROR - Servers {', '.join(futures[future] for future in pending)} have not "
+                               f"decided on mode {mode} for {path} before the deadline")
+                return None
+            for future in done:
+                accessable = future.result()
+                self.log.debug(f"Mode {mode} on path: {path} is allowed (as per server {futures[future]}): "
+                               f"{str(accessable)}")
+                if accessable is False:
+                    return False
+                if accessable:
+                    allowed += 1
+            if allowed >= required:
+                return True
+            if allowed + len(pending) < required:
+                return None
+        return None
+
     # Section READ #
 
     def read(self, path, length, offset, fh):
@@ -674,7 +1107,7 @@ class IFS(FileOperations):
         :return: The data read from the file by the parent class.
         """
         
-        if self.check_policy(self.policy["read"], path, "read"):
+        if self.check_policy("read", path, "read"):
             # self.log.debug(f"SYSCALL (read) --- Path: {path}")
             return super().read(path, length, offset, fh)
 
@@ -687,26 +1120,45 @@ class IFS(FileOperations):
         :return: File handle representing the opened file.
         """
         set_current_flag(flags)
+        # The open-file table keeps the decision that allowed opening the file handle
         if flags == flag_list['fuse.O_EXEC']:
-            if self.check_policy(self.policy["execute"], path, "open"):
+            if self.check_policy("execute", path, "open"):
                 self.log.debug(f"SYSCALL (open) --- Flags: {flags} --- Path: {path}")
-                return super().open(path, flags)
-        elif self.check_policy(self.policy["read"], path, "open"):
+                fh = super().open(path, flags)
+                self.register_open_file(fh, path, flags, ("execute", "open"))
+                return fh
+        elif self.check_policy("read", path, "open"):
             self.log.debug(f"SYSCALL (open) --- Flags: {flags} --- Path: {path}")
-            return super().open(path, flags)
+            fh = super().open(path, flags)
+            self.register_open_file(fh, path, flags, ("read", "open"))
+            return fh
 
     def readdir(self, path, fh):
         """
-        Reads the contents of a directory
+        Reads the contents of a directory. The policy is checked for the
+        directory, the entries come with their attributes
         
         :param path: The path of the accessed object
         :param fh: The file handle returned by the 'open' method.
-        :return: The data read from the file by the parent class.
+        :return: The entries as (name, attributes, offset) read by the parent class.
         """
         
-        if self.check_policy(self.policy["read"], path, "readdir"):
+        if self.check_policy("read", path, "readdir"):
             # self.log.debug(f"SYSCALL (readdir) --- Path: {path}")
-            return super().readdir(path, fh)
+            entries = list(super().readdir(path, fh))
+            # If enabled, let the PDPs decide on opening and reading the children in the background, so
+            # their verdicts are cached when the application accesses them. This tells the PDPs about
+            # accesses that have not happened, so it is opt-in
+            policy, uri_entries = self.rules
+            if (self.uri_preauthorize and uri_entries and self.uri_cache.size > 0
+                    and max(self.uri_allow_ttl, self.uri_deny_ttl) > 0):
+                children = [child for child in (os.path.join(path, name) for name, _, _ in entries
+                                                if name not in (".", ".."))
+                            if self.is_granted_statically(policy, "read", child)]
+                if children:
+                    self.uri_executor.submit(self.preauthorize, [(child, mode) for child in children
+                                                                 for mode in PREAUTHORIZED_MODES], False)
+            return entries
 
     # Section WRITE #
 
@@ -722,7 +1174,7 @@ class IFS(FileOperations):
         :return: The number of bytes written to the file.
         """
         
-        if self.check_policy(self.policy["write"], path, "write"):
+        if self.check_policy("write", path, "write"):
             # self.log.debug(f"SYSCALL (write) --- Path: {path}")
             return super().write(path, buf, offset, fh)
 
@@ -735,7 +1187,7 @@ class IFS(FileOperations):
         :return: Return value indicating the success of the operation.
         """
 
-        if self.check_policy(self.policy["write"], path, "unlink"):
+        if self.check_policy("write", path, "unlink"):
             # self.log.debug(f"SYSCALL (unlink) --- Path: {path}")
             return super().unlink(path)
 
@@ -749,7 +1201,7 @@ class IFS(FileOperations):
         :return: Return value indicating the success of the operation.
         """
         
-        if self.check_policy(self.policy["write"], path, "mkdir"):
+        if self.check_policy("write", path, "mkdir"):
             # self.log.debug(f"SYSCALL (mkdir) --- Path: {path}")
             return super().mkdir(path, mode)
 
@@ -761,7 +1213,7 @@ class IFS(FileOperations):
         :return: Return value indicating the success of the operation.
         """
         
-        if self.check_policy(self.policy["write"], path, "rmdir"):
+        if self.check_policy("write", path, "rmdir"):
             # self.log.debug(f"SYSCALL (rmdir) --- Path: {path}")
             return super().rmdir(path)
 
@@ -776,10 +1228,18 @@ class IFS(FileOperations):
         """
         
         # Rename needs to read the old file and write the new one, so both
-        # modes need to be checked
-        if self.check_policy(self.policy["write"], new, "rename") and self.check_policy(self.policy["write"], old, "rename"):
-            # self.log.debug(f"SYSCALL (rename) --- Path: {path}")
-            return super().rename(old, new)
+        # modes need to be checked. If the policy leaves both sides to the
+        # PDPs, they decide on both in one batch
+        policy, uri_entries = self.rules
+        if uri_entries and all(uri_entries.matches(path) and self.is_granted_statically(policy, "write", path)
+                               for path in (new, old)):
+            self.batched_verdicts.verdicts = self.preauthorize([(new, "rename"), (old, "rename")])
+        try:
+            if self.check_policy("write", new, "rename") and self.check_policy("write", old, "rename"):
+                # self.log.debug(f"SYSCALL (rename) --- Path: {path}")
+                return super().rename(old, new)
+        finally:
+            self.batched_verdicts.verdicts = None
 
     # Section EXECUTE #
 
@@ -798,20 +1258,22 @@ class IFS(FileOperations):
 
         #match mode:
         #    case 0:  # Check, if file exists. Could be seen as read access
-        #        accessable = self.check_policy(self.policy["read"], path, "f")
+        #        accessable = self.check_policy("read", path, "f")
         #    case 1:  # Corresponds to UNIX permission x
-        #        accessable = self.check_policy(self.policy["execute"], path, "x")
+        #        accessable = self.check_policy("execute", path, "x")
         #    case 2:  # Corresponds to UNIX permission w
-        #        accessable = self.check_policy(self.policy["write"], path, "w")
+        #        accessable = self.check_policy("write", path, "w")
         #    case 4:  # Corresponds to UNIX permission r
-        #        accessable = self.check_policy(self.policy["read"], path, "r")
+        #        accessable = self.check_policy("read", path, "r")
         #
         ## If the policy accepts the access, check with OS-permissions
         #if accessable:
         #    super().access(path, mode)
         super().access(path, mode)
 
-def main(mountpoint, dir_to_mount, policy_dict, uri_file, state_file):
+def main(mountpoint, dir_to_mount, policy_dict, uri_file, state_file, decision_cache_size=4096, policy_file=None,
+         state_options=None, retention=None, client_options=None, uri_cache=None, redundancy=None,
+         file_options=None, fuse_options=None):
     """
     
     Main function, so project can be imported and used in other projects
@@ -821,12 +1283,29 @@ def main(mountpoint, dir_to_mount, policy_dict, uri_file, state_file):
     :param policy_dict: The dictionary containing the guidelines
     :param uri_file: The path to the configuration file with the URI
     :param state_file: The path to a json file containing a recorded internal state
+    :param decision_cache_size: The number of cached decisions on paths without stateful policies
+    :param policy_file: The path to the (ini) policy file, that is reloaded on SIGHUP or when it changes
+    :param state_options: The keyword arguments of the writer of the state file
+    :param retention: The retention of the internal state in memory
+    :param client_options: The keyword arguments of the client of the PDPs
+    :param uri_cache: The size and the TTLs of the cache of the verdicts of the PDPs and whether
+                      the children of listed directories are pre-authorized
+    :param redundancy: The deadline and the quorum of redundant PDPs and the verdict of unavailable PDPs
+    :param file_options: The durability and the sync interval of the written files and the TTL and
+                         the size of the attribute cache
+    :param fuse_options: The keyword arguments of FUSE, the mount options of a profile of
+                         :func:`infuser_setup.mount_options`
     """
     
 
-    infuser_file_system = IFS(dir_to_mount, policy_dict, uri_file, state_file)
+    infuser_file_system = IFS(dir_to_mount, policy_dict, uri_file, state_file, decision_cache_size, policy_file,
+                              state_options, retention, client_options, uri_cache, redundancy, file_options)
+    # Reload the policy without remounting. SIGHUP is blocked before FUSE starts its threads, so only
+    # the watcher started in IFS.init receives it. A program mounting from another thread blocks it in
+    # its main thread
+    block_signal()
     try:
-        FUSE(infuser_file_system, mountpoint)
+        FUSE(infuser_file_system, mountpoint, **(fuse_options or {}))
     except RuntimeError:
         # Catch the problem where mountpoint is still mounted and cannot be mounted again
         log = logging.getLogger("infuser")
@@ -846,4 +1325,21 @@ if __name__ == '__main__':
     args = infuser_setup.parse_args()
     infuser_setup.create_logger(args.log_file, args.verbose)
     policy = infuser_setup.parse_policy(args.policy_file)
-    main(args.mountpoint, args.dir_to_mount, policy, args.uri_file, args.state_file)
+    state_options = {"durability": args.state_durability, "fsync_interval": args.state_fsync_interval,
+                     "queue_size": args.state_queue_size, "overflow": args.state_overflow,
+                     "snapshot_every": args.state_snapshot_every}
+    retention = {"mode": args.state_retention, "max_age": args.state_max_age, "max_entries": args.state_max_entries}
+    client_options = {"timeout": args.uri_timeout, "idle_timeout": args.uri_idle_timeout,
+                      "max_idle": args.uri_pool_size, "protocol": args.uri_protocol,
+                      "breaker": {"failures": args.uri_breaker_failures, "reset_timeout": args.uri_breaker_reset,
+                                  "min_timeout": args.uri_min_timeout,
+                                  "percentile": args.uri_timeout_percentile},
+                      "metrics_file": args.uri_metrics_file}
+    uri_cache = {"size": args.uri_cache_size, "allow_ttl": args.uri_allow_ttl, "deny_ttl": args.uri_deny_ttl,
+                 "preauthorize": args.uri_preauthorize}
+    redundancy = {"deadline": args.uri_deadline, "quorum": args.uri_quorum, "unavailable": args.uri_unavailable}
+    file_options = {"durability": args.durability, "sync_interval": args.sync_interval,
+                    "attr_cache_ttl": args.attr_cache_ttl, "attr_cache_size": args.attr_cache_size}
+    main(args.mountpoint, args.dir_to_mount, policy, args.uri_file, args.state_file, args.decision_cache_size,
+         args.policy_file, state_options, retention, client_options, uri_cache, redundancy, file_options,
+         args.fuse_options)
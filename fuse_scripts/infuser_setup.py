@@ -17,13 +17,14 @@ Libraries/Modules:
 - re standard library
   - Access to regular expressions
 - configparser standard library
-  - Access to ConfigParser to parse the .ini format
+  - Access to ConfigParser to parse the .ini format and its errors
 - collections standard library
   - Access to OrderedDict
 
 """
 
 import argparse
+import configparser
 import datetime
 import logging
 import sys
@@ -32,6 +33,340 @@ import re
 from configparser import ConfigParser
 from collections import OrderedDict
 
+# Values for names of the sections
+values_section = ["read", "write", "execute", "written-no-execute", "first-object-only"]
+
+# Unescaped characters that end the wildcard-free prefix of a regex
+find_wildcards_in_regex = re.compile(r"(?<!\\)[(\[{?*+|.$^]")
+
+# Mount profiles: the options of fusepy/libfuse (mount.fuse(8)) and the defaults of the file operations.
+# All of them run FUSE in the foreground, so the infuser stays attached to the program that mounted it,
+# e.g. the thread of infuseManager (its threads are started in IFS.init and would survive a fork). The
+# kernel serves cached attributes and, with kernel_cache, cached pages without asking the infuser, so
+# only "strict" checks the policy on every getattr and lookup
+mount_profiles = {
+    # Every metadata lookup reaches the infuser, every close syncs the file
+    "strict": {"fuse": {"foreground": True, "attr_timeout": 0, "entry_timeout": 0, "negative_timeout": 0},
+               "durability": "strict", "attr_cache_ttl": 0.0},
+    # Timeouts of libfuse, every close syncs the file like before the profiles. --durability batched
+    # syncs in the background instead
+    "balanced": {"fuse": {"foreground": True, "attr_timeout": 1.0, "entry_timeout": 1.0, "negative_timeout": 0,
+                          "use_ino": True},
+                 "durability": "strict", "attr_cache_ttl": 1.0},
+    # Pages stay cached across opens, large requests, files are synced when the application asks for it
+    "throughput": {"fuse": {"foreground": True, "attr_timeout": 10.0, "entry_timeout": 10.0, "negative_timeout": 1.0,
+                            "use_ino": True, "kernel_cache": True, "big_writes": True, "max_read": 131072,
+                            "max_write": 131072},
+                   "durability": "passthrough", "attr_cache_ttl": 10.0},
+}
+
+
+class PolicyError(Exception):
+    """
+    Raised by a strict parse of a policy file that is not valid
+    """
+
+
+def literal_prefix(regex: str) -> str:
+    """
+    Return the literal text that every string matched by a regular expression
+    starts with. Escaped characters are unescaped and a character made optional
+    by a quantifier is dropped. Alternations may start with anything, so they
+    have an empty literal prefix.
+
+    :param regex: The regular expression
+    :type regex: str
+    :return: The literal prefix of the regular expression
+    :rtype: str
+    """
+
+    literal = []
+    position = 0
+    while position < len(regex):
+        character = regex[position]
+        if character == "\\":
+            position += 2
+            continue
+        if character == "|":
+            return ""
+        position += 1
+
+    position = 0
+    while position < len(regex):
+        character = regex[position]
+        if character == "\\":
+            # Escaped letters and digits are classes, references or anchors
+            if position + 1 >= len(regex) or regex[position + 1].isalnum():
+                break
+            literal.append(regex[position + 1])
+            position += 2
+            continue
+        if character in "?*{":
+            # The quantifier makes the previous character optional
+            if literal:
+                literal.pop()
+            break
+        if character in "(.[+$^":
+            break
+        literal.append(character)
+        position += 1
+    return "".join(literal)
+
+
+class PathTrie:
+    """
+    Index of items by the path components of a literal prefix
+
+    Every item is stored at the node of the complete components of its literal
+    prefix, keyed by the remaining partial component. A lookup walks the
+    components of a path and only collects the items whose literal prefix the
+    path starts with, so its cost depends on the depth of the path and not
+    on the number of items.
+    """
+
+    def __init__(self):
+        # Every node is a tuple of its children and its items by partial component
+        self.root = (dict(), dict())
+
+    def insert(self, literal: str, item) -> None:
+        """
+        Add an item for a literal prefix
+
+        :param literal: The literal prefix of the item
+        :type literal: str
+        :param item: The item to store
+        """
+
+        *components, partial = literal.split("/")
+        node = self.root
+        for component in components:
+            node = node[0].setdefault(component, (dict(), dict()))
+        node[1].setdefault(partial, []).append(item)
+
+    def candidates(self, path: str) -> list:
+        """
+        Return the items of all literal prefixes the path starts with
+
+        :param path: The path to look up
+        :type path: str
+        :return: A list of items in no particular order
+        :rtype: list
+        """
+
+        items = []
+        components = path.split("/")
+        node = self.root
+        for depth, component in enumerate(components):
+            partials = node[1]
+            if partials:
+                for length in range(len(component) + 1):
+                    items.extend(partials.get(component[:length], ()))
+            if depth == len(components) - 1 or (node := node[0].get(component)) is None:
+                break
+        return items
+
+
+class PolicySection(OrderedDict):
+    """
+    Entries of a policy section with their precompiled regular expressions
+
+    The entries are ordered by the length of their wildcard-free prefix (the
+    most specific entry first). Entries with the same prefix length keep
+    the order of the policy file. The regular expressions are compiled once
+    and indexed in a :class:`PathTrie` by their literal prefix, so a decision
+    only tests the entries that can match the path.
+
+    :param entries: The entries of the section in the format {<regex>: <allowed>}
+    :type entries: dict
+    """
+
+    def __init__(self, entries=()):
+        super().__init__(
+            sorted(
+                dict(entries).items(), key=lambda tmp_key: len(
+                    re.split(find_wildcards_in_regex, tmp_key[0], maxsplit=1)[0]
+                ), reverse=True
+            )
+        )
+        self.rules = []
+        self.index = PathTrie()
+        for key, is_allowed in self.items():
+            try:
+                regex = re.compile(key)
+            except re.error:
+                logging.getLogger('infuser').warning(
+                    f"Regular expression '{key}' could not be compiled. Skipping this policy entry ...")
+                continue
+            # The position in rules is the rank of the entry
+            self.index.insert(literal_prefix(key), len(self.rules))
+            self.rules.append((key, regex, is_allowed))
+
+    def match(self, path: str):
+        """
+        Return the most specific entry matching a path
+
+        :param path: The path of the object
+        :type path: str
+        :return: The matching entry or None if no entry matches
+        :rtype: str
+        """
+
+        for rank in sorted(self.index.candidates(path)):
+            key, regex, _ = self.rules[rank]
+            if regex.match(path):
+                return key
+        return None
+
+
+class URIEntries:
+    """
+    Entries of the toml URI file with their precompiled regular expressions
+
+    Like in a :class:`PolicySection`, the regular expressions are compiled once
+    and indexed in a :class:`PathTrie` by their literal prefix. Entries without
+    wildcards match every path starting with them without running a regular
+    expression. The entries of all patterns matching a path are merged in the
+    order of the toml, and the PDPs resolved for a combination of patterns and
+    a mode are kept, so the toml is not scanned on every decision.
+
+    A PDP may fix its protocol with PROTOCOL ("binary" or "legacy"), so the
+    client does not detect it with a hello, which a legacy PDP would decide
+    on like a request.
+
+    :param entries: The parsed toml in the format {<regex>: <entries>}
+    :type entries: dict
+    """
+
+    def __init__(self, entries=()):
+        self.entries = dict(entries)
+        self.patterns = list(self.entries)
+        # Patterns match themselves, even if they are no valid regular expression
+        self.exact = {pattern: rank for rank, pattern in enumerate(self.patterns)}
+        self.regexes = {}
+        self.index = PathTrie()
+        self.resolved = {}
+        # Protocols fixed by PROTOCOL by the address of the PDP
+        self.protocols = {}
+        for data in self.entries.values():
+            self.collect_protocols(data)
+        for rank, pattern in enumerate(self.patterns):
+            if find_wildcards_in_regex.search(pattern) is None and not any(c in pattern for c in "\\)"):
+                self.index.insert(pattern, rank)
+                continue
+            try:
+                self.regexes[rank] = re.compile(pattern)
+            except re.error:
+                logging.getLogger('infuser').warning(
+                    f"Regular expression '{pattern}' of the URI file could not be compiled. "
+                    f"Matching it only exactly ...")
+                continue
+            self.index.insert(literal_prefix(pattern), rank)
+
+    def __bool__(self) -> bool:
+        return bool(self.entries)
+
+    def matches(self, path: str) -> tuple:
+        """
+        Return the patterns matching a path
+
+        :param path: The path of the object
+        :type path: str
+        :return: The ranks of the matching patterns in the order of the toml
+        :rtype: tuple
+        """
+
+        ranks = set()
+        for rank in self.index.candidates(path):
+            regex = self.regexes.get(rank)
+            if regex is None or regex.match(path):
+                ranks.add(rank)
+        if (rank := self.exact.get(path)) is not None:
+            ranks.add(rank)
+        return tuple(sorted(ranks))
+
+    def servers(self, path: str, mode: str):
+        """
+        Return the PDPs that decide on a mode for a path
+
+        :param path: The path of the object
+        :type path: str
+        :param mode: The requested syscall
+        :type mode: str
+        :return: The IP and PORT or SOCKET of the PDPs by server_id (None for entries without
+                 server_id), an empty dict if no PDP decides on the mode or None if
+                 the toml has no entries for the path
+        :rtype: dict
+        """
+
+        ranks = self.matches(path)
+        if not ranks:
+            return None
+        try:
+            return self.resolved[(ranks, mode)]
+        except KeyError:
+            pass
+
+        path_entries = {}
+        for rank in ranks:
+            path_entries.update(self.entries[self.patterns[rank]])
+        if not path_entries:
+            servers = None
+        # 'Flat' entries with only a path
+        elif self.is_server(path_entries):
+            servers = {None: path_entries}
+        elif (mode_data := path_entries.get(mode)) is None:
+            servers = {}
+        # Entries with a path and access mode
+        elif self.is_server(mode_data):
+            servers = {None: mode_data}
+        # 'Redundant' entries with a path, access mode and server_id
+        else:
+            servers = dict(mode_data)
+        self.resolved[(ranks, mode)] = servers
+        return servers
+
+    def collect_protocols(self, data: dict) -> None:
+        """
+        Collect the protocols fixed by the PDPs of a toml table and its subtables
+
+        :param data: The toml table
+        :type data: dict
+        """
+
+        if not self.is_server(data):
+            for value in data.values():
+                if isinstance(value, dict):
+                    self.collect_protocols(value)
+        elif (protocol := data.get('PROTOCOL')) in ('binary', 'legacy'):
+            self.protocols[self.address(data)] = protocol
+        elif protocol is not None:
+            logging.getLogger('infuser').warning(
+                f"Protocol '{protocol}' of PDP {self.address(data)} in the URI file is not permitted. "
+                f"Permitted are: binary, legacy. Detecting it ...")
+
+    @staticmethod
+    def is_server(data: dict) -> bool:
+        """
+        Return whether a toml table describes a PDP, by IP and PORT or by SOCKET
+        """
+
+        return 'SOCKET' in data or ('IP' in data and 'PORT' in data)
+
+    @staticmethod
+    def address(server_data: dict):
+        """
+        Return the address of a PDP
+
+        :param server_data: The toml table of the PDP
+        :type server_data: dict
+        :return: The path of its Unix domain socket or its (ip, port)
+        :rtype: str or tuple
+        """
+
+        if 'SOCKET' in server_data:
+            return server_data['SOCKET']
+        return server_data['IP'], server_data['PORT']
+
 
 def create_logger(log_file: str, log_level: int) -> None:
     """
@@ -46,7 +381,7 @@ def create_logger(log_file: str, log_level: int) -> None:
 
     # Specify logging format
     logging_format = "%(asctime)s | %(levelname)-8s | %(name)s / %(funcName)-18s | %(message)s"
- durch die Implementierung blockiert. Der Prozess ist
+
     # Bring log_level in format given by logging-framework
     log_level *= 10
     if log_level > logging.CRITICAL:
@@ -73,6 +408,54 @@ def create_logger(log_file: str, log_level: int) -> None:
     logger.addHandler(f_handler)
     logger.setLevel(log_level)
 
+
+def parse_mount_option(option: str) -> tuple:
+    """
+    Parses a FUSE mount option of the command line, e.g. "attr_timeout=5",
+    "kernel_cache" or "kernel_cache=false" to turn off an option of a profile
+
+    :param option: The option in the format key[=value]
+    :type option: str
+    :return: The key and the value as bool, int, float or str
+    :rtype: tuple
+    """
+
+    key, separator, value = option.partition("=")
+    if not key:
+        raise argparse.ArgumentTypeError(f"Invalid mount option: {option}")
+    if not separator or value.lower() == "true":
+        return key, True
+    if value.lower() == "false":
+        return key, False
+    for convert in (int, float):
+        try:
+            return key, convert(value)
+        except ValueError:
+            pass
+    return key, value
+
+
+def mount_options(profile: str, overrides=None) -> tuple:
+    """
+    Returns the options of a mount profile, with single FUSE options overridden
+
+    :param profile: The name of the profile in :data:`mount_profiles`
+    :type profile: str
+    :param overrides: FUSE options replacing the ones of the profile, False turns an option off
+    :type overrides: dict
+    :return: The keyword arguments of fusepy's FUSE and of the
+             :class:`fileoperations.FileOperations` ("durability" and "attr_cache_ttl")
+    :rtype: tuple
+    :raises ValueError: If the profile does not exist
+    """
+
+    if profile not in mount_profiles:
+        raise ValueError(f"Mount profile {profile} is not permitted. Permitted are: {list(mount_profiles)}")
+    settings = mount_profiles[profile]
+    fuse_options = {**settings["fuse"], **(overrides or {})}
+    return fuse_options, {"durability": settings["durability"], "attr_cache_ttl": settings["attr_cache_ttl"]}
+
+
 def parse_args():
     """
     Parses and defines the command line arguments. Provides defaults and type
@@ -95,13 +478,121 @@ def parse_args():
                         help='Pfad zu einer Datei mit URI von Servern zur Autorisierungsanfrage. Diese muss im .csv-Format vorliegen.')
     parser.add_argument('-s', '--state-file', type=str, metavar='state_file',
                         help='Pfad zu einer Datei mit geloggten Zugriffsentscheidungen. Diese muss im .json-Format vorliegen.')
+    parser.add_argument('-c', '--decision-cache-size', type=int, default=4096, metavar='decision_cache_size',
+                        help='Anzahl der zwischengespeicherten Zugriffsentscheidungen fuer Pfade ohne zustandsbasierte '
+                             'oder externe Policy. 0 deaktiviert den Cache.')
+    parser.add_argument('--mount-profile', choices=list(mount_profiles), default='balanced',
+                        help='Profil der FUSE-Optionen, der --durability und der --attr-cache-ttl. strict: Kernel '
+                             'speichert keine Attribute zwischen, jedes close() synchronisiert. balanced: Timeouts von '
+                             'libfuse, jedes close() synchronisiert. throughput: Kernel speichert Attribute und '
+                             'Seiten laenger zwischen (kernel_cache), grosse Anfragen, Synchronisation nur bei fsync.')
+    parser.add_argument('-o', '--mount-option', type=parse_mount_option, action='append', default=[],
+                        metavar='key[=value]',
+                        help='Ueberschreibt eine FUSE-Option des Profils, z.B. -o attr_timeout=5 oder '
+                             '-o kernel_cache=false. Kann mehrfach angegeben werden.')
+    parser.add_argument('--durability', choices=['passthrough', 'batched', 'strict'],
+                        help='Wann geschriebene Dateien auf die Platte synchronisiert werden. passthrough: nur bei '
+                             'fsync/fdatasync der Anwendung, wie ohne Mount. batched: zusaetzlich alle --sync-interval '
+                             'ms im Hintergrund, close() wartet nicht. strict: bei jedem close() und fsync. '
+                             'Standard ist die des --mount-profile.')
+    parser.add_argument('--sync-interval', type=int, default=1000, metavar='milliseconds',
+                        help='Millisekunden zwischen zwei Synchronisationen geschriebener Dateien mit --durability '
+                             'batched.')
+    parser.add_argument('--attr-cache-ttl', type=float, metavar='s',
+                        help='Sekunden, fuer die die Attribute (getattr) und Zugriffspruefungen (access) je Pfad '
+                             'zusaetzlich zum attr_timeout des Kernels zwischengespeichert werden. Aenderungen ueber '
+                             'den Mount verwerfen sie sofort. 0 deaktiviert den Cache. Standard ist die des '
+                             '--mount-profile.')
+    parser.add_argument('--attr-cache-size', type=int, default=16384, metavar='entries',
+                        help='Maximale Anzahl zwischengespeicherter Attribute und Zugriffspruefungen.')
+    parser.add_argument('--state-durability', choices=['none', 'interval', 'batch'], default='none',
+                        help='Wann die Zustandsdatei auf die Platte synchronisiert wird: nie (none), hoechstens alle '
+                             '--state-fsync-interval ms (interval) oder nach jedem Schreibvorgang (batch).')
+    parser.add_argument('--state-fsync-interval', type=int, default=1000, metavar='milliseconds',
+                        help='Abstand der Synchronisierungen der Zustandsdatei bei --state-durability interval.')
+    parser.add_argument('--state-queue-size', type=int, default=65536, metavar='entries',
+                        help='Maximale Anzahl an Eintraegen, die auf das Schreiben in die Zustandsdatei warten.')
+    parser.add_argument('--state-overflow', choices=['block', 'drop'], default='block',
+                        help='Verhalten bei voller Warteschlange: Zugriff wartet (block) oder Eintrag wird nicht in '
+                             'die Zustandsdatei geschrieben (drop).')
+    parser.add_argument('--state-snapshot-every', type=int, default=100000, metavar='entries',
+                        help='Anzahl neuer Eintraege, nach denen ein Snapshot der Zustandsdatei geschrieben wird, '
+                             'sodass beim Mounten nur die Eintraege danach eingelesen werden. 0 deaktiviert Snapshots.')
+    parser.add_argument('--state-retention', choices=['history', 'facts'], default='history',
+                        help='Im Speicher gehaltener Zustand: der Verlauf der Zugriffe (history) oder nur die von den '
+                             'zustandsbasierten Policies benoetigten Fakten, d.h. der letzte erfolgreiche Zugriff je '
+                             'Pfad und Zugriffsart und das erste ausgewaehlte Objekt je Praefix (facts). '
+                             'Die Zustandsdatei enthaelt weiterhin alle Eintraege.')
+    parser.add_argument('--state-max-age', type=int, default=0, metavar='s',
+                        help='Maximales Alter der Eintraege des Verlaufs im Speicher in Sekunden. Aeltere Eintraege '
+                             'sind nur noch in der Zustandsdatei enthalten. 0 deaktiviert die Begrenzung.')
+    parser.add_argument('--state-max-entries', type=int, default=0, metavar='entries',
+                        help='Maximale Anzahl der Eintraege des Verlaufs im Speicher. Die aeltesten Eintraege '
+                             'sind nur noch in der Zustandsdatei enthalten. 0 deaktiviert die Begrenzung.')
+    parser.add_argument('--uri-protocol', choices=['auto', 'binary', 'legacy'], default='auto',
+                        help='Protokoll zu den Servern der URI-Datei: das binaere Protokoll mit Request-IDs, ueber '
+                             'das eine Verbindung viele Anfragen gleichzeitig traegt (binary), das Format "Pfad,Modus" '
+                             '(legacy) oder binary mit Rueckfall auf legacy, falls der Server es nicht spricht (auto).')
+    parser.add_argument('--uri-pool-size', type=int, default=8, metavar='connections',
+                        help='Anzahl offen gehaltener Verbindungen im Format legacy je Server der URI-Datei, die von '
+                             'den FUSE-Threads wiederverwendet werden. 0 baut fuer jede Anfrage eine neue Verbindung '
+                             'auf.')
+    parser.add_argument('--uri-idle-timeout', type=float, default=30.0, metavar='s',
+                        help='Sekunden, nach denen eine unbenutzte Verbindung zu einem Server der URI-Datei '
+                             'geschlossen wird.')
+    parser.add_argument('--uri-cache-size', type=int, default=4096, metavar='entries',
+                        help='Anzahl zwischengespeicherter Entscheidungen der Server der URI-Datei je (Server, Pfad, '
+                             'Modus). 0 deaktiviert den Cache. Fehler werden nie zwischengespeichert.')
+    parser.add_argument('--uri-allow-ttl', type=float, default=1.0, metavar='s',
+                        help='Sekunden, fuer die eine Erlaubnis eines Servers der URI-Datei wiederverwendet wird.')
+    parser.add_argument('--uri-deny-ttl', type=float, default=1.0, metavar='s',
+                        help='Sekunden, fuer die eine Ablehnung eines Servers der URI-Datei wiederverwendet wird.')
+    parser.add_argument('--uri-preauthorize', action='store_true',
+                        help='Fragt die Server der URI-Datei beim Auflisten eines Verzeichnisses vorab nach open und '
+                             'read fuer dessen Eintraege, die die Policy ohne internen Zustand erlaubt, damit die '
+                             'Entscheidungen beim Zugriff zwischengespeichert sind. Die Server erfahren dabei von '
+                             'Zugriffen, die nicht stattgefunden haben.')
+    parser.add_argument('--uri-deadline', type=float, default=3.0, metavar='s',
+                        help='Sekunden, innerhalb derer redundante Server der URI-Datei gemeinsam entscheiden muessen. '
+                             'Server ohne Antwort bis dahin gelten als fehlerhaft.')
+    parser.add_argument('--uri-quorum', type=int, default=0, metavar='servers',
+                        help='Anzahl redundanter Server der URI-Datei, die einen Zugriff erlauben muessen. '
+                             'Eine Ablehnung entscheidet immer. 0 verlangt die Erlaubnis aller Server.')
+    parser.add_argument('--uri-timeout', type=float, default=3.0, metavar='s',
+                        help='Maximale Sekunden fuer den Verbindungsaufbau zu einem Server der URI-Datei und fuer '
+                             'eine Anfrage.')
+    parser.add_argument('--uri-min-timeout', type=float, default=0.1, metavar='s',
+                        help='Minimale Sekunden fuer eine Anfrage. Dazwischen passt sich der Timeout je Server an das '
+                             'Perzentil der Antwortzeiten an.')
+    parser.add_argument('--uri-timeout-percentile', type=float, default=99.0, metavar='percentile',
+                        help='Perzentil der Antwortzeiten eines Servers der URI-Datei, dessen Vierfaches der Timeout '
+                             'seiner Anfragen ist.')
+    parser.add_argument('--uri-breaker-failures', type=int, default=5, metavar='failures',
+                        help='Anzahl aufeinanderfolgender Fehler oder Timeouts, nach denen ein Server der URI-Datei '
+                             'nicht mehr gefragt wird (Circuit Breaker offen).')
+    parser.add_argument('--uri-breaker-reset', type=float, default=5.0, metavar='s',
+                        help='Sekunden, nach denen ein nicht mehr gefragter Server der URI-Datei mit einer einzelnen '
+                             'Anfrage erneut geprueft wird.')
+    parser.add_argument('--uri-unavailable', choices=['deny', 'allow'], default='deny',
+                        help='Entscheidung eines nicht mehr gefragten Servers der URI-Datei: wie ein Fehler (deny) '
+                             'oder eine Erlaubnis (allow).')
+    parser.add_argument('--uri-metrics-file', type=str, metavar='metrics_file',
+                        help='JSON-Datei, in die bei jedem Zustandswechsel die Zustaende und Zaehler der Circuit '
+                             'Breaker aller Server der URI-Datei geschrieben werden.')
     parser.add_argument('-v', '--verbose', action='count', default=0,
                         help='Log-level des Programms. Wird durch die Anzahl v definiert. 5 v ist Log-Level CRITICAL\n'
                              ' - 1 v ist Log-Level DEBUG. Bsp: -vvv ist Log-Level WARNING')
-    return parser.parse_args()
+    args = parser.parse_args()
 
+    # Options given explicitly take precedence over the ones of the profile
+    args.fuse_options, file_options = mount_options(args.mount_profile, dict(args.mount_option))
+    for key, value in file_options.items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    return args
 
-def parse_policy(pf: str):
+
+def parse_policy(pf: str, strict=False):
     """
     Parses the policies, whereby excessive error handling is carried out.
     attention is paid to correct values and regular expressions according to
@@ -109,6 +600,11 @@ def parse_policy(pf: str):
     
     :param pf: The file containing the policies
     :type pf: str
+    :param strict: Raise a PolicyError instead of skipping invalid parts of the policy,
+                   e.g. when reloading the policy of a running file system
+    :type strict: bool
+    :return: The policy with one :class:`PolicySection` per section
+    :rtype: dict
     """
     
     log = logging.getLogger('infuser')
@@ -116,15 +612,21 @@ def parse_policy(pf: str):
     parser = ConfigParser()
     try:
         # Try to read the contents of the policy file
-        parser.read(pf)
-    except FileNotFoundError as e:
-        # Invalid policy file-path
-        log.critical(f"Could not read policy-file: {pf} - {e.strerror}")
+        if strict:
+            with open(pf, 'r') as file:
+                parser.read_file(file)
+        else:
+            parser.read(pf)
+    except (FileNotFoundError, configparser.Error) as e:
+        # Invalid policy file-path or syntax
+        if strict:
+            raise PolicyError(f"Could not read policy-file: {pf} - {e}")
+        log.critical(f"Could not read policy-file: {pf} - {e}")
         sys.exit(0)
     except TypeError:
         # No policy provided
         log.info(f"No policy-file provided, using empty default config")
-        return {"read": {"/*": True}, "write": {"/*": True}, "execute": {"/*": True}}
+        return compile_policy({"read": {"/*": True}, "write": {"/*": True}, "execute": {"/*": True}})
 
     policy = dict()
 
@@ -133,12 +635,12 @@ def parse_policy(pf: str):
     values_allow = ["allow", "true", "1"]
     # Values if access to filepath should not be granted
     values_deny = ["deny", "false", "0"]
-    values_section = ["read", "write", "execute", "written-no-execute",
-                      "first-object-only"]  # Values for names of the sections
 
     # Parse the contents of the policy
     for sec in parser.sections():
         if sec not in values_section:
+            if strict:
+                raise PolicyError(f"Policy Section {sec} has incorrect value. Permitted are: {values_section}")
             # Invalid section name found, skipping section
             log.error(
                 f"Policy Section {sec} has incorrect value. Permitted are: {values_section}")
@@ -153,6 +655,9 @@ def parse_policy(pf: str):
             if item[1].lower() in values_allow:
                 is_allowed = True
             elif item[1].lower() not in values_deny:
+                if strict:
+                    raise PolicyError(f"Policy Entry {item} has incorrect value. Permitted are: {values_allow} or "
+                                      f"{values_deny}")
                 # Invalid value for filepath found, skipping filepath
                 log.warning(
                     f"Policy Entry {item} has incorrect value. Permitted are: {values_allow} or {values_deny}")
@@ -161,23 +666,27 @@ def parse_policy(pf: str):
             # If access to filepath should not be granted according to policy, it will be False at this point
             policy[sec][item[0]] = is_allowed
 
-        # sort the section for longest regex without wildcard
-        find_wildcards_in_regex = re.compile(r"(?<!\\)[(\[{?*+|.$^]")
-        policy[sec] = \
-            OrderedDict(
-                sorted(
-                    policy[sec].items(), key=lambda tmp_key: len(
-                        re.split(find_wildcards_in_regex,
-                                 tmp_key[0], maxsplit=1)[0]
-                    ), reverse=True
-                )
-        )
+        policy[sec] = PolicySection(policy[sec])
+        if strict and len(policy[sec].rules) != len(policy[sec]):
+            raise PolicyError(f"Policy Section {sec} contains regular expressions that could not be compiled")
+
+    return compile_policy(policy)
 
-    # Add section to policy dict if it's not there so there are no KeyErrors later on
-    for section in values_section:
-        try:
-            policy[section]
-        except KeyError:
-            policy[section] = dict()
 
-    return policy
+def compile_policy(policy: dict) -> dict:
+    """
+    Compiles every section of a policy into a :class:`PolicySection`. Sections that
+    are missing are added empty, so there are no KeyErrors later on. Already compiled
+    sections are kept as they are.
+
+    :param policy: The policies (sections) and entries, e.g. as received via JSON
+    :type policy: dict
+    :return: The policy with compiled sections
+    :rtype: dict
+    """
+
+    compiled = dict()
+    for section in values_section:
+        entries = policy.get(section) or dict()
+        compiled[section] = entries if isinstance(entries, PolicySection) else PolicySection(entries)
+    return compiled
@@ -0,0 +1,879 @@
+"""
+Client side of the calls of the :doc:`infuser` to external PDPs (policy
+decision points) configured in the toml URI file, see :doc:`server` for the
+server side and :doc:`pdp_protocol` for the protocol. A PDP is reached via
+TCP at its (ip, port) or, if it runs on the same host, via the path of its
+Unix domain socket.
+
+Every PDP has a :class:`CircuitBreaker`, so a PDP that is down costs the
+FUSE threads one short timeout each until the breaker opens instead of the
+full timeout for every syscall.
+
+Libraries/Modules:
+
+- itertools standard library
+  - Access to a counter of request IDs
+- json standard library
+  - Access to the format of the exported metrics
+- logging standard library
+  - Access to logging functionality
+- os standard library
+  - Access to replacing the metrics file atomically
+- socket standard library
+  - Access to networking functions
+- threading standard library
+  - Access to locks, as the FUSE operations are called from several threads
+- time standard library
+  - Access to a monotonic clock
+- collections standard library
+  - Access to deque
+
+"""
+
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from collections import deque
+
+import pdp_protocol
+
+# Latencies of the latest successful requests per PDP the timeout is adapted to
+LATENCY_SAMPLES = 256
+# Number of latencies needed before the timeout is adapted
+MIN_LATENCY_SAMPLES = 20
+# The adapted timeout is the percentile of the latencies times this factor
+TIMEOUT_FACTOR = 4.0
+
+
+def connect(address, timeout: float) -> socket.socket:
+    """
+    Connect to a PDP via TCP or, if the address is a path, its Unix domain socket
+
+    :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+    :type address: tuple or str
+    :param timeout: The timeout of connecting, sending and receiving in seconds
+    :type timeout: float
+    :return: The connection
+    :rtype: socket.socket
+    """
+
+    if isinstance(address, str):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        try:
+            connection.connect(address)
+        except OSError:
+            connection.close()
+            raise
+        return connection
+    return socket.create_connection(address, timeout=timeout)
+
+
+def describe(address) -> str:
+    """
+    Return an address for log messages, "ip:port" or the socket path
+    """
+
+    return address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
+
+class ConnectionPool:
+    """
+    Kept-alive connections to the PDPs, pooled per (ip, port) or socket path
+
+    A FUSE worker thread borrows a connection for one request and returns it
+    afterwards, so the handshake is only done for the first request and
+    whenever all connections to a PDP are in use. The most recently returned
+    connection is borrowed first, so the others run idle and are closed after
+    the idle timeout. A connection that has been closed by the PDP in the
+    meantime is replaced by a new one transparently.
+
+    :param timeout: The timeout of connecting, sending and receiving in seconds
+    :type timeout: float
+    :param idle_timeout: The seconds after which an unused connection is closed
+    :type idle_timeout: float
+    :param max_idle: The maximum number of unused connections kept per PDP. 0 disables the pool
+    :type max_idle: int
+    """
+
+    def __init__(self, timeout=3.0, idle_timeout=30.0, max_idle=8):
+        self.log = logging.getLogger("infuser")
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.connects = 0
+        self.reuses = 0
+        # Unused connections per address as (socket, time of return), the latest last
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, address: tuple, timeout=None):
+        """
+        Borrow a connection to a PDP, connecting if no unused connection is left
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :param timeout: The timeout of connecting in seconds, the one of the pool if None
+        :type timeout: float
+        :return: The connection and whether it has been used before
+        :rtype: tuple
+        """
+
+        self.close_idle()
+        with self._lock:
+            connections = self._idle.get(address)
+            if connections:
+                self.reuses += 1
+                return connections.pop()[0], True
+            self.connects += 1
+        return connect(address, timeout or self.timeout), False
+
+    def release(self, address: tuple, connection: socket.socket) -> None:
+        """
+        Return a borrowed connection that is ready for the next request
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :param connection: The borrowed connection
+        :type connection: socket.socket
+        """
+
+        with self._lock:
+            connections = self._idle.setdefault(address, deque())
+            if len(connections) < self.max_idle:
+                connections.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def close_idle(self) -> None:
+        """
+        Close the connections that have been unused for longer than the idle timeout
+        """
+
+        expired = []
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for connections in self._idle.values():
+                # The connection returned first is the longest unused one
+                while connections and connections[0][1] < deadline:
+                    expired.append(connections.popleft()[0])
+        for connection in expired:
+            connection.close()
+
+    def close(self) -> None:
+        """
+        Close all unused connections, e.g. when the file system is unmounted
+        """
+
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+    def request(self, address: tuple, data: bytes, complete, timeout=None) -> bytes:
+        """
+        Send a request to a PDP and receive the response on a pooled connection.
+        If a reused connection has been closed by the PDP, the request is sent
+        once more on a new connection. A connection that failed or did not
+        receive a complete response is closed instead of being returned.
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :param data: The request
+        :type data: bytes
+        :param complete: A function returning True when the received bytes are a
+                         complete response and False if more are expected. It may
+                         raise a ValueError if the bytes can not become a response
+        :param timeout: The timeout of the request in seconds, the one of the pool if None
+        :type timeout: float
+        :return: The response
+        :rtype: bytes
+        """
+
+        while True:
+            connection, reused = self.acquire(address, timeout)
+            try:
+                connection.settimeout(timeout or self.timeout)
+                connection.sendall(data)
+                received = b""
+                while not complete(received):
+                    chunk = connection.recv(4096)
+                    if not chunk:
+                        raise ConnectionResetError(f"Connection closed by {describe(address)}")
+                    received += chunk
+            except OSError as e:
+                connection.close()
+                if reused and not isinstance(e, socket.timeout):
+                    self.log.debug(f"Reconnecting to {describe(address)} - {e}")
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            self.release(address, connection)
+            return received
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the pool
+
+        :return: The connects, reuses and the number of unused connections
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {"connects": self.connects, "reuses": self.reuses,
+                    "idle": sum(len(connections) for connections in self._idle.values())}
+
+
+class Channel:
+    """
+    One connection to a PDP speaking the binary protocol, shared by all threads
+
+    The threads send their requests with a request ID and wait for the response
+    with that ID, which a reader thread hands over as soon as it arrives. So
+    the requests of many threads are pipelined on the connection and a slow
+    decision does not hold up the others. The channel closes itself when it has
+    been unused for the idle timeout or the connection fails, the threads
+    waiting for a response get an error then.
+
+    :param connection: The connection after the hello
+    :type connection: socket.socket
+    :param version: The version of the protocol spoken on the connection
+    :type version: int
+    :param timeout: The seconds to wait for a response
+    :type timeout: float
+    :param idle_timeout: The seconds after which the unused channel is closed
+    :type idle_timeout: float
+    """
+
+    def __init__(self, connection: socket.socket, version: int, timeout=3.0, idle_timeout=30.0):
+        self.log = logging.getLogger("infuser")
+        self.connection = connection
+        self.version = version
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.closed = False
+        self.last_used = time.monotonic()
+        self._ids = itertools.count(1)
+        # Threads waiting for a response by request ID as [event, payload of the response]
+        self._waiting = {}
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self.read, name="pdp-channel", daemon=True)
+        self._reader.start()
+
+    def request(self, path: str, mode: str, timeout=None) -> bool:
+        """
+        Send a request and wait for its response
+
+        :param path: The path of the object
+        :type path: str
+        :param mode: The requested syscall
+        :type mode: str
+        :param timeout: The seconds to wait for the response, the ones of the channel if None
+        :type timeout: float
+        :return: Whether the PDP allows the access
+        :rtype: bool
+        :raises OSError: If the channel is closed or there is no response before the timeout
+        :raises ValueError: If the PDP could not decide on the request
+        """
+
+        verdict = self.exchange(lambda request_id: pdp_protocol.encode_request(request_id, path, mode,
+                                                                                self.version), timeout)[0]
+        if verdict == pdp_protocol.ERROR:
+            raise ValueError(f"PDP could not decide on mode {mode} for {path}")
+        return verdict == pdp_protocol.ALLOW
+
+    def request_batch(self, requests: list) -> list:
+        """
+        Send a batch of requests and wait for the response to all of them
+
+        :param requests: The (path, mode) pairs, their frame has to fit into
+                         :data:`pdp_protocol.MAX_PAYLOAD`
+        :type requests: list
+        :return: Whether the PDP allows the access per pair, None if it could not decide
+        :rtype: list
+        :raises OSError: If the channel is closed or there is no response before the timeout
+        :raises ValueError: If the response does not fit the batch
+        """
+
+        verdicts = self.exchange(lambda request_id: pdp_protocol.encode_batch_request(request_id, requests,
+                                                                                       self.version))
+        if len(verdicts) != len(requests):
+            raise ValueError(f"PDP answered {len(verdicts)} of {len(requests)} requests")
+        return [None if verdict == pdp_protocol.ERROR else verdict == pdp_protocol.ALLOW for verdict in verdicts]
+
+    def exchange(self, encode, timeout=None) -> bytes:
+        """
+        Send a frame with a new request ID and wait for the payload of its response
+
+        :param encode: A function returning the frame for a request ID
+        :param timeout: The seconds to wait for the response, the ones of the channel if None
+        :type timeout: float
+        :return: The payload of the response
+        :rtype: bytes
+        """
+
+        waiter = [threading.Event(), None]
+        with self._lock:
+            if self.closed:
+                raise ConnectionResetError("Channel to the PDP is closed")
+            request_id = next(self._ids) & 0xFFFFFFFF
+            self._waiting[request_id] = waiter
+            self.last_used = time.monotonic()
+        try:
+            with self._send_lock:
+                self.connection.sendall(encode(request_id))
+        except OSError:
+            self.close()
+            raise
+        timeout = timeout or self.timeout
+        if not waiter[0].wait(timeout):
+            with self._lock:
+                self._waiting.pop(request_id, None)
+            raise socket.timeout(f"No response to request {request_id} within {timeout:.3f} s")
+        if waiter[1] is None:
+            raise ConnectionResetError("Channel to the PDP has been closed")
+        return waiter[1]
+
+    def read(self) -> None:
+        """
+        Receive the responses and hand them over to the waiting threads
+        """
+
+        data = b""
+        try:
+            while True:
+                try:
+                    chunk = self.connection.recv(65536)
+                except socket.timeout:
+                    with self._lock:
+                        if not self._waiting and time.monotonic() - self.last_used > self.idle_timeout:
+                            break
+                    continue
+                if not chunk:
+                    break
+                data += chunk
+                while len(data) >= pdp_protocol.HEADER.size:
+                    version, kind, request_id, length = pdp_protocol.HEADER.unpack_from(data)
+                    if version != self.version or kind not in (pdp_protocol.RESPONSE, pdp_protocol.BATCH_RESPONSE) \
+                            or length > pdp_protocol.MAX_PAYLOAD:
+                        raise ValueError(f"Unexpected frame (version {version}, type {kind})")
+                    end = pdp_protocol.HEADER.size + length
+                    if len(data) < end:
+                        break
+                    payload, data = data[pdp_protocol.HEADER.size:end], data[end:]
+                    with self._lock:
+                        waiter = self._waiting.pop(request_id, None)
+                    if waiter is not None:
+                        waiter[1] = payload if payload or kind == pdp_protocol.BATCH_RESPONSE \
+                            else bytes((pdp_protocol.ERROR,))
+                        waiter[0].set()
+        except (OSError, ValueError) as e:
+            self.log.debug(f"ERROR - Channel to the PDP failed - {e}")
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the connection, the waiting threads get an error
+        """
+
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            waiting, self._waiting = self._waiting, {}
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+        for waiter in waiting.values():
+            waiter[0].set()
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised instead of asking a PDP whose circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker and adaptive timeout of the requests to one PDP
+
+    - closed: Requests are sent. After a number of consecutive failures
+      (errors of the connection or timeouts) the breaker opens.
+    - open: Requests are rejected with a :class:`CircuitOpenError` right away.
+      After the reset timeout the breaker is half-open.
+    - half-open: One request is sent as a trial with the full timeout, the
+      others are still rejected. The breaker closes if the trial succeeds and
+      opens again otherwise.
+
+    The timeout of a request is the percentile of the latencies of the latest
+    successful requests times :data:`TIMEOUT_FACTOR`, limited by the minimum
+    and the full timeout, so a PDP that stops answering is detected after a
+    multiple of its usual latency.
+
+    :param failures: The number of consecutive failures that open the breaker
+    :type failures: int
+    :param reset_timeout: The seconds the breaker stays open before a trial
+    :type reset_timeout: float
+    :param timeout: The full timeout in seconds, used until enough latencies are known
+    :type timeout: float
+    :param min_timeout: The minimum of the adapted timeout in seconds
+    :type min_timeout: float
+    :param percentile: The percentile of the latencies the timeout is adapted to
+    :type percentile: float
+    :param on_transition: A function called with the old and the new state on every transition
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failures=5, reset_timeout=5.0, timeout=3.0, min_timeout=0.1, percentile=99.0,
+                 on_transition=None):
+        self.failure_threshold = failures
+        self.reset_timeout = reset_timeout
+        self.max_timeout = timeout
+        self.min_timeout = min_timeout
+        self.percentile = percentile
+        self.on_transition = on_transition
+        self.state = self.CLOSED
+        self.timeout = timeout
+        self.failures = 0
+        self.rejected = 0
+        self.transitions = {}
+        self._opened = 0.0
+        self._trial = False
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Admit a request, which has to be reported with :meth:`success` or :meth:`failure`
+
+        :return: The timeout of the request in seconds
+        :rtype: float
+        :raises CircuitOpenError: If the breaker is open or a trial is running
+        """
+
+        transition = None
+        with self._lock:
+            if self.state == self.CLOSED:
+                return self.timeout
+            if self.state == self.OPEN and time.monotonic() - self._opened >= self.reset_timeout:
+                transition = self.transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                timeout = self.max_timeout
+            else:
+                self.rejected += 1
+                timeout = None
+        self.notify(transition)
+        if timeout is None:
+            raise CircuitOpenError(f"Circuit breaker is {self.state}")
+        return timeout
+
+    def success(self, latency=None) -> None:
+        """
+        Report an answered request
+
+        :param latency: The seconds the request took, None if it should not adapt the timeout
+        :type latency: float
+        """
+
+        transition = None
+        with self._lock:
+            self.failures = 0
+            self._trial = False
+            if self.state != self.CLOSED:
+                transition = self.transition(self.CLOSED)
+            if latency is not None:
+                self._latencies.append(latency)
+                self._samples += 1
+                # Sorting the latencies only for every 16th request keeps the bookkeeping cheap
+                if len(self._latencies) >= MIN_LATENCY_SAMPLES and not self._samples % 16:
+                    latencies = sorted(self._latencies)
+                    quantile = latencies[min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)]
+                    self.timeout = min(max(quantile * TIMEOUT_FACTOR, self.min_timeout), self.max_timeout)
+        self.notify(transition)
+
+    def failure(self) -> None:
+        """
+        Report a request that failed or timed out
+        """
+
+        transition = None
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and
+                                                self.failures >= self.failure_threshold):
+                self._opened = time.monotonic()
+                transition = self.transition(self.OPEN)
+        self.notify(transition)
+
+    def transition(self, state: str) -> tuple:
+        """
+        Change the state, the lock has to be held
+
+        :return: The old and the new state
+        :rtype: tuple
+        """
+
+        old, self.state = self.state, state
+        self.transitions[state] = self.transitions.get(state, 0) + 1
+        return old, state
+
+    def notify(self, transition) -> None:
+        """
+        Call the function on transitions, outside the lock as it may read the stats
+        """
+
+        if transition is not None and self.on_transition is not None:
+            self.on_transition(*transition)
+
+    def stats(self) -> dict:
+        """
+        Return the state and the counters of the breaker
+
+        :return: The state, consecutive failures, rejected requests, transitions by
+                 new state and the current timeout
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected,
+                    "transitions": dict(self.transitions), "timeout": round(self.timeout, 4)}
+
+
+class PDPClient:
+    """
+    Requests decisions of the PDPs in the binary protocol or the legacy format
+
+    With the protocol "auto", the first connection to a PDP tells from the
+    answer to the hello whether the PDP speaks the binary protocol. PDPs that
+    do are asked on one :class:`Channel` each, the others in the legacy format
+    on the kept-alive connections of a :class:`ConnectionPool`. The result is
+    kept per PDP, so the hello is sent once. PDPs whose protocol is fixed by
+    :meth:`fix_protocols` get no hello at all.
+
+    Every request passes the :class:`CircuitBreaker` of its PDP. The
+    transitions of the breakers are logged and, if a metrics file is given,
+    the stats of all breakers are written to it as JSON on every transition.
+
+    :param timeout: The full timeout of connecting and of a request in seconds
+    :type timeout: float
+    :param idle_timeout: The seconds after which an unused connection is closed
+    :type idle_timeout: float
+    :param max_idle: The maximum number of unused legacy connections kept per PDP
+    :type max_idle: int
+    :param protocol: "auto", "binary" or "legacy"
+    :type protocol: str
+    :param breaker: The keyword arguments of the :class:`CircuitBreaker` of every PDP
+    :type breaker: dict
+    :param metrics_file: The file the stats of the breakers are exported to
+    :type metrics_file: str
+    """
+
+    def __init__(self, timeout=3.0, idle_timeout=30.0, max_idle=8, protocol="auto", breaker=None,
+                 metrics_file=None):
+        self.log = logging.getLogger("infuser")
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.protocol = protocol
+        self.breaker_options = breaker or {}
+        self.metrics_file = metrics_file
+        self.pool = ConnectionPool(timeout, idle_timeout, max_idle)
+        # Protocols detected per address
+        self.protocols = {}
+        # Protocols fixed per address, e.g. by the URI file
+        self.fixed_protocols = {}
+        self.channels = {}
+        self.breakers = {}
+        self._locks = {}
+        self._metrics_lock = threading.Lock()
+
+    def fix_protocols(self, protocols: dict) -> None:
+        """
+        Replace the protocols fixed per PDP, which are spoken without sending a hello
+
+        :param protocols: "binary" or "legacy" by the address of the PDP
+        :type protocols: dict
+        """
+
+        self.fixed_protocols = dict(protocols)
+
+    def protocol_of(self, address) -> str:
+        """
+        Return the protocol spoken with a PDP: the fixed, the detected or the configured one
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :return: "auto", "binary" or "legacy"
+        :rtype: str
+        """
+
+        return self.fixed_protocols.get(address) or self.protocols.get(address, self.protocol)
+
+    def breaker(self, address) -> CircuitBreaker:
+        """
+        Return the circuit breaker of a PDP
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :return: The circuit breaker
+        :rtype: CircuitBreaker
+        """
+
+        breaker = self.breakers.get(address)
+        if breaker is None:
+            def on_transition(old: str, new: str):
+                self.log.warning(f"Circuit breaker of PDP {describe(address)} changed from {old} to {new}")
+                self.export_metrics()
+
+            breaker = self.breakers.setdefault(address, CircuitBreaker(
+                **{"timeout": self.timeout, **self.breaker_options}, on_transition=on_transition))
+        return breaker
+
+    def authorize(self, address: tuple, path: str, mode: str) -> bool:
+        """
+        Ask a PDP for a decision
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :param path: The path of the object
+        :type path: str
+        :param mode: The requested syscall
+        :type mode: str
+        :return: Whether the PDP allows the access
+        :rtype: bool
+        :raises CircuitOpenError: If the circuit breaker of the PDP is open
+        :raises OSError: If the PDP can not be reached or does not respond in time
+        :raises ValueError: If the response is not valid
+        """
+
+        breaker = self.breaker(address)
+        timeout = breaker.acquire()
+        start = time.monotonic()
+        try:
+            channel = None
+            if self.protocol_of(address) != "legacy":
+                channel = self.channel(address, timeout)
+            if channel is not None:
+                allowed = channel.request(path, mode, timeout)
+            else:
+                allowed = self.legacy(address, path, mode, timeout)
+        except OSError:
+            breaker.failure()
+            raise
+        except BaseException:
+            # The PDP answered, but not with a decision
+            breaker.success()
+            raise
+        breaker.success(time.monotonic() - start)
+        return allowed
+
+    def authorize_batch(self, address: tuple, requests: list, fallback=True) -> list:
+        """
+        Ask a PDP for decisions on many (path, mode) pairs. PDPs speaking the
+        binary protocol get them in as few batches as fit into a frame, legacy
+        PDPs are asked one pair after another.
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :param requests: The (path, mode) pairs
+        :type requests: list
+        :param fallback: Whether to ask a legacy PDP at all, otherwise no decisions are made
+        :type fallback: bool
+        :return: Whether the PDP allows the access per pair, None if it could not decide
+        :rtype: list
+        :raises CircuitOpenError: If the circuit breaker of the PDP is open
+        :raises OSError: If the PDP can not be reached or does not respond in time
+        :raises ValueError: If the response is not valid
+        """
+
+        breaker = self.breaker(address)
+        timeout = breaker.acquire()
+        try:
+            verdicts = self.request_batch(address, requests, fallback, timeout)
+        except OSError:
+            breaker.failure()
+            raise
+        except BaseException:
+            breaker.success()
+            raise
+        # A batch takes longer than a single request, so it does not adapt the timeout
+        breaker.success()
+        return verdicts
+
+    def request_batch(self, address: tuple, requests: list, fallback: bool, timeout: float) -> list:
+        """
+        Send the requests of :meth:`authorize_batch` past the circuit breaker
+        """
+
+        channel = None
+        if self.protocol_of(address) != "legacy":
+            channel = self.channel(address, timeout)
+        if channel is None:
+            if not fallback:
+                return [None] * len(requests)
+            verdicts = []
+            for path, mode in requests:
+                try:
+                    verdicts.append(self.legacy(address, path, mode, timeout))
+                except ValueError:
+                    verdicts.append(None)
+            return verdicts
+
+        verdicts = []
+        batch, size = [], pdp_protocol.BATCH_COUNT.size
+        for path, mode in requests:
+            length = pdp_protocol.BATCH_LENGTH.size + len(mode.encode()) + 1 + len(path.encode())
+            if batch and size + length > pdp_protocol.MAX_PAYLOAD:
+                verdicts.extend(channel.request_batch(batch))
+                batch, size = [], pdp_protocol.BATCH_COUNT.size
+            batch.append((path, mode))
+            size += length
+        if batch:
+            verdicts.extend(channel.request_batch(batch))
+        return verdicts
+
+    def channel(self, address: tuple, timeout=None):
+        """
+        Return the open channel to a PDP, connecting and sending the hello if necessary
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :param timeout: The timeout of connecting and of the hello in seconds, the full one if None
+        :type timeout: float
+        :return: The channel or None if the PDP only speaks the legacy format
+        :rtype: Channel
+        """
+
+        channel = self.channels.get(address)
+        if channel is not None and not channel.closed:
+            return channel
+        with self._locks.setdefault(address, threading.Lock()):
+            channel = self.channels.get(address)
+            if channel is not None and not channel.closed:
+                return channel
+            connection = connect(address, timeout or self.timeout)
+            try:
+                connection.sendall(pdp_protocol.hello())
+                answer = b""
+                while not (answer.endswith(b"\n") or answer.endswith((b",True", b",False"))):
+                    chunk = connection.recv(4096)
+                    if not chunk:
+                        raise ConnectionResetError(f"Connection closed by {describe(address)}")
+                    answer += chunk
+            except Exception:
+                connection.close()
+                raise
+            if answer.startswith(pdp_protocol.MAGIC + b"="):
+                # The reader of the channel checks for idleness at the full timeout
+                connection.settimeout(self.timeout)
+                channel = Channel(connection, int(answer[len(pdp_protocol.MAGIC) + 1:]), self.timeout,
+                                  self.idle_timeout)
+                self.channels[address] = channel
+                self.protocols[address] = "binary"
+                return channel
+            if self.protocol_of(address) == "binary":
+                connection.close()
+                raise ValueError(f"PDP {describe(address)} does not speak the binary protocol")
+            # The legacy server answered the hello like a request, the connection can be reused
+            self.log.info(f"PDP {describe(address)} only speaks the legacy protocol")
+            self.protocols[address] = "legacy"
+            self.pool.release(address, connection)
+            return None
+
+    def legacy(self, address: tuple, path: str, mode: str, timeout=None) -> bool:
+        """
+        Ask a PDP for a decision in the legacy format "path,mode"
+
+        :param address: The (ip, port) of the PDP or the path of its Unix domain socket
+        :type address: tuple or str
+        :param path: The path of the object
+        :type path: str
+        :param mode: The requested syscall
+        :type mode: str
+        :param timeout: The timeout of the request in seconds, the full one if None
+        :type timeout: float
+        :return: Whether the PDP allows the access
+        :rtype: bool
+        """
+
+        BUFFER = len(path.encode()) + len(mode.encode()) + 8
+
+        def complete(received: bytes) -> bool:
+            if len(received) > BUFFER:
+                raise ValueError("Received data does not fit into the buffer")
+            return received.endswith((b",True", b",False"))
+
+        self.log.debug(f"Sending {path},{mode} to {describe(address)}")
+        received_data = self.pool.request(address, path.encode() + ",".encode() + mode.encode(), complete,
+                                          timeout).decode()
+        self.log.debug(f"Received {received_data} from {describe(address)}")
+
+        # Column the returned string and check if the path was transferred correctly
+        rpath, rmode, allowed = received_data.rsplit(',', 2)
+        if rpath != path or rmode != mode:
+            raise ValueError(f"Response {received_data} does not match the request")
+        return allowed == 'True'
+
+    def close(self) -> None:
+        """
+        Close all channels and unused connections
+        """
+
+        for channel in list(self.channels.values()):
+            channel.close()
+        self.pool.close()
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the connections
+
+        :return: The protocols of the PDPs, the counters of the legacy connection pool and
+                 the stats of the circuit breakers
+        :rtype: dict
+        """
+
+        return {"protocols": {**self.protocols, **self.fixed_protocols}, **self.pool.stats(),
+                "breakers": self.breaker_stats()}
+
+    def breaker_stats(self) -> dict:
+        """
+        Return the stats of the circuit breakers by PDP
+
+        :return: The stats by "ip:port" or socket path
+        :rtype: dict
+        """
+
+        return {describe(address): breaker.stats() for address, breaker in list(self.breakers.items())}
+
+    def export_metrics(self) -> None:
+        """
+        Write the stats of the circuit breakers to the metrics file, replacing it atomically
+        """
+
+        if not self.metrics_file:
+            return
+        with self._metrics_lock:
+            try:
+                temporary = f"{self.metrics_file}.tmp"
+                with open(temporary, "w") as file:
+                    json.dump({"time": time.time(), "breakers": self.breaker_stats()}, file)
+                os.replace(temporary, self.metrics_file)
+            except OSError as e:
+                self.log.error(f"ERROR - Can not export the metrics of the PDPs to {self.metrics_file}: {e}")
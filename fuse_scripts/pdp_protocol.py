@@ -0,0 +1,217 @@
+"""
+Wire protocol between the :doc:`infuser` and the PDPs (:doc:`server`).
+
+A connection starts with a hello carrying the highest protocol version of
+the client. The server answers with the version both of them speak. A
+legacy server, that only knows requests in the format "path,mode", answers
+the hello like such a request ("<hello>,False"), so the client can fall back
+to the legacy format.
+
+After the hello, requests and responses are frames of a header (version,
+type, request ID and length of the payload) and the payload. The request ID
+lets one connection carry many pipelined requests of different threads,
+whose responses may come back in any order.
+
+- Request payload: the mode, a NUL byte and the path (UTF-8)
+- Response payload: one byte, :data:`DENY`, :data:`ALLOW` or :data:`ERROR`
+- Batch request payload: the number of requests and the requests, each
+  preceded by its length
+- Batch response payload: one verdict byte per request, in their order
+
+Libraries/Modules:
+
+- struct standard library
+  - Access to the binary format of the frames
+
+"""
+
+import struct
+
+# Start of the hello, no legacy request starts with a NUL byte
+MAGIC = b"\x00PDP"
+VERSION = 1
+
+# Version, type, request ID and length of the payload
+HEADER = struct.Struct("!BBII")
+MAX_PAYLOAD = 65536
+
+# Types of frames
+REQUEST = 1
+RESPONSE = 2
+BATCH_REQUEST = 3
+BATCH_RESPONSE = 4
+
+# Number of requests of a batch and length of a request in it
+BATCH_COUNT = struct.Struct("!I")
+BATCH_LENGTH = struct.Struct("!H")
+
+# Verdicts of responses
+DENY = 0
+ALLOW = 1
+ERROR = 2
+
+
+def hello(version=VERSION) -> bytes:
+    """
+    Return the hello of a client, which is a valid legacy request as well
+
+    :param version: The highest version the client speaks
+    :type version: int
+    :return: The hello
+    :rtype: bytes
+    """
+
+    return MAGIC + b"," + str(version).encode()
+
+
+def hello_answer(version: int) -> bytes:
+    """
+    Return the answer of a server to a hello
+
+    :param version: The version both the client and the server speak
+    :type version: int
+    :return: The answer, which is never a valid legacy response
+    :rtype: bytes
+    """
+
+    return MAGIC + b"=" + str(version).encode() + b"\n"
+
+
+def parse_hello(data: bytes):
+    """
+    Return the version of a hello
+
+    :param data: The first bytes received on a connection
+    :type data: bytes
+    :return: The version or None if the data is no hello
+    :rtype: int
+    """
+
+    if not data.startswith(MAGIC + b","):
+        return None
+    try:
+        return int(data[len(MAGIC) + 1:])
+    except ValueError:
+        return None
+
+
+def encode_request(request_id: int, path: str, mode: str, version=VERSION) -> bytes:
+    """
+    Return the frame of a request
+
+    :param request_id: The ID the response refers to
+    :type request_id: int
+    :param path: The path of the object
+    :type path: str
+    :param mode: The requested syscall
+    :type mode: str
+    :param version: The version of the connection
+    :type version: int
+    :return: The frame
+    :rtype: bytes
+    """
+
+    payload = mode.encode() + b"\0" + path.encode()
+    return HEADER.pack(version, REQUEST, request_id, len(payload)) + payload
+
+
+def decode_request(payload: bytes) -> tuple:
+    """
+    Return the path and the mode of the payload of a request
+
+    :param payload: The payload of the request
+    :type payload: bytes
+    :return: The path and the mode
+    :rtype: tuple
+    :raises ValueError: If the payload is not valid
+    """
+
+    mode, separator, path = payload.partition(b"\0")
+    if not separator:
+        raise ValueError("Request has no path")
+    return path.decode(), mode.decode()
+
+
+def encode_response(request_id: int, verdict: int, version=VERSION) -> bytes:
+    """
+    Return the frame of a response
+
+    :param request_id: The ID of the request
+    :type request_id: int
+    :param verdict: :data:`DENY`, :data:`ALLOW` or :data:`ERROR`
+    :type verdict: int
+    :param version: The version of the connection
+    :type version: int
+    :return: The frame
+    :rtype: bytes
+    """
+
+    return HEADER.pack(version, RESPONSE, request_id, 1) + bytes((verdict,))
+
+
+def encode_batch_request(request_id: int, requests: list, version=VERSION) -> bytes:
+    """
+    Return the frame of a batch of requests
+
+    :param request_id: The ID the response refers to
+    :type request_id: int
+    :param requests: The (path, mode) pairs
+    :type requests: list
+    :param version: The version of the connection
+    :type version: int
+    :return: The frame
+    :rtype: bytes
+    """
+
+    parts = [BATCH_COUNT.pack(len(requests))]
+    for path, mode in requests:
+        request = mode.encode() + b"\0" + path.encode()
+        parts.append(BATCH_LENGTH.pack(len(request)))
+        parts.append(request)
+    payload = b"".join(parts)
+    return HEADER.pack(version, BATCH_REQUEST, request_id, len(payload)) + payload
+
+
+def decode_batch_request(payload: bytes) -> list:
+    """
+    Return the (path, mode) pairs of the payload of a batch of requests
+
+    :param payload: The payload of the batch
+    :type payload: bytes
+    :return: The pairs, None for each request that is not valid
+    :rtype: list
+    :raises ValueError: If the payload is not valid
+    """
+
+    try:
+        count, = BATCH_COUNT.unpack_from(payload)
+        offset = BATCH_COUNT.size
+        requests = []
+        for _ in range(count):
+            length, = BATCH_LENGTH.unpack_from(payload, offset)
+            offset += BATCH_LENGTH.size
+            try:
+                requests.append(decode_request(payload[offset:offset + length]))
+            except ValueError:
+                requests.append(None)
+            offset += length
+    except struct.error as e:
+        raise ValueError(f"Batch is truncated - {e}")
+    return requests
+
+
+def encode_batch_response(request_id: int, verdicts: list, version=VERSION) -> bytes:
+    """
+    Return the frame of the response to a batch
+
+    :param request_id: The ID of the batch
+    :type request_id: int
+    :param verdicts: :data:`DENY`, :data:`ALLOW` or :data:`ERROR` per request
+    :type verdicts: list
+    :param version: The version of the connection
+    :type version: int
+    :return: The frame
+    :rtype: bytes
+    """
+
+    return HEADER.pack(version, BATCH_RESPONSE, request_id, len(verdicts)) + bytes(verdicts)
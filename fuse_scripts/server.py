@@ -3,25 +3,69 @@ This module contains functions to start a server that listens for incoming
 connections on a specified host and port, and handles communication with clients.
 The server is then used to make access control decisions.
 
+The server runs on asyncio, so many clients (e.g. the FUSE worker threads of
+several mounts) can keep their connections open at the same time. Every
+connection is served until the client closes it, the number of connections
+is limited and SIGINT or SIGTERM shut the server down gracefully. Clients
+speak the binary protocol of :doc:`pdp_protocol` or the legacy format
+"path,mode".
+
+A PDP on the same host as the infuser can listen on a Unix domain socket
+instead of TCP. The permissions of the socket file then decide which users
+may connect, the peer of a connection is ("unix", pid, uid, gid) of the client.
+
 Created by Stephan Winker on 02/09/2023
 
 Libraries/Modules:
 
+- argparse standard library
+  - Access to argument parsing functionality
+- asyncio standard library
+  - Access to the event loop, streams and the server
+- logging standard library
+  - Access to logging functionality
+- os standard library
+  - Access to the permissions of the Unix domain socket
+- signal standard library
+  - Access to the signals that shut down the server
 - socket standard library
-  - Access to networking functions
+  - Access to the credentials of the clients on a Unix domain socket
+- stat standard library
+  - Access to the type of an existing socket file
+- struct standard library
+  - Access to the format of the credentials
+- pdp_protocol
+  - Access to the binary protocol
 
 """
 
+import argparse
+import asyncio
+import logging
+import os
+import signal
 import socket
+import stat
+import struct
+
+import pdp_protocol
 
-def authorize(path: str, mode: str, conn: socket.socket) -> bool:
+# Seconds that the connections get to finish their current request on shutdown
+SHUTDOWN_TIMEOUT = 5.0
+
+
+def authorize(path: str, mode: str, peer: tuple) -> bool:
     """
-    Gives or denies authorisation based on custom criteria 
-    
-    :param path: The path of the object 
+    Gives or denies authorisation based on custom criteria. The function is
+    called by the event loop, so it must not block. A coroutine function may
+    be used instead, its decisions on pipelined requests run concurrently.
+
+    :param path: The path of the object
     :type path: str
     :param mode: The requested syscall
-    :type conn: socket.socket
+    :type mode: str
+    :param peer: The address of the client, (ip, port) or ("unix", pid, uid, gid)
+    :type peer: tuple
     :return: A boolean that allows or denies access
     :rtype: bool
     .. todo:: [#6] Add serverside logging
@@ -29,69 +73,278 @@ def authorize(path: str, mode: str, conn: socket.socket) -> bool:
     #print("Checking whether authorisation is permitted")
     # Example of a requirement
     return (
-      conn.getpeername()[0] in ["127.0.0.1"]                                    # Origin in allowlist 
+      peer[0] in ["127.0.0.1", "unix"]                                          # Origin in allowlist
       and path in ["/foo", "/foo/a", "/foo/b", "/foo2", "/file.txt", "/file.c"] # Path in allowlist
       and mode in ["open", "read", "write", "readdir"]                          # Syscall in allowlist
     )
 
 
-def handle_client_connection(conn: socket.socket):
+class PDPServer:
     """
-    Handles communication with a client
-    
-    :param conn: The connection socket object for the client
-    :type conn: socket.socket
+    Serves the requests of many persistent client connections concurrently
+
+    :param host: The address to listen on
+    :type host: str
+    :param port: The port to listen on
+    :type port: int
+    :param max_connections: The maximum number of open connections, further clients are disconnected
+    :type max_connections: int
+    :param authorize: The function deciding on a path, a mode and the address of the client
+    :param socket_path: The path of a Unix domain socket to listen on instead of host and port
+    :type socket_path: str
+    :param socket_mode: The permissions of the Unix domain socket
+    :type socket_mode: int
     """
 
-    #print("Handling incoming connection")
-    while True:
+    def __init__(self, host="127.0.0.1", port=2233, max_connections=1024, authorize=authorize, socket_path=None,
+                 socket_mode=0o660):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.socket_mode = socket_mode
+        self.max_connections = max_connections
+        self.authorize = authorize
+        # The tasks of the open connections and whether they wait for the next request
+        self.connections = {}
+        self.server = None
+        self.stopping = None
+
+    async def handle_client_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Handles communication with a client
+
+        :param reader: The stream of the requests of the client
+        :type reader: asyncio.StreamReader
+        :param writer: The stream of the responses to the client
+        :type writer: asyncio.StreamWriter
+        """
+
+        if len(self.connections) >= self.max_connections:
+            #print("Connection limit reached, disconnecting", writer.get_extra_info("peername"))
+            writer.close()
+            return
+        task = asyncio.current_task()
+        peer = self.peer(writer)
         try:
-            demand = conn.recv(4096).decode()
-            if not demand:
-                break
+            while not self.stopping.is_set():
+                self.connections[task] = True
+                demand = await reader.read(4096)
+                self.connections[task] = False
+                if not demand:
+                    break
+
+                #print("Received: " + demand)
 
-            #print("Received: " + demand)
-    
-            path, mode = demand.split(",")
+                if (version := pdp_protocol.parse_hello(demand)) is not None:
+                    version = min(version, pdp_protocol.VERSION)
+                    writer.write(pdp_protocol.hello_answer(version))
+                    await self.serve_binary(reader, writer, peer, version)
+                    break
 
-            response = demand + "," + str(authorize(path, mode, conn))
+                try:
+                    demand = demand.decode()
+                    path, mode = demand.split(",")
+                except ValueError:
+                    continue
 
-            #print("Sending: " + response)
-            conn.send(response.encode())
+                decision = await self.decide(path, mode, peer)
+                response = demand + "," + str(False if decision is None else decision)
+
+                #print("Sending: " + response)
+                writer.write(response.encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            #print(f"ERROR - Connection reset by peer")
+            pass
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+
+    async def serve_binary(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, peer: tuple,
+                           version: int):
+        """
+        Handles the frames of a client speaking the binary protocol. If the
+        authorize function is a coroutine function, the requests are decided
+        concurrently and answered in the order the decisions are made.
+
+        :param reader: The stream of the requests of the client
+        :type reader: asyncio.StreamReader
+        :param writer: The stream of the responses to the client
+        :type writer: asyncio.StreamWriter
+        :param peer: The address of the client
+        :type peer: tuple
+        :param version: The version of the protocol spoken on the connection
+        :type version: int
+        """
+
+        task = asyncio.current_task()
+        decisions = set()
+        try:
+            while not self.stopping.is_set():
+                self.connections[task] = not decisions
+                header = await reader.readexactly(pdp_protocol.HEADER.size)
+                self.connections[task] = False
+                frame_version, kind, request_id, length = pdp_protocol.HEADER.unpack(header)
+                if frame_version != version or kind not in (pdp_protocol.REQUEST, pdp_protocol.BATCH_REQUEST) \
+                        or length > pdp_protocol.MAX_PAYLOAD:
+                    #print(f"ERROR - Unexpected frame (version {frame_version}, type {kind})")
+                    break
+                payload = await reader.readexactly(length)
+                if asyncio.iscoroutinefunction(self.authorize):
+                    decision = asyncio.create_task(self.answer(writer, kind, request_id, payload, peer, version))
+                    decisions.add(decision)
+                    decision.add_done_callback(decisions.discard)
+                else:
+                    await self.answer(writer, kind, request_id, payload, peer, version)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            if decisions:
+                await asyncio.wait(decisions)
+
+    async def answer(self, writer: asyncio.StreamWriter, kind: int, request_id: int, payload: bytes, peer: tuple,
+                     version: int):
+        """
+        Decides on a request or a batch of requests in the binary protocol and
+        sends the response. The requests of a batch are decided concurrently
+        if the authorize function is a coroutine function.
+        """
+
+        if kind == pdp_protocol.BATCH_REQUEST:
+            try:
+                requests = pdp_protocol.decode_batch_request(payload)
+            except ValueError:
+                requests = []
+            verdicts = await asyncio.gather(*(self.verdict(request, peer) for request in requests))
+            writer.write(pdp_protocol.encode_batch_response(request_id, verdicts, version))
+        else:
+            try:
+                request = pdp_protocol.decode_request(payload)
+            except ValueError:
+                request = None
+            writer.write(pdp_protocol.encode_response(request_id, await self.verdict(request, peer), version))
+        await writer.drain()
 
-        except ConnectionResetError as connection_error:
-            #print(f"ERROR - Connection reset by peer: {connection_error}")
-            break
+    async def verdict(self, request, peer: tuple) -> int:
+        """
+        Returns the verdict byte on a (path, mode) pair, :data:`pdp_protocol.ERROR` if it is None
+        """
+
+        if request is None or (decision := await self.decide(*request, peer)) is None:
+            return pdp_protocol.ERROR
+        return pdp_protocol.ALLOW if decision else pdp_protocol.DENY
+
+    async def decide(self, path: str, mode: str, peer: tuple):
+        """
+        Calls the authorize function, which may be a coroutine function. If it
+        raises an exception, the exception is logged and None is returned, so
+        the request is answered and the other requests of the connection are
+        not affected.
+        """
+
+        try:
+            decision = self.authorize(path, mode, peer)
+            return await decision if asyncio.iscoroutine(decision) else decision
         except Exception as e:
-            #print(f"ERROR - {e}")
+            logging.getLogger("infuser").error(f"ERROR - Could not authorize {mode} on {path} - {e}")
+            return None
+
+    def peer(self, writer: asyncio.StreamWriter) -> tuple:
+        """
+        Returns the address of a client, ("unix", pid, uid, gid) on a Unix domain socket
+        """
+
+        if self.socket_path is None:
+            return writer.get_extra_info("peername")
+        try:
+            credentials = writer.get_extra_info("socket").getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                                     struct.calcsize("3i"))
+            return ("unix",) + struct.unpack("3i", credentials)
+        except (AttributeError, OSError):
+            return ("unix", None, None, None)
+
+    async def listen(self) -> asyncio.AbstractServer:
+        """
+        Starts listening on the Unix domain socket or on host and port
+        """
+
+        if self.socket_path is None:
+            # Kept-alive connections are in TIME_WAIT after a restart of the server
+            return await asyncio.start_server(self.handle_client_connection, self.host, self.port,
+                                              reuse_address=True)
+        # The socket file of a previous server remains after it stopped, other files are not replaced
+        try:
+            if stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                os.unlink(self.socket_path)
+        except FileNotFoundError:
             pass
+        # Nobody may connect before the permissions are set
+        umask = os.umask(0o777)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client_connection, self.socket_path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, self.socket_mode)
+        return server
+
+    async def serve(self):
+        """
+        Listens for incoming connections until the server is stopped
+        """
+
+        self.stopping = asyncio.Event()
+        self.server = await self.listen()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+        async with self.server:
+            await self.stopping.wait()
+            # Stop accepting and let the connections finish the request they are handling
+            self.server.close()
+            if self.connections:
+                _, pending = await asyncio.wait(set(self.connections), timeout=SHUTDOWN_TIMEOUT)
+                for task in pending:
+                    task.cancel()
+        if self.socket_path is not None:
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def stop(self):
+        """
+        Shuts the server down gracefully
+        """
+
+        self.stopping.set()
+        # Connections waiting for the next request are closed right away
+        for task, waiting in self.connections.items():
+            if waiting:
+                task.cancel()
+
 
 def main():
     """
     Starts a server that listens for incoming connections on a specified host and port
     """
-    host = "127.0.0.1"
-    port = 2233
 
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    parser = argparse.ArgumentParser(description='Server, der Zugriffsentscheidungen fuer den infuser trifft.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Adresse, auf der der Server lauscht.')
+    parser.add_argument('--port', type=int, default=2233, help='Port, auf dem der Server lauscht.')
+    parser.add_argument('--socket', type=str, default=None, metavar='path',
+                        help='Pfad eines Unix Domain Sockets, auf dem der Server statt auf Adresse und Port lauscht. '
+                             'Die Dateirechte des Sockets regeln, wer Anfragen stellen darf.')
+    parser.add_argument('--socket-mode', type=lambda mode: int(mode, 8), default=0o660, metavar='mode',
+                        help='Oktale Dateirechte des Unix Domain Sockets.')
+    parser.add_argument('--max-connections', type=int, default=1024, metavar='connections',
+                        help='Maximale Anzahl gleichzeitig offener Verbindungen. Weitere Clients werden getrennt.')
+    args = parser.parse_args()
 
     try:
-        server_socket.bind((host, port))
-        server_socket.listen()
-
-        while True:
-            try:
-                conn, address = server_socket.accept()
-                #print("Connection from: ", str(address))
-                handle_client_connection(conn)
-
-            except OSError as socket_error:
-                #print("Socket error while accepting connection:", socket_error)
-                continue
-
+        asyncio.run(PDPServer(args.host, args.port, args.max_connections, socket_path=args.socket,
+                              socket_mode=args.socket_mode).serve())
     except OSError as socket_error:
         print("Socket error while binding server socket:", socket_error)
-        server_socket.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,674 @@
+"""
+Storage of the internal state of the :doc:`infuser`. An access is kept as a
+compact :class:`StateEntry`; the JSON format of the state file with its
+formatted timestamps is only produced when an entry is exported, e.g. by the
+:class:`StateWriter` appending the entries to the state file.
+
+The state file is an append-only log of JSON lines. A binary, columnar snapshot
+next to it (<state_file>.snapshot) covers the log up to an offset, so a mount
+only replays the short tail after it. The writer compacts the tail into a new
+snapshot periodically. Existing state files are converted with::
+
+    python3 state_store.py <state_file> ...
+
+Libraries/Modules:
+
+- argparse standard library
+  - Access to argument parsing functionality
+- array standard library
+  - Access to the compact columns of a snapshot
+- json standard library
+  - Access to json functions
+- logging standard library
+  - Access to logging functionality
+- mmap standard library
+  - Access to memory-mapped snapshots
+- os standard library
+  - Access to fsync and atomic replacement of files
+- queue standard library
+  - Access to a bounded, thread-safe queue
+- struct standard library
+  - Access to the binary header of a snapshot
+- sys standard library
+  - Access to string interning
+- threading standard library
+  - Access to the writer and compactor threads and locks
+- time standard library
+  - Access to the epoch time and its formatting
+- zlib standard library
+  - Access to crc32
+
+"""
+
+import argparse
+import array
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# Format of the timestamps in the state file
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Names of the access modes by their code and codes by their name
+access_names = []
+access_codes = {}
+access_lock = threading.Lock()
+
+
+def access_code(access: str) -> int:
+    """
+    Return the small integer code of an access mode, registering unknown modes
+
+    :param access: The name of the access mode, e.g. "read"
+    :type access: str
+    :return: The code of the access mode
+    :rtype: int
+    """
+
+    try:
+        return access_codes[access]
+    except KeyError:
+        with access_lock:
+            if access not in access_codes:
+                access_codes[access] = len(access_names)
+                access_names.append(access)
+            return access_codes[access]
+
+
+def format_time(epoch: int, fmt=TIME_FORMAT) -> str:
+    """
+    Return an epoch timestamp in the system's time zone
+
+    :param epoch: The seconds since the epoch
+    :type epoch: int
+    :param fmt: The format of the timestamp
+    :type fmt: str
+    :return: The formatted timestamp
+    :rtype: str
+    """
+
+    return time.strftime(fmt, time.localtime(epoch))
+
+
+def parse_time(timestamp: str, fmt=TIME_FORMAT) -> int:
+    """
+    Return the epoch of a timestamp in the system's time zone
+
+    :param timestamp: The formatted timestamp
+    :type timestamp: str
+    :param fmt: The format of the timestamp
+    :type fmt: str
+    :return: The seconds since the epoch
+    :rtype: int
+    """
+
+    return int(time.mktime(time.strptime(timestamp, fmt)))
+
+
+class StateEntry:
+    """
+    A recorded access of the internal state
+
+    Paths and prefixes are interned, as the same objects are accessed over and
+    over, the access mode is stored as a small integer code and the time as
+    seconds since the epoch.
+
+    :param path: The path of the accessed object
+    :type path: str
+    :param prefix: The longest prefix of the accessed object
+    :type prefix: str
+    :param access: The code of the access mode
+    :type access: int
+    :param time: The seconds since the epoch
+    :type time: int
+    :param success: Whether the access was successful or not
+    :type success: bool
+    """
+
+    __slots__ = ("path", "prefix", "access", "time", "success")
+
+    def __init__(self, path: str, prefix: str, access: int, time: int, success: bool):
+        self.path = sys.intern(path)
+        self.prefix = sys.intern(prefix)
+        self.access = access
+        self.time = time
+        self.success = success
+
+    @property
+    def access_name(self) -> str:
+        """
+        The name of the access mode
+        """
+
+        return access_names[self.access]
+
+    @classmethod
+    def from_dict(cls, data: dict, times=None):
+        """
+        Create an entry from the JSON format of the state file
+
+        :param data: The entry in the format {Path, Prefix, Access, Time, Success}
+        :type data: dict
+        :param times: A dictionary to memoize parsed timestamps, as many entries share one
+        :type times: dict
+        :return: The entry
+        :rtype: StateEntry
+        """
+
+        timestamp = data["Time"]
+        if times is None:
+            epoch = parse_time(timestamp)
+        elif (epoch := times.get(timestamp)) is None:
+            epoch = times[timestamp] = parse_time(timestamp)
+        return cls(data["Path"], data["Prefix"], access_code(data["Access"]), epoch, bool(data["Success"]))
+
+    def to_dict(self) -> dict:
+        """
+        Export the entry in the JSON format of the state file
+
+        :return: The entry in the format {Path, Prefix, Access, Time, Success}
+        :rtype: dict
+        """
+
+        return {"Path": self.path, "Prefix": self.prefix, "Access": self.access_name,
+                "Time": format_time(self.time), "Success": self.success}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+# Header of a snapshot: magic, version, crc32 of the covered end of the log,
+# number of entries, covered size of the log, size of the string table and of the access names
+SNAPSHOT_MAGIC = b"IFSSTATE"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIIQQQQ")
+# Number of bytes at the end of the covered log checked against the crc32
+SNAPSHOT_CHECK_SIZE = 4096
+
+
+class SnapshotError(Exception):
+    """
+    Raised if a snapshot is not valid or does not belong to its state file
+    """
+
+
+def snapshot_path(state_file: str) -> str:
+    """
+    Return the path of the snapshot of a state file
+
+    :param state_file: The path of the state file
+    :type state_file: str
+    :return: The path of the snapshot
+    :rtype: str
+    """
+
+    return state_file + ".snapshot"
+
+
+def log_checksum(state_file: str, offset: int) -> int:
+    """
+    Return the crc32 of the last bytes of a state file before an offset, to
+    recognize whether a snapshot still belongs to the state file
+
+    :param state_file: The path of the state file
+    :type state_file: str
+    :param offset: The size of the state file covered by the snapshot
+    :type offset: int
+    :return: The crc32
+    :rtype: int
+    """
+
+    with open(state_file, "rb") as file:
+        file.seek(max(0, offset - SNAPSHOT_CHECK_SIZE))
+        return zlib.crc32(file.read(min(offset, SNAPSHOT_CHECK_SIZE)))
+
+
+def read_snapshot(state_file: str):
+    """
+    Load the entries of the snapshot of a state file. The snapshot is memory-mapped
+    and its columns are converted to entries directly, without parsing any JSON or
+    timestamp.
+
+    :param state_file: The path of the state file
+    :type state_file: str
+    :return: The entries and the size of the state file covered by the snapshot
+    :rtype: tuple
+    """
+
+    with open(snapshot_path(state_file), "rb") as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as snapshot:
+        columns = read_columns(snapshot)
+    strings, names, paths, prefixes, times, accesses, successes, offset, checksum = columns
+    if offset > os.path.getsize(state_file) or log_checksum(state_file, offset) != checksum:
+        raise SnapshotError(f"Snapshot does not belong to {state_file}")
+
+    strings = [sys.intern(string) for string in strings]
+    codes = [access_code(name) for name in names]
+    entries = []
+    last_epoch = None
+    for path, prefix, epoch, access, success in zip(paths, prefixes, times, accesses, successes):
+        # Entries of the same second share one int object
+        if epoch != last_epoch:
+            last_epoch = epoch
+        entries.append(StateEntry(strings[path], strings[prefix], codes[access], last_epoch, success == 1))
+    return entries, offset
+
+
+def read_columns(snapshot) -> tuple:
+    """
+    Read the string tables and the columns of a snapshot
+
+    :param snapshot: The content of the snapshot, e.g. memory-mapped
+    :return: The strings, the access names, the columns of path and prefix ids,
+             times, access codes and success, the covered size and the crc32 of the log
+    :rtype: tuple
+    """
+
+    if len(snapshot) < SNAPSHOT_HEADER.size:
+        raise SnapshotError("Snapshot is too short")
+    magic, version, checksum, count, offset, strings_size, names_size = SNAPSHOT_HEADER.unpack_from(snapshot)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Snapshot has an unknown format {magic}, version {version}")
+    position = SNAPSHOT_HEADER.size
+    if len(snapshot) != position + strings_size + names_size + count * 18:
+        raise SnapshotError("Snapshot is truncated")
+
+    def blob(size):
+        nonlocal position
+        position += size
+        return snapshot[position - size:position]
+
+    strings = blob(strings_size).decode("utf-8", "surrogateescape").split("\0") if strings_size else []
+    names = blob(names_size).decode("utf-8").split("\0") if names_size else []
+    columns = []
+    for typecode in "IIqBB":
+        column = array.array(typecode)
+        column.frombytes(blob(count * column.itemsize))
+        columns.append(column)
+    return (strings, names, *columns, offset, checksum)
+
+
+def write_snapshot(state_file: str, entries: list, offset: int) -> None:
+    """
+    Compact the snapshot of a state file: write a new snapshot containing the
+    entries of the current snapshot and the given entries, which have to be the
+    entries of the state file between the current snapshot and the offset. If the
+    current snapshot does not belong to the state file, the new snapshot is built
+    from the state file up to the offset instead. The new snapshot replaces the
+    current one atomically.
+
+    :param state_file: The path of the state file
+    :type state_file: str
+    :param entries: The entries appended to the state file since the current snapshot
+    :type entries: list
+    :param offset: The size of the state file covered by the new snapshot
+    :type offset: int
+    """
+
+    try:
+        with open(snapshot_path(state_file), "rb") as file:
+            strings, names, *columns, covered, checksum = read_columns(file.read())
+        if covered > offset or log_checksum(state_file, covered) != checksum:
+            raise SnapshotError(f"Snapshot does not belong to {state_file}")
+    except FileNotFoundError:
+        strings, names, columns = [], [], [array.array(typecode) for typecode in "IIqBB"]
+    except (SnapshotError, ValueError) as e:
+        # The given entries only follow the current snapshot, rebuild it from the whole log
+        logging.getLogger("infuser").warning(f"Rebuilding snapshot of {state_file} from the state file - {e}")
+        strings, names, columns = [], [], [array.array(typecode) for typecode in "IIqBB"]
+        entries = read_log(state_file, 0, offset)
+
+    string_ids = {string: position for position, string in enumerate(strings)}
+    name_ids = {name: position for position, name in enumerate(names)}
+    paths, prefixes, times, accesses, successes = columns
+    for entry in entries:
+        for string, column in ((entry.path, paths), (entry.prefix, prefixes)):
+            if (string_id := string_ids.get(string)) is None:
+                string_id = string_ids[string] = len(strings)
+                strings.append(string)
+            column.append(string_id)
+        if (name_id := name_ids.get(entry.access_name)) is None:
+            name_id = name_ids[entry.access_name] = len(names)
+            names.append(entry.access_name)
+        times.append(entry.time)
+        accesses.append(name_id)
+        successes.append(1 if entry.success else 0)
+
+    strings_blob = "\0".join(strings).encode("utf-8", "surrogateescape")
+    names_blob = "\0".join(names).encode("utf-8")
+    temporary_file = snapshot_path(state_file) + ".tmp"
+    with open(temporary_file, "wb") as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, log_checksum(state_file, offset),
+                                        len(paths), offset, len(strings_blob), len(names_blob)))
+        file.write(strings_blob)
+        file.write(names_blob)
+        for column in columns:
+            column.tofile(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_file, snapshot_path(state_file))
+
+
+def load_state(state_file: str) -> tuple:
+    """
+    Load the entries of a state file: the entries of its snapshot and the entries
+    of the JSON lines appended after the snapshot (the tail). Without a valid
+    snapshot, the whole state file is replayed.
+
+    :param state_file: The path of the state file
+    :type state_file: str
+    :return: The entries in the order of the state file and the number of entries of the tail
+    :rtype: tuple
+    """
+
+    log = logging.getLogger("infuser")
+
+    entries, offset = [], 0
+    try:
+        entries, offset = read_snapshot(state_file)
+    except FileNotFoundError:
+        pass
+    except (SnapshotError, OSError, ValueError, IndexError) as e:
+        log.warning(f"Could not load snapshot of {state_file}, replaying the whole state file - {e}")
+        # The replayed entries become the pending entries of the next snapshot,
+        # they must not be appended to the invalid one
+        try:
+            os.remove(snapshot_path(state_file))
+        except OSError as e:
+            log.warning(f"Could not remove snapshot of {state_file} - {e}")
+
+    tail = read_log(state_file, offset)
+    entries.extend(tail)
+    return entries, len(tail)
+
+
+def read_log(state_file: str, start: int, end=None) -> list:
+    """
+    Parse the JSON lines of a state file between two offsets
+
+    :param state_file: The path of the state file
+    :type state_file: str
+    :param start: The offset of the first line
+    :type start: int
+    :param end: The offset after the last line, None for the end of the file
+    :type end: int
+    :return: The entries
+    :rtype: list
+    """
+
+    entries = []
+    times = {}
+    with open(state_file, "rb") as file:
+        file.seek(start)
+        for line in file:
+            start += len(line)
+            if end is not None and start > end:
+                break
+            if line.strip():
+                entries.append(StateEntry.from_dict(json.loads(line), times))
+    return entries
+
+
+def convert(state_file: str) -> int:
+    """
+    Create or compact the snapshot of an existing state file, so it is loaded
+    without replaying it at the next mount
+
+    :param state_file: The path of the state file
+    :type state_file: str
+    :return: The number of entries
+    :rtype: int
+    """
+
+    entries, tail = load_state(state_file)
+    write_snapshot(state_file, entries[len(entries) - tail:], os.path.getsize(state_file))
+    return len(entries)
+
+
+class StateWriter:
+    """
+    Background writer appending the entries of the internal state to the state file
+
+    The FUSE threads only put an entry into a bounded queue. A writer thread
+    takes all queued entries at once, formats them as JSON lines and appends
+    them with a single write (group commit). When the data is synced to the
+    disk depends on the durability:
+
+    - "none": never fsync, the operating system writes the data back
+    - "interval": fsync at most every fsync_interval milliseconds, if something was written
+    - "batch": fsync after every group commit
+
+    If the queue is full, the overflow decides on the back-pressure: "block"
+    makes the FUSE thread wait until the writer has caught up, "drop" discards
+    the entry from the file (it is still part of the internal state in memory)
+    and counts it.
+
+    After snapshot_every written entries and when it is closed, the writer
+    compacts the entries written since the last snapshot into a new snapshot.
+    The compaction runs in its own thread, so the queue is drained meanwhile;
+    entries written during a compaction are part of the next one.
+
+    The thread is started by :meth:`start`, not by the constructor, so a file
+    system can start it after libfuse may have forked into the background.
+
+    :param state_file: The file to append to
+    :type state_file: str
+    :param durability: "none", "interval" or "batch"
+    :type durability: str
+    :param fsync_interval: The milliseconds between two fsyncs with durability "interval"
+    :type fsync_interval: int
+    :param queue_size: The maximum number of entries waiting to be written
+    :type queue_size: int
+    :param overflow: "block" or "drop"
+    :type overflow: str
+    :param batch_size: The maximum number of entries of a group commit
+    :type batch_size: int
+    :param snapshot_every: The number of entries after which a snapshot is written. 0 disables snapshots
+    :type snapshot_every: int
+    :param pending: The entries of the state file that are not part of its snapshot yet
+    :type pending: list
+    """
+
+    durabilities = ["none", "interval", "batch"]
+    overflows = ["block", "drop"]
+
+    def __init__(self, state_file: str, durability="none", fsync_interval=1000, queue_size=65536,
+                 overflow="block", batch_size=4096, snapshot_every=100000, pending=None):
+        if durability not in self.durabilities:
+            raise ValueError(f"Durability {durability} is not permitted. Permitted are: {self.durabilities}")
+        if overflow not in self.overflows:
+            raise ValueError(f"Overflow {overflow} is not permitted. Permitted are: {self.overflows}")
+        self.log = logging.getLogger("infuser")
+        self.state_file = state_file
+        self.durability = durability
+        self.fsync_interval = fsync_interval / 1000
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+        self.pending = list(pending or ())
+        self.pending_lock = threading.Lock()
+        self.compactor = None
+        self.written = 0
+        self.dropped = 0
+        self.commits = 0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.file = open(state_file, "a")
+        self.thread = threading.Thread(target=self.run, name="state-writer", daemon=True)
+
+    def start(self) -> None:
+        """
+        Start the writer thread
+        """
+
+        self.thread.start()
+
+    def write(self, entry: StateEntry) -> bool:
+        """
+        Queue an entry to be appended to the state file
+
+        :param entry: The entry of the internal state
+        :type entry: StateEntry
+        :return: Whether the entry has been queued
+        :rtype: bool
+        """
+
+        if self.overflow == "block":
+            self.queue.put(entry)
+            return True
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                self.log.warning(f"State writer queue is full, {self.dropped} entries were not written to "
+                                 f"{self.state_file}")
+            return False
+
+    def close(self) -> None:
+        """
+        Write all queued entries, sync them to the disk and close the file
+        """
+
+        if self.thread.ident is None:
+            # Never started, e.g. the file system has not been mounted
+            self.start()
+        self.queue.put(None)
+        self.thread.join()
+        self.log.info(f"State writer statistics: {self.stats()}")
+
+    def stats(self) -> dict:
+        """
+        Return the counters of the writer
+
+        :return: The written and dropped entries and the number of group commits
+        :rtype: dict
+        """
+
+        return {"written": self.written, "dropped": self.dropped, "commits": self.commits,
+                "queued": self.queue.qsize(), "pending": len(self.pending)}
+
+    def compact(self, entries: list, offset: int) -> None:
+        """
+        Write a snapshot covering the state file up to an offset. If it fails,
+        the entries are kept for the next compaction.
+
+        :param entries: The entries written since the last snapshot, up to the offset
+        :type entries: list
+        :param offset: The size of the state file covered by the new snapshot
+        :type offset: int
+        """
+
+        start = time.perf_counter()
+        try:
+            write_snapshot(self.state_file, entries, offset)
+        except (OSError, SnapshotError, ValueError) as e:
+            self.log.error(f"ERROR - Could not write snapshot of {self.state_file} - {e}")
+            with self.pending_lock:
+                self.pending[:0] = entries
+            return
+        self.log.info(f"Compacted {len(entries)} entries into the snapshot of {self.state_file} in "
+                      f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def start_compaction(self) -> None:
+        """
+        Hand the pending entries to a compactor thread, unless one is still running
+        """
+
+        if self.compactor is not None and self.compactor.is_alive():
+            return
+        with self.pending_lock:
+            entries, self.pending = self.pending, []
+        self.compactor = threading.Thread(target=self.compact, args=(entries, self.file.tell()),
+                                          name="state-compactor", daemon=True)
+        self.compactor.start()
+
+    def run(self) -> None:
+        """
+        Append the queued entries to the state file until the writer is closed
+        """
+
+        last_sync = time.monotonic()
+        unsynced = False
+        # Entries of the same second share the formatted timestamp
+        last_epoch, last_timestamp = None, None
+        closed = False
+        while not closed:
+            try:
+                timeout = None
+                if unsynced:
+                    timeout = max(0.0, last_sync + self.fsync_interval - time.monotonic())
+                batch = [self.queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                closed = True
+                batch = [entry for entry in batch if entry is not None]
+
+            if batch:
+                lines = []
+                for entry in batch:
+                    if entry.time != last_epoch:
+                        last_epoch, last_timestamp = entry.time, format_time(entry.time)
+                    lines.append(json.dumps({"Path": entry.path, "Prefix": entry.prefix, "Access": entry.access_name,
+                                             "Time": last_timestamp, "Success": entry.success}))
+                try:
+                    self.file.write("\n".join(lines) + "\n")
+                    self.file.flush()
+                    self.written += len(batch)
+                    self.commits += 1
+                    unsynced = True
+                    if self.snapshot_every:
+                        with self.pending_lock:
+                            self.pending.extend(batch)
+                except OSError as e:
+                    self.log.error(f"ERROR - Could not write {len(batch)} entries to {self.state_file} - {e}")
+
+            if unsynced and (closed or self.durability == "batch" or (
+                    self.durability == "interval" and time.monotonic() - last_sync >= self.fsync_interval)):
+                try:
+                    os.fsync(self.file.fileno())
+                except OSError as e:
+                    self.log.error(f"ERROR - Could not sync {self.state_file} - {e}")
+                last_sync = time.monotonic()
+                unsynced = False
+            elif unsynced and self.durability == "none":
+                unsynced = False
+
+            if self.snapshot_every and not closed and len(self.pending) >= self.snapshot_every:
+                self.start_compaction()
+
+        if self.compactor is not None:
+            self.compactor.join()
+        if self.snapshot_every and self.pending:
+            entries, self.pending = self.pending, []
+            self.compact(entries, self.file.tell())
+        self.file.close()
+
+
+if __name__ == "__main__":
+    """
+    Converts existing state files, e.g. Rest/script_logs/ewww-demo.json, by
+    creating their snapshots
+    """
+
+    parser = argparse.ArgumentParser(description='Erstellt Snapshots fuer bestehende Zustandsdateien, damit diese beim '
+                                                 'Mounten nicht vollstaendig eingelesen werden muessen.')
+    parser.add_argument('state_files', nargs='+', metavar='state_file',
+                        help='Pfad zu einer Zustandsdatei im .json-Format.')
+    for state_file in parser.parse_args().state_files:
+        start = time.perf_counter()
+        count = convert(state_file)
+        print(f"{state_file}: {count} entries in {snapshot_path(state_file)} "
+              f"({(time.perf_counter() - start):.2f} s)")
@@ -0,0 +1,72 @@
+"""
+Tests of the caches in :doc:`caches`, in particular that values computed
+before a flush or an invalidation are not stored afterwards.
+"""
+
+from caches import LRUCache
+from caches import TTLCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(2)
+    cache.put("a", 1, cache.generation)
+    cache.put("b", 2, cache.generation)
+    assert cache.get("a") == 1
+    cache.put("c", 3, cache.generation)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_flush_discards_values_of_the_previous_generation():
+    cache = LRUCache(4)
+    cache.put("a", 1, cache.generation)
+    generation = cache.generation
+    cache.flush()
+    assert cache.get("a") is None
+    # A decision that was in flight during the flush
+    cache.put("b", 2, generation)
+    assert cache.get("b") is None
+    cache.put("b", 2, cache.generation)
+    assert cache.get("b") == 2
+
+
+def test_invalidate_removes_keys_and_starts_a_new_generation():
+    cache = LRUCache(4)
+    cache.put("a", 1, cache.generation)
+    cache.put("b", 2, cache.generation)
+    generation = cache.generation
+    cache.invalidate(["a"])
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    cache.put("a", 1, generation)
+    assert cache.get("a") is None
+
+
+def test_size_zero_disables_the_cache():
+    cache = LRUCache(0)
+    cache.put("a", 1, cache.generation)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_ttl_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("caches.time.monotonic", lambda: now[0])
+    cache = TTLCache(4)
+    cache.put("a", True, cache.generation, 1.0)
+    cache.put("b", False, cache.generation, 0.0)
+    assert cache.get("a") is True
+    assert cache.get("b") is None
+    now[0] = 101.5
+    assert cache.get("a") is None
+
+
+def test_put_many_keeps_the_last_entries_and_respects_the_generation():
+    cache = TTLCache(2)
+    cache.put_many([("a", 1), ("b", 2), ("c", 3)], cache.generation, 1.0)
+    assert [cache.get(key) for key in "abc"] == [None, 2, 3]
+    generation = cache.generation
+    cache.flush()
+    cache.put_many([("d", 4)], generation, 1.0)
+    assert cache.get("d") is None
@@ -0,0 +1,62 @@
+"""
+Tests of the wire protocol in :doc:`pdp_protocol`: every frame decodes to
+what was encoded.
+"""
+
+import pytest
+
+import pdp_protocol
+
+
+def split(frame: bytes) -> tuple:
+    version, kind, request_id, length = pdp_protocol.HEADER.unpack_from(frame)
+    payload = frame[pdp_protocol.HEADER.size:]
+    assert len(payload) == length
+    return version, kind, request_id, payload
+
+
+def test_hello_round_trip():
+    assert pdp_protocol.parse_hello(pdp_protocol.hello(3)) == 3
+    assert pdp_protocol.parse_hello(b"/foo,read") is None
+    assert pdp_protocol.parse_hello(pdp_protocol.MAGIC + b",x") is None
+    # A legacy server answers the hello like a request
+    assert not pdp_protocol.hello_answer(1).endswith(b",False")
+
+
+@pytest.mark.parametrize("path", ["/foo/a", "/", "/with,comma", "/with\nnewline\tand tab", "/ümlaut/ß"])
+def test_request_round_trip(path):
+    version, kind, request_id, payload = split(pdp_protocol.encode_request(7, path, "read"))
+    assert (version, kind, request_id) == (pdp_protocol.VERSION, pdp_protocol.REQUEST, 7)
+    assert pdp_protocol.decode_request(payload) == (path, "read")
+
+
+def test_request_without_path_is_invalid():
+    with pytest.raises(ValueError):
+        pdp_protocol.decode_request(b"read")
+
+
+def test_response_carries_request_id_and_verdict():
+    version, kind, request_id, payload = split(pdp_protocol.encode_response(2 ** 32 - 1, pdp_protocol.ALLOW))
+    assert (kind, request_id, payload) == (pdp_protocol.RESPONSE, 2 ** 32 - 1, bytes((pdp_protocol.ALLOW,)))
+
+
+def test_batch_round_trip():
+    requests = [("/foo/a", "open"), ("/foo/a", "read"), ("/bar,baz", "rename"), ("/", "readdir")]
+    _, kind, request_id, payload = split(pdp_protocol.encode_batch_request(9, requests))
+    assert (kind, request_id) == (pdp_protocol.BATCH_REQUEST, 9)
+    assert pdp_protocol.decode_batch_request(payload) == requests
+
+    verdicts = [pdp_protocol.ALLOW, pdp_protocol.DENY, pdp_protocol.ERROR, pdp_protocol.ALLOW]
+    _, kind, request_id, payload = split(pdp_protocol.encode_batch_response(9, verdicts))
+    assert (kind, request_id, list(payload)) == (pdp_protocol.BATCH_RESPONSE, 9, verdicts)
+
+
+def test_truncated_batch_is_invalid():
+    _, _, _, payload = split(pdp_protocol.encode_batch_request(1, [("/foo/a", "read"), ("/foo/b", "read")]))
+    with pytest.raises(ValueError):
+        pdp_protocol.decode_batch_request(payload[:-12])
+
+
+def test_invalid_request_of_a_batch_is_none():
+    payload = pdp_protocol.BATCH_COUNT.pack(1) + pdp_protocol.BATCH_LENGTH.pack(4) + b"read"
+    assert pdp_protocol.decode_batch_request(payload) == [None]
@@ -0,0 +1,83 @@
+"""
+Tests of the compiled policy sections of the :doc:`infuser_setup`: the
+matcher indexed by :class:`infuser_setup.PathTrie` has to return the same
+entry as testing every regular expression in the order of the section.
+"""
+
+import random
+import re
+
+import pytest
+
+from infuser_setup import PathTrie
+from infuser_setup import PolicySection
+from infuser_setup import literal_prefix
+
+ENTRIES = ["/", "/.*", "/home", "/home/user/.*", "/home/user/file.sh", "/home/user/file", r"/home/user/file\.txt",
+           "/home/user/dir[0-9]+/.*", "/home/us?er/x", "/tmp/(a|b)/.*", "/tmp/a|/var/.*", "/var/log/.*\\.log$",
+           "/home/user/sub/", "/srv", "/srv/data", "/opt/.+/bin", "^/etc/.*", "/home/user/(", "/foo.bar"]
+PATHS = ["/", "/home", "/home/user", "/home/user/file", "/home/user/file.sh", "/home/user/file.txt",
+         "/home/user/fileXtxt", "/home/user/dir1/a", "/home/user/dirx/a", "/home/uer/x", "/hom/user/x",
+         "/tmp/a/1", "/tmp/b/2", "/tmp/c/3", "/tmp/a", "/var/log/syslog.log", "/var/log/syslog", "/var/x",
+         "/home/user/sub/file", "/srv", "/srv/data/x", "/srvdata", "/opt/x/bin", "/opt//bin", "/etc/passwd",
+         "/foo.bar", "/fooXbar", "/other"]
+
+
+def legacy_match(section: dict, path: str):
+    # The matching done by IFS.check_policy before the sections were compiled
+    for key in section.keys():
+        try:
+            regex = re.compile(key)
+        except re.error:
+            continue
+        if regex.match(path):
+            return key
+    return None
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_match_equals_linear_match(path):
+    section = PolicySection({entry: index % 2 == 0 for index, entry in enumerate(ENTRIES)})
+    assert section.match(path) == legacy_match(section, path)
+
+
+def test_match_equals_linear_match_for_random_sections():
+    rng = random.Random(4)
+    for _ in range(200):
+        section = PolicySection({entry: True for entry in rng.sample(ENTRIES, rng.randrange(1, len(ENTRIES)))})
+        for path in PATHS:
+            assert section.match(path) == legacy_match(section, path), (list(section), path)
+
+
+def test_invalid_regular_expressions_are_skipped():
+    section = PolicySection({"/home/user/(": True, "/home/.*": False})
+    assert [key for key, _, _ in section.rules] == ["/home/.*"]
+    assert section.match("/home/user/(") == "/home/.*"
+
+
+def test_empty_section_matches_nothing():
+    section = PolicySection()
+    assert not section
+    assert section.match("/home") is None
+
+
+@pytest.mark.parametrize("regex, literal", [
+    ("/home/user/file", "/home/user/file"),
+    (r"/home/user/file\.txt", "/home/user/file.txt"),
+    ("/home/user/.*", "/home/user/"),
+    ("/home/us?er", "/home/u"),
+    ("/home/user/dir[0-9]", "/home/user/dir"),
+    ("/tmp/a|/var", ""),
+    (r"/a\d", "/a"),
+    ("^/etc", ""),
+])
+def test_literal_prefix(regex, literal):
+    assert literal_prefix(regex) == literal
+
+
+def test_trie_returns_the_items_of_all_prefixes_of_a_path():
+    trie = PathTrie()
+    for item, literal in enumerate(["", "/", "/ho", "/home/", "/home/user", "/home/users", "/tmp/"]):
+        trie.insert(literal, item)
+    assert sorted(trie.candidates("/home/user/file")) == [0, 1, 2, 3, 4]
+    assert sorted(trie.candidates("/tmp")) == [0, 1]
@@ -0,0 +1,136 @@
+"""
+Tests of the writer of the state file in :doc:`state_store`: back-pressure
+of a full queue, group commits and the snapshot written when it is closed.
+"""
+
+import json
+import os
+import threading
+
+import pytest
+
+from state_store import StateEntry
+from state_store import StateWriter
+from state_store import access_code
+from state_store import load_state
+from state_store import snapshot_path
+from state_store import write_snapshot
+
+
+def entry(index: int) -> StateEntry:
+    return StateEntry(f"/foo/file{index}", "/foo", access_code("read"), 1700000000 + index, index % 2 == 0)
+
+
+def read_lines(state_file) -> list:
+    with open(state_file) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_writes_all_entries_and_a_snapshot_when_closed(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    writer = StateWriter(state_file, snapshot_every=100)
+    writer.start()
+    for index in range(250):
+        writer.write(entry(index))
+    writer.close()
+    lines = read_lines(state_file)
+    assert [line["Path"] for line in lines] == [f"/foo/file{index}" for index in range(250)]
+    assert writer.stats()["written"] == 250
+    entries, tail = load_state(state_file)
+    assert [item.path for item in entries] == [f"/foo/file{index}" for index in range(250)]
+    assert tail == 0
+    assert os.path.exists(snapshot_path(state_file))
+
+
+def test_drop_discards_entries_of_a_full_queue(tmp_path):
+    writer = StateWriter(str(tmp_path / "state.json"), queue_size=10, overflow="drop", snapshot_every=0)
+    # The thread has not been started, so nothing is taken from the queue
+    queued = [writer.write(entry(index)) for index in range(15)]
+    assert queued == [True] * 10 + [False] * 5
+    assert writer.stats()["dropped"] == 5
+    writer.close()
+    assert len(read_lines(str(tmp_path / "state.json"))) == 10
+
+
+def test_block_waits_until_the_writer_has_caught_up(tmp_path):
+    writer = StateWriter(str(tmp_path / "state.json"), queue_size=10, overflow="block", snapshot_every=0)
+    for index in range(10):
+        writer.write(entry(index))
+    blocked = threading.Thread(target=writer.write, args=(entry(10),))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+    writer.start()
+    blocked.join(5)
+    assert not blocked.is_alive()
+    writer.close()
+    assert len(read_lines(str(tmp_path / "state.json"))) == 11
+    assert writer.stats()["dropped"] == 0
+
+
+def test_invalid_options_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        StateWriter(str(tmp_path / "state.json"), durability="always")
+    with pytest.raises(ValueError):
+        StateWriter(str(tmp_path / "state.json"), overflow="wait")
+
+
+def write_log(state_file, indexes) -> None:
+    with open(state_file, "w") as file:
+        for index in indexes:
+            file.write(json.dumps(entry(index).to_dict()) + "\n")
+
+
+def test_compaction_after_falling_back_does_not_keep_the_invalid_snapshot(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    write_log(state_file, range(10))
+    write_snapshot(state_file, load_state(state_file)[0], os.path.getsize(state_file))
+    # The log is replaced, so the snapshot does not belong to it anymore
+    write_log(state_file, range(100, 110))
+    entries, tail = load_state(state_file)
+    assert tail == 10
+    writer = StateWriter(state_file, snapshot_every=100, pending=entries[len(entries) - tail:])
+    writer.start()
+    writer.write(entry(110))
+    writer.close()
+    entries, tail = load_state(state_file)
+    assert [item.path for item in entries] == [f"/foo/file{index}" for index in range(100, 111)]
+    assert tail == 0
+
+
+def test_snapshot_not_belonging_to_the_log_is_rebuilt(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    write_log(state_file, range(10))
+    write_snapshot(state_file, load_state(state_file)[0], os.path.getsize(state_file))
+    write_log(state_file, range(100, 110))
+    write_snapshot(state_file, [entry(109)], os.path.getsize(state_file))
+    entries, tail = load_state(state_file)
+    assert [item.path for item in entries] == [f"/foo/file{index}" for index in range(100, 110)]
+    assert tail == 0
+
+
+def test_queue_is_drained_during_a_compaction(tmp_path, monkeypatch):
+    state_file = str(tmp_path / "state.json")
+    release = threading.Event()
+    compactions = []
+
+    def slow_snapshot(state_file, entries, offset):
+        compactions.append(len(entries))
+        release.wait(5)
+        write_snapshot(state_file, entries, offset)
+
+    monkeypatch.setattr("state_store.write_snapshot", slow_snapshot)
+    writer = StateWriter(state_file, queue_size=10, overflow="block", batch_size=5, snapshot_every=10)
+    writer.start()
+    done = threading.Thread(target=lambda: [writer.write(entry(index)) for index in range(100)])
+    done.start()
+    # All entries pass the queue of 10 entries while the first compaction still runs
+    done.join(5)
+    assert not done.is_alive()
+    assert len(compactions) == 1
+    release.set()
+    writer.close()
+    assert sum(compactions) == 100
+    entries, tail = load_state(state_file)
+    assert [item.path for item in entries] == [f"/foo/file{index}" for index in range(100)]
+    assert tail == 0
@@ -3,55 +3,289 @@ This module contains functions to start a server that listens for incoming
 connections on a specified host and port, and handles communication with clients.
 The server is then used to make access control decisions.
 
+The decisions are made by a script, which runs in a pool of long-lived
+workers instead of starting bash for every request. A worker gets the
+requests on stdin as three fields, each terminated by a NUL byte: a request
+ID, the path and the mode (read them with read -r -d ''). Paths may contain
+tabs and newlines, requests containing a NUL byte are denied. Every request
+is answered with a line "ID STATUS":
+
+- exit: The worker runs the script for every request in a subshell with
+  the path and the mode as arguments (and in PDP_PATH and PDP_MODE). The
+  exit status 0 allows the access, like a script run on its own.
+- stream: The script itself reads the requests and answers each of them
+  with a line of its ID and "0" (allow) or any other status (deny). It only
+  starts once.
+
+An answer with another ID than the one of the request means that the worker
+is out of step with its requests. The access is denied and the worker is
+restarted. The answers are read from the pipe of the worker without blocking,
+so a worker that writes part of a line and hangs is restarted after the
+timeout as well.
+
+Verdicts can be kept for a time to live, so repeated requests do not reach
+the script at all.
+
 Created by Stephan Winker on 02/09/2023
 
 Libraries/Modules:
 
+- argparse standard library
+  - Access to argument parsing functionality
+- logging standard library
+  - Access to logging functionality
+- os standard library
+  - Access to the number of CPUs, the environment and the raw pipes of the workers
+- queue standard library
+  - Access to the queue of idle workers
+- select standard library
+  - Access to waiting for a verdict with a timeout
+- signal standard library
+  - Access to the signal stopping a worker and the script it runs
 - socket standard library
   - Access to networking functions
-- sys standard library
-  - Access to command line arguments 
 - subprocess standard library
-  - Access to run to spawn child processes 
+  - Access to Popen to spawn the workers
+- sys standard library
+  - Access to exiting on SIGTERM
+- threading standard library
+  - Access to threads handling the kept-alive client connections
+- time standard library
+  - Access to a monotonic clock
+- collections standard library
+  - Access to OrderedDict
+- itertools standard library
+  - Access to the counter of the request IDs
 
 """
 
-import sys
+import argparse
+import logging
+import os
+import queue
+import select
+import signal
 import socket
 import subprocess
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from itertools import count
+
+# Loop of a worker in the protocol "exit", running the script per request in a subshell
+EXIT_WORKER = r'''
+while IFS= read -r -d '' PDP_ID && IFS= read -r -d '' PDP_PATH && IFS= read -r -d '' PDP_MODE; do
+    ( export PDP_PATH PDP_MODE; source "$0" "$PDP_PATH" "$PDP_MODE" ) </dev/null >/dev/null 2>&1
+    echo "$PDP_ID $?"
+done
+'''
 
-def authorize(path: str, mode: str, script_path: str) -> bool:
+
+class ScriptPool:
     """
-    Gives or denies authorisation based on custom criteria 
-    
-    :param path: The path of the object 
+    Pool of long-lived workers running a script that makes access control decisions
+
+    :param script_path: The path to a script
+    :type script_path: str
+    :param workers: The number of workers
+    :type workers: int
+    :param protocol: "exit" or "stream", see the module description
+    :type protocol: str
+    :param timeout: The seconds a worker gets for a verdict, it is restarted afterwards
+    :type timeout: float
+    :param cache_ttl: The seconds a verdict is kept per (path, mode). 0 disables the cache
+    :type cache_ttl: float
+    :param cache_size: The maximum number of kept verdicts
+    :type cache_size: int
+    """
+
+    def __init__(self, script_path: str, workers=os.cpu_count(), protocol="exit", timeout=5.0, cache_ttl=0.0,
+                 cache_size=4096):
+        self.script_path = os.path.abspath(script_path)
+        self.protocol = protocol
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._idle = queue.Queue()
+        # All running workers, idle or deciding, so they are stopped on close
+        self._workers = set()
+        self._workers_lock = threading.Lock()
+        self._request_ids = count(1)
+        for _ in range(workers):
+            self._idle.put(self.spawn())
+
+    def spawn(self) -> subprocess.Popen:
+        """
+        Start a worker
+
+        :return: The process of the worker
+        :rtype: subprocess.Popen
+        """
+
+        if self.protocol == "stream":
+            command = ['bash', self.script_path]
+        else:
+            command = ['bash', '-c', EXIT_WORKER, self.script_path]
+        # Every worker gets its own process group, so a hanging script is stopped with it
+        worker = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True)
+        # Answers are read from the raw pipe into the buffer of the worker, see read_answer
+        os.set_blocking(worker.stdout.fileno(), False)
+        worker.buffer = b""
+        with self._workers_lock:
+            self._workers.add(worker)
+        return worker
+
+    def stop(self, worker: subprocess.Popen) -> None:
+        """
+        Stop a worker and the script it runs
+
+        :param worker: The process of the worker
+        :type worker: subprocess.Popen
+        """
+
+        with self._workers_lock:
+            self._workers.discard(worker)
+        try:
+            os.killpg(worker.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        worker.wait()
+        for pipe in (worker.stdin, worker.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def read_answer(self, worker: subprocess.Popen, deadline: float) -> str:
+        """
+        Read the next answer line of a worker. The raw pipe is read with os.read
+        into a buffer of its own, so neither a partial line nor data buffered by
+        a file object can block past the deadline.
+
+        :param worker: The process of the worker
+        :type worker: subprocess.Popen
+        :param deadline: The time of time.monotonic() until which the answer has to arrive
+        :type deadline: float
+        :return: The answer without the line break
+        :rtype: str
+        """
+
+        while b"\n" not in worker.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([worker.stdout], [], [], remaining)[0]:
+                raise TimeoutError("Script gave no complete answer in time")
+            try:
+                chunk = os.read(worker.stdout.fileno(), 4096)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                raise ConnectionResetError("Script closed its output")
+            worker.buffer += chunk
+        line, _, worker.buffer = worker.buffer.partition(b"\n")
+        return line.decode("utf-8", "replace")
+
+    def authorize(self, path: str, mode: str) -> bool:
+        """
+        Let a worker decide on a request, or return the kept verdict
+
+        :param path: The path of the object
+        :type path: str
+        :param mode: The requested syscall
+        :type mode: str
+        :return: A boolean that allows or denies access
+        :rtype: bool
+        """
+
+        if self.cache_ttl > 0:
+            with self._cache_lock:
+                verdict, expires = self._cache.get((path, mode), (None, 0.0))
+                if expires > time.monotonic():
+                    self._cache.move_to_end((path, mode))
+                    return verdict
+
+        # A NUL byte would end a field early and shift the following requests
+        if "\0" in path or "\0" in mode:
+            logging.getLogger("infuser").warning(f"Denying mode {mode!r} for {path!r}, which contains a NUL byte")
+            return False
+
+        request_id = str(next(self._request_ids))
+        worker = self._idle.get()
+        try:
+            worker.stdin.write(f"{request_id}\0{path}\0{mode}\0".encode("utf-8", "surrogateescape"))
+            worker.stdin.flush()
+            answer = self.read_answer(worker, time.monotonic() + self.timeout)
+            answer_id, _, status = answer.strip().partition(" ")
+            if answer_id != request_id:
+                raise ValueError(f"Script answered request {answer_id or '(no ID)'} instead of {request_id}")
+        except (OSError, TimeoutError, ValueError) as e:
+            logging.getLogger("infuser").error(f"ERROR - Script gave no verdict on mode {mode!r} for {path!r}, "
+                                               f"restarting the worker - {e}")
+            self.stop(worker)
+            self._idle.put(self.spawn())
+            return False
+        self._idle.put(worker)
+
+        verdict = status == "0"
+        if self.cache_ttl > 0:
+            with self._cache_lock:
+                self._cache[(path, mode)] = (verdict, time.monotonic() + self.cache_ttl)
+                self._cache.move_to_end((path, mode))
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return verdict
+
+    def close(self):
+        """
+        Stop all workers. Idle workers get the end of their input and the
+        timeout to exit, workers still deciding are stopped right away.
+        """
+
+        idle = []
+        while not self._idle.empty():
+            idle.append(self._idle.get())
+        for worker in idle:
+            try:
+                worker.stdin.close()
+                worker.wait(self.timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        with self._workers_lock:
+            workers = list(self._workers)
+        for worker in workers:
+            self.stop(worker)
+
+
+def authorize(path: str, mode: str, pool: ScriptPool) -> bool:
+    """
+    Gives or denies authorisation based on custom criteria
+
+    :param path: The path of the object
     :type path: str
     :param mode: The requested syscall
-    :type mode: str 
-    :param script_path: The path to a script
-    :type script_path: str 
+    :type mode: str
+    :param pool: The workers running the script
+    :type pool: ScriptPool
     :return: A boolean that allows or denies access
     :rtype: bool
     .. todo:: [#6] Add serverside logging
     """
 
-    try:
-        # Führt das Bash-Skript aus und liest den Rückgabewert
-        result = subprocess.run(['bash', script_path], capture_output=True, text=True)
-        return result.returncode == 0
-    except Exception as e:
-        print(f"Error running the script: {e}")
-        return False
+    # Lässt einen Worker des Skripts entscheiden
+    return pool.authorize(path, mode)
 
 
-def handle_client_connection(conn: socket.socket, script_path: str):
+def handle_client_connection(conn: socket.socket, pool: ScriptPool):
     """
     Handles communication with a client
-    
+
     :param conn: The connection socket object for the client
     :type conn: socket.socket
-    :param script_path: The path to a script
-    :type script_path: str 
+    :param pool: The workers running the script
+    :type pool: ScriptPool
     """
 
     #print("Handling incoming connection")
@@ -62,10 +296,10 @@ def handle_client_connection(conn: socket.socket, script_path: str):
                 break
 
             #print("Received: " + demand)
-    
+
             path, mode = demand.split(",")
 
-            response = demand + "," + str(authorize(path, mode, script_path))
+            response = demand + "," + str(authorize(path, mode, pool))
 
             #print("Sending: " + response)
             conn.send(response.encode())
@@ -76,6 +310,7 @@ def handle_client_connection(conn: socket.socket, script_path: str):
         except Exception as e:
             #print(f"ERROR - {e}")
             pass
+    conn.close()
 
 def main():
     """
@@ -84,13 +319,31 @@ def main():
     host = "127.0.0.1"
     port = 2233
 
-    if len(sys.argv) < 2:
-        print("Usage: uwu-demo.py [script_path]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Server, der Zugriffsentscheidungen von einem Skript treffen laesst.')
+    parser.add_argument('script_path', type=str, help='Pfad zum Skript, das die Entscheidungen trifft.')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='Anzahl dauerhaft laufender Worker des Skripts.')
+    parser.add_argument('-p', '--protocol', choices=['exit', 'stream'], default='exit',
+                        help='exit: Das Skript wird je Anfrage in einer Subshell mit Pfad und Modus als Argumenten '
+                             'ausgefuehrt, der Exit-Code 0 erlaubt den Zugriff. stream: Das Skript liest die Anfragen '
+                             'als ID, Pfad und Modus, je mit einem NUL-Byte abgeschlossen, von stdin und antwortet je '
+                             'Anfrage mit einer Zeile "ID Status", 0 erlaubt den Zugriff.')
+    parser.add_argument('-t', '--timeout', type=float, default=5.0, metavar='s',
+                        help='Sekunden, die ein Worker fuer eine Entscheidung hat, bevor er neu gestartet wird.')
+    parser.add_argument('--cache-ttl', type=float, default=0.0, metavar='s',
+                        help='Sekunden, fuer die eine Entscheidung je (Pfad, Modus) wiederverwendet wird. '
+                             '0 deaktiviert den Cache.')
+    parser.add_argument('--cache-size', type=int, default=4096, metavar='entries',
+                        help='Maximale Anzahl wiederverwendeter Entscheidungen.')
+    args = parser.parse_args()
+
+    pool = ScriptPool(args.script_path, args.workers, args.protocol, args.timeout, args.cache_ttl, args.cache_size)
+    # SIGTERM ends the server like SIGINT, so the workers are stopped with it
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
-    script_path = sys.argv[1]
-    
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Kept-alive connections are in TIME_WAIT after a restart of the server
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
     try:
         server_socket.bind((host, port))
@@ -100,7 +353,8 @@ def main():
             try:
                 conn, address = server_socket.accept()
                 #print("Connection from: ", str(address))
-                handle_client_connection(conn, script_path)
+                # Clients keep their connection open, so each one is handled in its own thread
+                threading.Thread(target=handle_client_connection, args=(conn, pool), daemon=True).start()
 
             except OSError as socket_error:
                 #print("Socket error while accepting connection:", socket_error)
@@ -108,7 +362,11 @@ def main():
 
     except OSError as socket_error:
         print("Socket error while binding server socket:", socket_error)
+    except KeyboardInterrupt:
+        pass
+    finally:
         server_socket.close()
+        pool.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,192 @@
+"""
+Triggers to reload the policy of a running :doc:`infuser` file system without
+remounting it: the signal SIGHUP and changes of the policy files reported by
+inotify. The callbacks run in their own threads, so the reload is done off the
+hot path of the file system. One thread per signal receives it for the whole
+process and calls the callbacks of all mounts.
+
+Libraries/Modules:
+
+- ctypes standard library
+  - Access to the inotify functions of the C library
+- logging standard library
+  - Access to logging functionality
+- os standard library
+  - Access to file descriptors and paths
+- select standard library
+  - Access to waiting for inotify events or the stop of the watcher
+- signal standard library
+  - Access to signal masks and sigwait
+- struct standard library
+  - Access to the binary format of inotify events
+- threading standard library
+  - Access to threads
+
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import signal
+import struct
+import threading
+
+# inotify events indicating that a file has been written completely or replaced
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
+# Format of the fixed-size part of a struct inotify_event
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Callbacks and the receiving thread per signal
+signal_watchers = {}
+signal_lock = threading.Lock()
+
+
+def block_signal(signum=signal.SIGHUP) -> None:
+    """
+    Block a signal in the calling thread and all threads started by it afterwards
+    (e.g. the FUSE workers), so it is only received by :func:`watch_signal`. The
+    mask is per thread, so a program mounting from another thread has to call this
+    in its main thread before starting any thread, otherwise the signal may be
+    delivered to a thread that has not blocked it and terminate the process.
+
+    :param signum: The signal to block
+    :type signum: int
+    """
+
+    if (threading.current_thread() is not threading.main_thread()
+            and signum not in signal.pthread_sigmask(signal.SIG_BLOCK, set())):
+        logging.getLogger("infuser").warning(f"{signal.Signals(signum).name} is not blocked in the main thread, "
+                                             f"it may terminate the process instead of reloading the policy")
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signum})
+
+
+def watch_signal(callback, signum=signal.SIGHUP) -> threading.Thread:
+    """
+    Call a function whenever the process receives a signal. The signal has to be
+    blocked with :func:`block_signal` and is received with sigwait by one thread
+    per signal, as Python signal handlers only run in the main thread, which is
+    blocked inside the FUSE main loop. The thread calls the functions of all
+    mounts of the process one after another.
+
+    :param callback: The function to call without arguments
+    :param signum: The signal to wait for
+    :type signum: int
+    :return: The thread receiving the signal
+    :rtype: threading.Thread
+    """
+
+    with signal_lock:
+        if signum in signal_watchers:
+            thread, callbacks = signal_watchers[signum]
+            callbacks.append(callback)
+            return thread
+
+        def wait():
+            log = logging.getLogger("infuser")
+            while True:
+                signal.sigwait({signum})
+                with signal_lock:
+                    callbacks = list(signal_watchers[signum][1])
+                for function in callbacks:
+                    try:
+                        function()
+                    except Exception as e:
+                        log.error(f"ERROR - Could not handle {signal.Signals(signum).name} - {e}")
+
+        thread = threading.Thread(target=wait, name=f"watch-{signal.Signals(signum).name}", daemon=True)
+        signal_watchers[signum] = (thread, [callback])
+        thread.start()
+        return thread
+
+
+def unwatch_signal(callback, signum=signal.SIGHUP) -> None:
+    """
+    Stop calling a function on a signal, e.g. when its file system is unmounted.
+    The signal stays blocked and received by the thread of :func:`watch_signal`.
+
+    :param callback: The function passed to :func:`watch_signal`
+    :param signum: The signal
+    :type signum: int
+    """
+
+    with signal_lock:
+        if signum in signal_watchers and callback in signal_watchers[signum][1]:
+            signal_watchers[signum][1].remove(callback)
+
+
+def watch_files(files: list, callback):
+    """
+    Call a function whenever one of the files is written or replaced. The
+    directories of the files are watched, so editors replacing a file by
+    renaming a temporary file are noticed as well. The watcher runs until
+    the returned function is called, e.g. when the file system is unmounted.
+
+    :param files: The paths of the files to watch
+    :type files: list
+    :param callback: The function to call without arguments
+    :return: A function stopping the watcher and closing its file descriptors,
+             or None if inotify is not available
+    :rtype: function
+    """
+
+    log = logging.getLogger("infuser")
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        inotify_fd = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError) as e:
+        log.warning(f"inotify is not available, reload the policy with SIGHUP - {e}")
+        return None
+    if inotify_fd < 0:
+        log.warning(f"inotify is not available, reload the policy with SIGHUP - "
+                    f"{os.strerror(ctypes.get_errno())}")
+        return None
+
+    # Names of the watched files per watch descriptor of their directory
+    watched = {}
+    for file in files:
+        directory, name = os.path.split(os.path.abspath(file))
+        watch_descriptor = libc.inotify_add_watch(inotify_fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if watch_descriptor < 0:
+            log.warning(f"Could not watch {file} for changes - {os.strerror(ctypes.get_errno())}")
+            continue
+        watched.setdefault(watch_descriptor, set()).add(name.encode())
+
+    # Written by stop, so the thread does not stay blocked on the inotify file descriptor
+    stop_read, stop_write = os.pipe()
+
+    def wait():
+        while True:
+            readable, _, _ = select.select([inotify_fd, stop_read], [], [])
+            if stop_read in readable:
+                break
+            data = os.read(inotify_fd, 4096)
+            changed = False
+            offset = 0
+            while offset < len(data):
+                watch_descriptor, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                changed = changed or name in watched.get(watch_descriptor, ())
+            if changed:
+                try:
+                    callback()
+                except Exception as e:
+                    log.error(f"ERROR - Could not handle the change of {', '.join(files)} - {e}")
+        for fd in (inotify_fd, stop_read):
+            os.close(fd)
+
+    thread = threading.Thread(target=wait, name="watch-policy-files", daemon=True)
+    thread.start()
+
+    def stop():
+        os.write(stop_write, b"\0")
+        thread.join()
+        os.close(stop_write)
+
+    return stop
@@ -5,6 +5,8 @@ import os
 import subprocess
 import sys
 from infuser_scripts import infuser
+from infuser_scripts import infuser_setup
+from infuser_scripts import watcher
 import logging
 import time
 
@@ -15,12 +17,17 @@ mountpoint = None
 policy_dict = None
 debug_mode = False
 
-def mount_fuse_filesystem(mountpoint, dir_to_mount, policy_dict, uri_file, state_file, debug_mode):
+def mount_fuse_filesystem(mountpoint, dir_to_mount, policy_dict, uri_file, state_file, debug_mode,
+                          profile='balanced', mount_options=None):
     """
-    Mount the FUSE filesystem using the infuser.py script.
+    Mount the FUSE filesystem using the infuser.py script with the options of a
+    mount profile ("strict", "balanced" or "throughput"), of which single FUSE
+    options may be overridden by mount_options.
     """
     try:
-        fuse_thread = threading.Thread(target=infuser.main, args=(mountpoint, dir_to_mount, policy_dict, uri_file, state_file))
+        fuse_options, file_options = infuser_setup.mount_options(profile, mount_options)
+        fuse_thread = threading.Thread(target=infuser.main, args=(mountpoint, dir_to_mount, policy_dict, uri_file, state_file),
+                                       kwargs={'file_options': file_options, 'fuse_options': fuse_options})
         fuse_thread.start()
         # Wait a few seconds to ensure the FUSE filesystem is mounted
         time.sleep(5)
@@ -52,7 +59,8 @@ def handle_client(client_socket):
                 mountpoint = command['mountpoint']
                 policy_dict = command['policy_dict']
                 debug_mode = command['debug_mode']
-                fuse_thread = mount_fuse_filesystem(mountpoint, command['dir_to_mount'], policy_dict, 'uri_file.csv', 'state_file.json', debug_mode)
+                fuse_thread = mount_fuse_filesystem(mountpoint, command['dir_to_mount'], policy_dict, 'uri_file.csv', 'state_file.json', debug_mode,
+                                                    command.get('profile', 'balanced'), command.get('mount_options'))
             client_socket.send(b'ACK')
 
         elif command['action'] == 'stop':
@@ -72,6 +80,9 @@ def handle_client(client_socket):
         client_socket.close()
 
 def start_server():
+    # The mounts run in other threads, so SIGHUP is blocked here before any of them starts and
+    # only reloads the policies of all mounts
+    watcher.block_signal()
     if os.path.exists(SOCKET_PATH):
         os.remove(SOCKET_PATH)
 